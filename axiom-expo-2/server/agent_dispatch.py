@@ -0,0 +1,399 @@
+"""
+Agent dispatch: choosing agents for deliveries and marking them busy.
+Shared by the delivery-map worker (delivery_map.py) and the Streamlit app, so
+neither front end imports the other.
+- rank_agents() / choose_best_agent(): agent -> store -> origin travel times
+  from one duration matrix over the nearest free agents
+- create_assignment() / create_best_assignment(): one delivery, routed legs
+  and billing; falls through to the next agent when one is taken
+- dispatch_orders(): a batch of single-stop orders (solve_assignment)
+- plan_batched_deliveries(): multi-stop bundles (route_batching)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from axiom_core import ROUTE_FETCH_WORKERS, get_osrm_route, get_travel_matrix, get_agent_store
+from dispatch import solve_assignment
+from route_batching import group_orders, plan_sequence
+from geo import haversine_m, compute_billing_from_meters
+
+# nearest free agents (per candidate store) considered when picking one,
+# and how far from the store they may be
+AGENT_CANDIDATES = 20
+AGENT_SEARCH_RADIUS_M = 25000.0
+# an assigned agent stays busy for the routed delivery time plus this slack
+# (or the store's default lease when unrouted), unless released sooner
+ASSIGNMENT_SLACK_S = 15 * 60.0
+
+# ---------- AGENT SELECTION ----------
+def candidate_agent_ids(points, k=AGENT_CANDIDATES, max_radius_m=AGENT_SEARCH_RADIUS_M):
+    """Ids of the k nearest free agents within max_radius_m of each of points (grid lookups, no fleet scan)"""
+    store = get_agent_store()
+    # don't wait for the background flusher to free agents whose lease ran out
+    store.expire_leases()
+    ids = []
+    for p in points:
+        ids.extend(agent_id for agent_id, _, _ in store.nearest_free(p, k=k, max_radius_m=max_radius_m))
+    return list(dict.fromkeys(ids))
+
+def rank_agents(candidate_stores, origin, agent_ids=None):
+    """
+    Every (agent, store) pair by total travel time agent -> store -> origin,
+    fastest first, using one duration matrix for all agents x stores x origin.
+    agent_ids defaults to the nearest free agents around the candidate stores.
+    Returns [(agent_id, store_idx, total_duration_s), ...] (empty if nobody is free).
+    """
+    store = get_agent_store()
+    if agent_ids is None:
+        agent_ids = candidate_agent_ids(candidate_stores)
+    if not agent_ids:
+        return []
+    agents = [store.get(i)["latlon"] for i in agent_ids]
+    stores = [tuple(s) for s in candidate_stores]
+    # sources: agents then stores; destinations: stores then origin
+    durations, _ = get_travel_matrix(list(agents) + stores, stores + [tuple(origin)])
+    n_agents = len(agents)
+    ranked = []
+    for s_idx in range(len(stores)):
+        store_to_origin = durations[n_agents + s_idx][len(stores)]
+        for a_idx in range(n_agents):
+            ranked.append((agent_ids[a_idx], s_idx, durations[a_idx][s_idx] + store_to_origin))
+    ranked.sort(key=lambda r: r[2])
+    return ranked
+
+def choose_best_agent(candidate_stores, origin, agent_ids=None):
+    """
+    The (agent, store) pair with the lowest total travel time (see rank_agents).
+    Returns (agent_id, store_idx, total_duration_s), or None if nobody is free.
+    """
+    ranked = rank_agents(candidate_stores, origin, agent_ids)
+    return ranked[0] if ranked else None
+
+# ---------- ASSIGNMENT ----------
+def _try_assignment(agent_idx, store_coord, store_color, origin, shop_name):
+    """
+    Route agent_idx -> store -> origin and assign the agent to it. Returns the
+    assignment dict, or None if the agent was taken (by another worker) first.
+    """
+    store = get_agent_store()
+    agent = store.get(agent_idx)
+    agent_coord = agent["latlon"]
+    agent_profile = agent["profile"]
+
+    coords_ag_st, dist_ag_st, dur_ag_st = get_osrm_route(agent_coord, store_coord)
+    coords_st_org, dist_st_org, dur_st_org = get_osrm_route(store_coord, origin)
+
+    if dist_ag_st is None:
+        dist_ag_st = haversine_m(agent_coord, store_coord)
+    if dist_st_org is None:
+        dist_st_org = haversine_m(store_coord, origin)
+
+    total_m = None
+    if dist_ag_st is not None and dist_st_org is not None:
+        total_m = dist_ag_st + dist_st_org
+
+    charge = compute_billing_from_meters(total_m) if total_m is not None else None
+
+    job = {
+        "store_coord": list(store_coord),
+        "origin": list(origin),
+        "total_m": total_m,
+        "charge": charge
+    }
+    if dur_ag_st is not None and dur_st_org is not None:
+        assigned = store.assign(agent_idx, job, lease_s=dur_ag_st + dur_st_org + ASSIGNMENT_SLACK_S)
+    else:
+        assigned = store.assign(agent_idx, job)
+    if not assigned:
+        return None
+    return {
+        "agent_idx": agent_idx,
+        "agent_coord": agent_coord,
+        "agent_profile": agent_profile,
+        "store_coord": store_coord,
+        "store_color": store_color,
+        "store_shop_name": shop_name,
+        "coords_agent_store": coords_ag_st,
+        "dist1_m": dist_ag_st,
+        "coords_store_origin": coords_st_org,
+        "dist2_m": dist_st_org,
+        "total_m": total_m,
+        "charge": charge
+    }
+
+def create_assignment(store_coord, store_color, origin, shop_name=None, agent_idx=None):
+    """
+    Create an assignment for a store to an agent.
+    Returns assignment dictionary with route info and billing.
+    
+    Parameters:
+    -----------
+    store_coord : tuple
+        (lat, lon) coordinates of the store
+    store_color : str
+        Color category of the store (green/yellow/red/blue)
+    origin : tuple
+        (lat, lon) coordinates of the origin point
+    shop_name : str, optional
+        Name of the shop if matched
+    agent_idx : int, optional
+        Agent id to assign. If None, takes the free agent with the lowest
+        agent -> store -> origin travel time, falling through to the next
+        fastest when another worker got that one first. The agent is marked
+        busy with this delivery as its current job, leased for the routed
+        delivery time plus ASSIGNMENT_SLACK_S.
+    
+    Returns:
+    --------
+    dict: Assignment dictionary with route info and billing
+
+    Raises ValueError if agent_idx (or, without it, every nearby agent) is not free.
+    """
+    if agent_idx is not None:
+        assignment = _try_assignment(agent_idx, store_coord, store_color, origin, shop_name)
+        if assignment is None:
+            raise ValueError(f"Agent {agent_idx} is not free")
+        return assignment
+    for candidate, _, _ in rank_agents([store_coord], origin):
+        assignment = _try_assignment(candidate, store_coord, store_color, origin, shop_name)
+        if assignment is not None:
+            return assignment
+    raise ValueError("No free agent near the store")
+
+def create_best_assignment(candidate_stores, origin, store_colors=None, shop_names=None):
+    """
+    Choose the best (agent, store) pair across several candidate stores with a
+    single duration matrix, then fetch full route geometry only for the winning legs.
+    An agent taken by another worker meanwhile is skipped for the next best pair.
+
+    Parameters:
+    -----------
+    candidate_stores : list of tuples
+        (lat, lon) coordinates of stores that can fulfil the order
+    origin : tuple
+        (lat, lon) coordinates of the delivery point
+    store_colors : list of str, optional
+        Color category per candidate store (defaults to "green")
+    shop_names : list of str, optional
+        Matched shop name per candidate store
+
+    Returns:
+    --------
+    dict: Assignment dictionary (same shape as create_assignment) plus "eta_s",
+    or None if there are no candidate stores or no free agent
+    """
+    if not candidate_stores:
+        return None
+    tried = set()
+    for agent_idx, store_idx, total_dur in rank_agents(candidate_stores, origin):
+        if agent_idx in tried:
+            continue
+        tried.add(agent_idx)
+        assignment = _try_assignment(
+            agent_idx,
+            tuple(candidate_stores[store_idx]),
+            store_colors[store_idx] if store_colors else "green",
+            origin,
+            shop_names[store_idx] if shop_names else None
+        )
+        if assignment is not None:
+            assignment["eta_s"] = total_dur
+            return assignment
+    return None
+
+# ---------- BATCH DISPATCH ----------
+def dispatch_orders(orders, agent_indices=None):
+    """
+    Batch dispatch: assign pending orders to agents at minimum total travel time.
+
+    Parameters:
+    -----------
+    orders : list of dicts
+        {"store": (lat, lon), "origin": (lat, lon)} plus optional "store_color",
+        "shop_name" and "order_id"
+    agent_indices : list of int, optional
+        Agent ids to consider. Defaults to the nearest free agents around the
+        order stores.
+
+    Cost of agent i for order j is the agent -> store -> origin travel time, from one
+    agents x stores and one stores x origins matrix. Solved with the Hungarian
+    algorithm (greedy for very large batches); full geometry is then fetched only
+    for the chosen legs.
+
+    Returns:
+    --------
+    dict with keys:
+        - assignments: create_assignment() dicts plus "order_id" and "eta_s"
+        - unassigned: orders left over when there are more orders than agents,
+          or whose agent (and every unused fallback) was taken by another worker
+        - total_eta_s: sum of the chosen agent -> store -> origin times
+    """
+    if agent_indices is None:
+        agent_indices = candidate_agent_ids(list(dict.fromkeys(tuple(o["store"]) for o in orders)))
+    agents = [get_agent_store().get(i)["latlon"] for i in agent_indices]
+    orders = [dict(o, order_id=o.get("order_id", n)) for n, o in enumerate(orders)]
+    if not orders or not agents:
+        return {"assignments": [], "unassigned": orders, "total_eta_s": 0.0}
+
+    stores = list(dict.fromkeys(tuple(o["store"]) for o in orders))
+    origins = list(dict.fromkeys(tuple(o["origin"]) for o in orders))
+    store_pos = {s: k for k, s in enumerate(stores)}
+    origin_pos = {o: k for k, o in enumerate(origins)}
+    # sources: agents then stores; destinations: stores then origins
+    durations, _ = get_travel_matrix(agents + stores, stores + origins)
+    dur = np.asarray(durations, dtype=np.float64)
+    n_agents = len(agents)
+    order_store = np.array([store_pos[tuple(o["store"])] for o in orders])
+    order_origin = np.array([origin_pos[tuple(o["origin"])] for o in orders])
+    to_store = dur[:n_agents][:, order_store]
+    store_to_origin = dur[n_agents + order_store, len(stores) + order_origin]
+    cost = to_store + store_to_origin[None, :]
+
+    pairs = solve_assignment(cost)
+    # agents left out of the solution, fastest first per order: fallbacks if a chosen agent is taken
+    spare = [a for a in range(n_agents) if a not in {a for a, _ in pairs}]
+
+    def assign(pair):
+        a, j = pair
+        o = orders[j]
+        for a in [a] + sorted(spare, key=lambda b: cost[b, j]):
+            assignment = _try_assignment(
+                agent_indices[a], tuple(o["store"]), o.get("store_color", "green"), tuple(o["origin"]), o.get("shop_name"))
+            if assignment is not None:
+                assignment["order_id"] = o["order_id"]
+                assignment["eta_s"] = float(cost[a, j])
+                return assignment
+        return None
+
+    # two route fetches per chosen pair, run concurrently (cached, backend session shared)
+    with ThreadPoolExecutor(max_workers=min(ROUTE_FETCH_WORKERS, len(pairs)) or 1) as pool:
+        results = list(pool.map(assign, pairs))
+    assignments = [r for r in results if r is not None]
+    assigned = {j for (_, j), r in zip(pairs, results) if r is not None}
+    return {
+        "assignments": assignments,
+        "unassigned": [o for j, o in enumerate(orders) if j not in assigned],
+        "total_eta_s": float(sum(a["eta_s"] for a in assignments))
+    }
+
+def plan_batched_deliveries(orders, agent_indices=None):
+    """
+    Multi-stop planning: bundle compatible orders (route_batching.group_orders),
+    sequence each bundle per agent with pickups before drop-offs, then give each
+    agent at most one bundle at minimum total time (solve_assignment).
+    All travel times come from a single matrix over agents, stores and drop-offs;
+    leg geometry is fetched only for the chosen routes.
+
+    Parameters:
+    -----------
+    orders : list of dicts
+        {"store": (lat, lon), "origin": (lat, lon)} plus optional "order_id" and
+        "created_at" (epoch seconds)
+    agent_indices : list of int, optional
+        Agent ids to consider. Defaults to the nearest free agents around the
+        order stores. Chosen agents are marked busy with their route as job.
+
+    Returns:
+    --------
+    dict with keys:
+        - routes: one per used agent with agent_idx, agent_coord, agent_profile,
+          stops (type, order_id, coord, eta_s), legs (coords per leg), leg_dist_m,
+          total_m, total_s and orders (order_id, billed_m, charge). An order is
+          billed for its own store -> drop-off distance plus an equal share of the
+          agent's approach to the first pickup.
+        - unassigned: orders whose bundle got no free agent (or whose agent was
+          taken by another worker before it could be assigned)
+    """
+    store = get_agent_store()
+    orders = [dict(o, store=tuple(o["store"]), origin=tuple(o["origin"]), order_id=o.get("order_id", n))
+              for n, o in enumerate(orders)]
+    if agent_indices is None:
+        agent_indices = candidate_agent_ids(list(dict.fromkeys(o["store"] for o in orders)))
+    if not orders or not agent_indices:
+        return {"routes": [], "unassigned": orders}
+
+    bundles = group_orders(orders)
+    agents = [store.get(i)["latlon"] for i in agent_indices]
+    points = list(dict.fromkeys(agents + [o["store"] for o in orders] + [o["origin"] for o in orders]))
+    pos = {p: k for k, p in enumerate(points)}
+    durations, distances = get_travel_matrix(points, points)
+    dur = np.asarray(durations, dtype=np.float64)
+    dist = np.asarray(distances, dtype=np.float64)
+    np.fill_diagonal(dur, 0.0)
+    np.fill_diagonal(dist, 0.0)
+
+    def stop_points(agent, bundle):
+        # stop numbering of route_batching.plan_sequence: start, pickups, drop-offs
+        return [pos[agent]] + [pos[orders[j]["store"]] for j in bundle] + [pos[orders[j]["origin"]] for j in bundle]
+
+    plans = {}
+    cost = np.empty((len(agents), len(bundles)))
+    for a, agent in enumerate(agents):
+        for b, bundle in enumerate(bundles):
+            idx = stop_points(agent, bundle)
+            seq, total = plan_sequence(dur[np.ix_(idx, idx)], len(bundle))
+            plans[(a, b)] = seq
+            cost[a, b] = total
+
+    pairs = solve_assignment(cost)
+
+    # every leg of every chosen route, fetched concurrently (same-point legs skipped)
+    chosen = []
+    leg_requests = []
+    for a, b in pairs:
+        idx = stop_points(agents[a], bundles[b])
+        seq = plans[(a, b)]
+        path = [0] + seq
+        legs = [(points[idx[path[i]]], points[idx[path[i + 1]]]) for i in range(len(seq))]
+        chosen.append((a, b, idx, seq, legs))
+        leg_requests.extend(leg for leg in legs if leg[0] != leg[1])
+    with ThreadPoolExecutor(max_workers=ROUTE_FETCH_WORKERS) as pool:
+        fetched = dict(zip(leg_requests, pool.map(lambda leg: get_osrm_route(*leg), leg_requests)))
+
+    routes = []
+    assigned = set()
+    for a, b, idx, seq, legs in chosen:
+        bundle = bundles[b]
+        n = len(bundle)
+        leg_coords, leg_dist = [], []
+        for src, dst in legs:
+            coords, d, _ = fetched.get((src, dst), (None, None, None))
+            leg_coords.append(coords or [list(src), list(dst)])
+            leg_dist.append(d if d is not None else float(dist[pos[src], pos[dst]]))
+        stops = []
+        eta = 0.0
+        prev = 0
+        for stop in seq:
+            eta += float(dur[idx[prev], idx[stop]])
+            prev = stop
+            j = bundle[(stop - 1) % n]
+            stops.append({
+                "type": "pickup" if stop <= n else "dropoff",
+                "order_id": orders[j]["order_id"],
+                "coord": list(points[idx[stop]]),
+                "eta_s": eta
+            })
+        approach_share = leg_dist[0] / n
+        billed = np.array([dist[pos[orders[j]["store"]], pos[orders[j]["origin"]]] + approach_share for j in bundle])
+        charges = compute_billing_from_meters(billed)
+        agent_idx = agent_indices[a]
+        if not store.assign(agent_idx, {"order_ids": [orders[j]["order_id"] for j in bundle], "stops": len(stops)},
+                            lease_s=eta + ASSIGNMENT_SLACK_S):
+            continue
+        assigned.update(bundle)
+        routes.append({
+            "agent_idx": agent_idx,
+            "agent_coord": list(agents[a]),
+            "agent_profile": store.get(agent_idx)["profile"],
+            "stops": stops,
+            "legs": leg_coords,
+            "leg_dist_m": leg_dist,
+            "total_m": float(sum(leg_dist)),
+            "total_s": eta,
+            "orders": [{"order_id": orders[j]["order_id"], "billed_m": float(m), "charge": int(c)}
+                       for j, m, c in zip(bundle, billed, charges)]
+        })
+    unassigned = [o for j, o in enumerate(orders) if j not in assigned]
+    return {"routes": routes, "unassigned": unassigned}
@@ -0,0 +1,303 @@
+"""
+Live delivery-agent state: position, status and current job per agent.
+Held in memory with a SpatialIndex for "nearest free agents" queries, persisted
+to the agents table of its own database file (agents.db), so this module's WAL
+mode never touches the axiom.db that Node's users table lives in.
+
+- Position updates only touch memory (and the grid cell when it changes); they
+  are written behind in one batched transaction every flush interval.
+- Status/job changes are written through immediately.
+- assign() is a compare-and-set on status = 'free' in the database, so when two
+  workers pick the same agent only one gets it; the other is told so and moves
+  on. It leases the agent: the job carries lease_until, and expire_leases()
+  (run by the background flusher) frees agents whose delivery was never
+  marked complete.
+- sync() pulls rows changed by other processes (e.g. the other delivery-map
+  worker) since the last pull; the background flusher calls it every interval.
+  Every write bumps the row's version to one past the table's highest, so the
+  pull watermark follows commit order rather than report timestamps.
+"""
+
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+from spatial_index import SpatialIndex
+
+STATUS_FREE = "free"
+STATUS_BUSY = "busy"
+STATUS_OFFLINE = "offline"
+STATUSES = (STATUS_FREE, STATUS_BUSY, STATUS_OFFLINE)
+
+FLUSH_INTERVAL_S = 2.0
+# how long an assignment keeps its agent busy unless the caller knows the delivery time
+ASSIGNMENT_LEASE_S = 45 * 60.0
+AGENT_CELL_M = 500.0
+
+# evaluated inside the writing transaction; writers are serialized, so versions follow commit order
+_NEXT_VERSION = "(SELECT COALESCE(MAX(version), 0) + 1 FROM agents)"
+
+
+class AgentStore:
+    def __init__(self, db_path, flush_interval_s=FLUSH_INTERVAL_S, cell_m=AGENT_CELL_M):
+        self.db_path = db_path
+        self.flush_interval_s = flush_interval_s
+        self._agents = {}
+        self._index = SpatialIndex(cell_m=cell_m)
+        self._dirty = set()
+        self._last_version = 0
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS agents ("
+            "agent_id INTEGER PRIMARY KEY, name TEXT, phone TEXT, vehicle TEXT, "
+            "lat REAL NOT NULL, lon REAL NOT NULL, status TEXT NOT NULL, job TEXT, "
+            "updated_at REAL NOT NULL, version INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "version" not in {col[1] for col in self._conn.execute("PRAGMA table_info(agents)")}:
+            self._conn.execute("ALTER TABLE agents ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS agents_version ON agents(version)")
+        self._conn.commit()
+        self._stop = threading.Event()
+        self._flusher = None
+        self._load()
+
+    # ---------- persistence ----------
+    def _row_to_agent(self, row):
+        agent_id, name, phone, vehicle, lat, lon, status, job, updated_at, _version = row
+        return {
+            "agent_id": agent_id,
+            "profile": {"name": name, "phone": phone, "vehicle": vehicle},
+            "latlon": (lat, lon),
+            "status": status,
+            "job": json.loads(job) if job else None,
+            "updated_at": updated_at
+        }
+
+    def _load(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT agent_id, name, phone, vehicle, lat, lon, status, job, updated_at, version FROM agents"
+            ).fetchall()
+            for row in rows:
+                self._put(self._row_to_agent(row))
+                self._last_version = max(self._last_version, row[-1])
+
+    def _refresh(self, agent_id):
+        """Re-read one agent's status and job, after a compare-and-set found them changed."""
+        row = self._conn.execute("SELECT status, job FROM agents WHERE agent_id = ?", (agent_id,)).fetchone()
+        if row is not None:
+            agent = self._agents[agent_id]
+            agent["status"] = row[0]
+            agent["job"] = json.loads(row[1]) if row[1] else None
+
+    def _put(self, agent):
+        self._index.insert(agent["agent_id"], agent["latlon"], payload=agent)
+        self._agents[agent["agent_id"]] = agent
+
+    def _insert(self, agent_ids):
+        rows = []
+        for agent_id in agent_ids:
+            a = self._agents[agent_id]
+            p = a["profile"]
+            rows.append((agent_id, p.get("name"), p.get("phone"), p.get("vehicle"),
+                         a["latlon"][0], a["latlon"][1], a["status"],
+                         json.dumps(a["job"]) if a["job"] is not None else None, a["updated_at"]))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO agents (agent_id, name, phone, vehicle, lat, lon, status, job, updated_at, version) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {_NEXT_VERSION})", rows
+        )
+        self._conn.commit()
+
+    def flush(self):
+        """
+        Write buffered position updates in one transaction. Only the position
+        columns are written, so a concurrent status change from another process
+        is never overwritten. Returns rows written.
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            rows = [(self._agents[i]["latlon"][0], self._agents[i]["latlon"][1], self._agents[i]["updated_at"], i)
+                    for i in sorted(self._dirty)]
+            self._conn.executemany(
+                f"UPDATE agents SET lat = ?, lon = ?, updated_at = ?, version = {_NEXT_VERSION} WHERE agent_id = ?", rows)
+            self._conn.commit()
+            self._dirty.clear()
+            return len(rows)
+
+    def sync(self):
+        """
+        Pull rows changed since the last pull (by version, never by report
+        time: a flushed position can be older than rows already seen). Status and job
+        always come from the database (they are written through); positions only
+        for agents without unflushed local updates.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT agent_id, name, phone, vehicle, lat, lon, status, job, updated_at, version "
+                "FROM agents WHERE version > ?", (self._last_version,)
+            ).fetchall()
+            for row in rows:
+                self._last_version = max(self._last_version, row[-1])
+                fresh = self._row_to_agent(row)
+                local = self._agents.get(fresh["agent_id"])
+                if local is not None and fresh["agent_id"] in self._dirty:
+                    local["status"] = fresh["status"]
+                    local["job"] = fresh["job"]
+                else:
+                    self._put(fresh)
+            return len(rows)
+
+    def start_background_flush(self):
+        """Flush and sync every flush_interval_s on a daemon thread (idempotent)."""
+        if self._flusher is not None:
+            return
+        def loop():
+            while not self._stop.wait(self.flush_interval_s):
+                try:
+                    self.flush()
+                    self.sync()
+                    self.expire_leases()
+                except sqlite3.Error:
+                    pass
+        self._flusher = threading.Thread(target=loop, name="agent-store-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+
+    # ---------- state ----------
+    def seed(self, coords, profiles):
+        """Create agents 0..n-1 from static tables, only if the table is empty."""
+        with self._lock:
+            if self._agents:
+                return False
+            now = time.time()
+            for agent_id, latlon in enumerate(coords):
+                profile = profiles[agent_id] if agent_id < len(profiles) else {"name": "Agent", "phone": "NA", "vehicle": "NA"}
+                self._put({"agent_id": agent_id, "profile": dict(profile), "latlon": tuple(latlon),
+                           "status": STATUS_FREE, "job": None, "updated_at": now})
+            self._insert(list(self._agents))
+            return True
+
+    def get(self, agent_id):
+        """Snapshot of one agent (KeyError if unknown)."""
+        with self._lock:
+            return dict(self._agents[agent_id])
+
+    def all(self):
+        with self._lock:
+            return [dict(self._agents[i]) for i in sorted(self._agents)]
+
+    def ids(self, status=None):
+        with self._lock:
+            return [i for i in sorted(self._agents) if status is None or self._agents[i]["status"] == status]
+
+    def update_position(self, agent_id, latlon, ts=None):
+        """High-rate position report: memory + grid only, persisted by the next flush."""
+        with self._lock:
+            agent = self._agents[agent_id]
+            agent["latlon"] = (float(latlon[0]), float(latlon[1]))
+            agent["updated_at"] = ts if ts is not None else time.time()
+            self._index.move(agent_id, agent["latlon"])
+            self._dirty.add(agent_id)
+
+    def update_positions(self, updates):
+        """Batch of (agent_id, (lat, lon)) reports; unknown ids are skipped. Returns the count applied."""
+        applied = 0
+        now = time.time()
+        with self._lock:
+            for agent_id, latlon in updates:
+                if agent_id in self._agents:
+                    self.update_position(agent_id, latlon, now)
+                    applied += 1
+        return applied
+
+    def set_status(self, agent_id, status, job=None):
+        """Change status/current job; written through to the database."""
+        if status not in STATUSES:
+            raise ValueError(f"Unknown agent status: {status}")
+        with self._lock:
+            agent = self._agents[agent_id]
+            agent["status"] = status
+            agent["job"] = job
+            agent["updated_at"] = time.time()
+            self._conn.execute(
+                f"UPDATE agents SET status = ?, job = ?, updated_at = ?, version = {_NEXT_VERSION} WHERE agent_id = ?",
+                (status, json.dumps(job) if job is not None else None, agent["updated_at"], agent_id)
+            )
+            self._conn.commit()
+
+    def assign(self, agent_id, job, lease_s=ASSIGNMENT_LEASE_S):
+        """
+        Mark the agent busy with job until it is released or lease_s passes.
+        Only succeeds if the agent is still free in the database (not just in
+        this process's copy); returns False, with the copy refreshed, otherwise.
+        """
+        with self._lock:
+            agent = self._agents[agent_id]
+            now = time.time()
+            job = dict(job, lease_until=now + lease_s)
+            cur = self._conn.execute(
+                f"UPDATE agents SET status = ?, job = ?, updated_at = ?, version = {_NEXT_VERSION} "
+                "WHERE agent_id = ? AND status = ?",
+                (STATUS_BUSY, json.dumps(job), now, agent_id, STATUS_FREE)
+            )
+            self._conn.commit()
+            if cur.rowcount == 0:
+                self._refresh(agent_id)
+                return False
+            agent["status"] = STATUS_BUSY
+            agent["job"] = job
+            agent["updated_at"] = now
+            return True
+
+    def expire_leases(self, now=None):
+        """Free busy agents whose assignment lease ran out. Returns their ids."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [agent_id for agent_id, agent in self._agents.items()
+                       if agent["status"] == STATUS_BUSY and agent["job"]
+                       and agent["job"].get("lease_until", now) < now]
+            freed = []
+            stamp = time.time()
+            for agent_id in expired:
+                # conditional too: another process may have reassigned the agent since our last sync
+                cur = self._conn.execute(
+                    f"UPDATE agents SET status = ?, job = NULL, updated_at = ?, version = {_NEXT_VERSION} "
+                    "WHERE agent_id = ? AND status = ? AND json_extract(job, '$.lease_until') < ?",
+                    (STATUS_FREE, stamp, agent_id, STATUS_BUSY, now)
+                )
+                self._conn.commit()
+                if cur.rowcount:
+                    agent = self._agents[agent_id]
+                    agent["status"] = STATUS_FREE
+                    agent["job"] = None
+                    agent["updated_at"] = stamp
+                    freed.append(agent_id)
+                else:
+                    self._refresh(agent_id)
+            return freed
+
+    def release(self, agent_id):
+        self.set_status(agent_id, STATUS_FREE, None)
+
+    def nearest_free(self, point, k=5, max_radius_m=None):
+        """Up to k free agents nearest to point: [(agent_id, agent, distance_m), ...]."""
+        with self._lock:
+            # asking for more than exist would make the grid search run to its bounds
+            k = min(k, sum(1 for agent in self._agents.values() if agent["status"] == STATUS_FREE))
+            if k == 0:
+                return []
+            return [(agent_id, dict(agent), dist) for agent_id, agent, dist in self._index.nearest(
+                point, k=k, max_radius_m=max_radius_m,
+                predicate=lambda agent_id, agent: agent["status"] == STATUS_FREE)]
@@ -10,70 +10,32 @@ import streamlit as st
 import folium
 from folium import IFrame, Popup
 from branca.element import Element
-import requests, random, json, os, math
-from urllib.parse import quote_plus
+import json, os
 from streamlit.components.v1 import html as st_html
 import pandas as pd
-import difflib
+
+import axiom_core
+from axiom_core import (
+    TILE_URL, ATTR, YELLOW_SHADES, PURPLE_HEX, ROUTE_CACHE_DECIMALS, CATALOG_CSV_PATH, SHOP_DATABASE, GOV_INITIATIVES,
+    parse_coord, google_maps_link, get_agent_store, get_catalog
+)
+from janaushadhi_ingredients import ingredient_index_for
+from janaushadhi_lookup import cached_resolve
+from geo import compute_bounds
+from agent_dispatch import dispatch_orders
+from agent_store import STATUS_FREE, STATUS_BUSY
 
 # ---------- Config ----------
-OSRM_SERVER = "https://router.project-osrm.org"
-TILE_URL = "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
-ATTR = "© OpenStreetMap contributors"
-YELLOW_SHADES = ["#E0A800", "#FFD43B", "#FFEB99"]
-PURPLE_HEX = "#800080"
-BLUE_GOV_COLOR = "blue"
-MATCH_RADIUS_METERS = 50.0
-
-CSV_PATH = "Product List_6_11_2025 @ 15_1_15.csv"  # Price CSV (put in project root)
-
-# ---------- Hardcoded agents, shops, and gov clinics ----------
-HIDDEN_AGENTS_COORDS = [
-    (12.9650, 77.6000),
-    (12.9800, 77.5900),
-    (12.9550, 77.6050),
-    (12.9750, 77.6100),
-    (12.9900, 77.5800)
-]
-AGENT_PROFILES = [
-    {"name": "Ravi Kumar", "phone": "+91-98765-00001", "vehicle": "Bike - KTM Duke"},
-    {"name": "Asha Devi", "phone": "+91-98765-00002", "vehicle": "Scooter - TVS Jupiter"},
-    {"name": "Suresh N", "phone": "+91-98765-00003", "vehicle": "Bike - Hero Splendor"},
-    {"name": "Priya R", "phone": "+91-98765-00004", "vehicle": "Scooter - Honda Activa"},
-    {"name": "Manoj K", "phone": "+91-98765-00005", "vehicle": "Bike - Yamaha FZ"}
-]
-
-SHOP_DATABASE = [
-    {"name": "MedPlus Rajarajeshwari Nagar", "latlon": (12.9260174804538, 77.51873873639585)},
-    {"name": "MedPLus RR Nagar, Kenchenahalli Road", "latlon": (12.916062252168635, 77.51315974188867)},
-    {"name": "MedPlus RR Nagar, 60 Feet Road", "latlon": (12.912046585611204, 77.52105616488345)},
-    {"name": "Apollo Pharmacy Kenchenahalli Road, RR Nagar", "latlon": (12.910958998147274, 77.51350306462756)},
-    {"name": "Lakshmi Pharma", "latlon": (12.900447828509314, 77.5096368705969)},
-    {"name": "Omkar Medicals and General Store", "latlon": (12.907003244263793, 77.5049541035601)},
-    {"name": "Be Well Drugs", "latlon": (12.909722477406175, 77.50923833723208)},
-    {"name": "Krishna Medicals and Departmental Stores", "latlon": (12.907120961825331, 77.49881980852739)}
-]
-
-GOV_INITIATIVES = [
-    {"name":"Pradhan Mantri JanAushadhi Kendra - Gokhale Rd",
-     "address":"921, Gokhale Rd, Rajarajeshwari Nagar, Bengaluru 560098",
-     "latlon": (12.917612214940876, 77.51904488091897)},
-    {"name":"Pradhan Mantri Janaushadhi Kendra - BHEL 2nd Stage",
-     "address":"Sir M Vishnuvardhan Main Rd, Rajarajeshwari Nagar, Bengaluru 560098",
-     "latlon": (12.917612214940876, 77.50978399033598)},
-    {"name":"Pradhan Mantri Jan Aushadhi Kendra - Kenchena Halli Rd",
-     "address":"17 ground floor, Kenchena Halli Rd, Rajarajeshwari Nagar, Bengaluru 560098",
-     "latlon": (12.910492603965448, 77.51343617253772)},
-    {"name":"PRADHAN MANTRI BHARTIYA JANAUSHADHI KENDRA - Channasandra",
-     "address":"No 851, Dr.Vishnuvardhan Rd, Channasandra, Bengaluru 560098",
-     "latlon": (12.903563502133089, 77.52067531940189)},
-    {"name":"Pradhan mantri Janaushadhi kendra - Kodipalya",
-     "address":"Shop No.F4, Vasthu Green Shopping Complex, Kodipalya, Bengaluru, Karnataka 560060",
-     "latlon": (12.906666049048614, 77.48845393143118)},
-    {"name":"Pradhan Mantri Bhartiya Jan Aushadhi Kendra Kengeri",
-     "address":"Kengeri, Bengaluru, Karnataka 560060",
-     "latlon": (12.915871335395288, 77.4804822691128)}
-]
+# map styling, shop/clinic tables, routing and the catalog path come from axiom_core
+CSV_PATH = CATALOG_CSV_PATH  # Price CSV (CATALOG_CSV_PATH overrides)
+
+# Shared caches (one per server process, used by every session)
+ROUTE_CACHE_ENTRIES = 2000
+ROUTE_CACHE_TTL_S = 6 * 3600
+PRICE_CACHE_ENTRIES = 500
+PRICE_CACHE_TTL_S = 24 * 3600
+# name-substring matches considered when the lookup finds nothing
+SUBSTRING_MATCHES = 5
 
 # ---------- Streamlit page ----------
 st.set_page_config(page_title="Delivery Map — Jan Aushadhi & Agents", layout="wide")
@@ -90,62 +52,39 @@ st.write("Sidebar: use the Jan Aushadhi button to view Jan Aushadhi tile. Map is
 # The Jan tile will prefer st.session_state["medicines_list"] if present.
 
 # ---------- helpers ----------
-def parse_coord(txt: str):
-    p = [s.strip() for s in txt.split(",")]
-    return (float(p[0]), float(p[1]))
-
-def haversine_m(a, b):
-    R = 6371000.0
-    lat1, lon1 = math.radians(a[0]), math.radians(a[1])
-    lat2, lon2 = math.radians(b[0]), math.radians(b[1])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    x = math.sin(dlat/2)**2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)**2
-    return 2 * R * math.asin(math.sqrt(x))
-
-def google_maps_link(origin, dest):
-    params = {"api":"1","origin":f"{origin[0]},{origin[1]}","destination":f"{dest[0]},{dest[1]}","travelmode":"driving"}
-    return "https://www.google.com/maps/dir/?" + "&".join(f"{k}={quote_plus(str(v))}" for k,v in params.items())
+class RouteUnavailable(Exception):
+    """Raised inside the cached fetch so failed lookups are never cached."""
+
+@st.cache_data(max_entries=ROUTE_CACHE_ENTRIES, ttl=ROUTE_CACHE_TTL_S, show_spinner=False)
+def _cached_route(src, dst, profile):
+    # shared backend + persistent route cache; this layer only saves the SQLite round trip
+    coords, dist_m, dur_s = axiom_core.get_osrm_route(src, dst, profile)
+    if coords is None:
+        raise RouteUnavailable()
+    return coords, dist_m, dur_s
 
 def get_osrm_route(src, dst, profile="driving"):
-    coords_str = f"{src[1]},{src[0]};{dst[1]},{dst[0]}"
-    url = f"{OSRM_SERVER}/route/v1/{profile}/{coords_str}?overview=full&geometries=geojson"
+    """Route shared across sessions, keyed by rounded endpoints; (None, None, None) on failure"""
+    d = ROUTE_CACHE_DECIMALS
     try:
-        r = requests.get(url, timeout=12)
-        r.raise_for_status()
-        j = r.json()
-        if j.get("code") != "Ok" or not j.get("routes"):
-            return None, None, None
-        route = j["routes"][0]
-        geom = route["geometry"]["coordinates"]
-        coords_latlon = [[c[1], c[0]] for c in geom]
-        return coords_latlon, route.get("distance"), route.get("duration")
-    except Exception:
+        return _cached_route((round(src[0], d), round(src[1], d)), (round(dst[0], d), round(dst[1], d)), profile)
+    except RouteUnavailable:
         return None, None, None
 
 def make_popup_html(title, point, dist_m=None, dur_s=None, gm_link=None, extra_html=""):
-    lines = [f"<b>{title}</b>", f"{point[0]:.6f}, {point[1]:.6f}"]
-    if dist_m is not None:
-        lines.append(f"Distance: {dist_m/1000.0:.2f} km")
-    if dur_s is not None:
-        lines.append(f"ETA: {int(dur_s/60)} min")
-    if gm_link:
-        lines.append(f"<a href='{gm_link}' target='_blank'>Open in Google Maps</a>")
-    if extra_html:
-        lines.append(extra_html)
-    return IFrame("<br>".join(lines), width=320, height=140)
+    return IFrame(axiom_core.make_popup_html(title, point, dist_m, dur_s, gm_link, extra_html), width=320, height=140)
 
 # ---------- session ----------
 if "map_html" not in st.session_state:
     st.session_state["map_html"] = None
+if "map_obj" not in st.session_state:
+    st.session_state["map_obj"] = None
 if "assignments" not in st.session_state:
     st.session_state["assignments"] = []
 if "medicines" not in st.session_state:
     st.session_state["medicines"] = []
-if "csv_df" not in st.session_state:
-    st.session_state["csv_df"] = None
-if "csv_cols" not in st.session_state:
-    st.session_state["csv_cols"] = None
+if "catalog" not in st.session_state:
+    st.session_state["catalog"] = None
 if "show_jana" not in st.session_state:
     st.session_state["show_jana"] = False
 # medicines_list is the place we prefer (user can set it programmatically):
@@ -153,70 +92,76 @@ if "medicines_list" not in st.session_state:
     st.session_state["medicines_list"] = None
 
 # ---------- load CSV & fuzzy match helpers ----------
-def load_price_csv(path=CSV_PATH):
-    if not os.path.exists(path):
-        return None, None
+def csv_stamp(path=CSV_PATH):
+    """(mtime_ns, size) of the CSV, or None if missing; part of every catalog cache key"""
     try:
-        df = pd.read_csv(path)
+        info = os.stat(path)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+@st.cache_resource(show_spinner=False)
+def _shared_catalog(path, stamp):
+    # one catalog per process and CSV version, shared by all sessions
+    try:
+        return get_catalog(path)
     except Exception:
-        try:
-            df = pd.read_csv(path, encoding="latin1")
-        except Exception:
-            return None, None
-    name_col = None; price_col = None; vendor_col = None
-    for c in df.columns:
-        cl = c.lower()
-        if any(k in cl for k in ["product","product name","name","medicine","item","title"]) and not name_col:
-            name_col = c
-        if any(k in cl for k in ["price","mrp","rate","amount"]) and not price_col:
-            price_col = c
-        if any(k in cl for k in ["vendor","seller","store","shop","source"]) and not vendor_col:
-            vendor_col = c
-    return df, {"name":name_col,"price":price_col,"vendor":vendor_col}
-
-def find_best_price_info(med_name, df, cols_map, top_n=3):
-    if df is None or cols_map is None or cols_map.get("name") is None:
-        return []
-    name_col = cols_map["name"]; price_col = cols_map.get("price"); vendor_col = cols_map.get("vendor")
-    candidates = df[name_col].astype(str).tolist()
-    matches = difflib.get_close_matches(med_name, candidates, n=top_n, cutoff=0.5)
-    results = []
-    for m in matches:
-        idx = candidates.index(m)
-        price_val = None
-        vendor_val = None
-        if price_col and price_col in df.columns:
-            try:
-                price_val = float(str(df.at[idx, price_col]).replace(",","").strip())
-            except Exception:
-                price_val = None
-        if vendor_col and vendor_col in df.columns:
-            vendor_val = str(df.at[idx, vendor_col])
-        results.append({"match_name": m, "price": price_val, "vendor": vendor_val})
-    if not results:
-        # fallback substring
-        q = med_name.lower()
-        for i, cand in enumerate(candidates):
-            if q in cand.lower():
-                pv = None; vv = None
-                if price_col and price_col in df.columns:
-                    try:
-                        pv = float(str(df.at[i, price_col]).replace(",","").strip())
-                    except Exception:
-                        pv = None
-                if vendor_col and vendor_col in df.columns:
-                    vv = str(df.at[i, vendor_col])
-                results.append({"match_name": df.at[i, name_col], "price": pv, "vendor": vv})
-    return results
+        return None
+
+def load_price_catalog(path=CSV_PATH):
+    """Catalog index with typed prices and normalized names, or None if the CSV is missing/unreadable"""
+    stamp = csv_stamp(path)
+    if stamp is None:
+        return None
+    return _shared_catalog(path, stamp)
+
+def find_best_price_info(med_name, catalog):
+    """
+    Best catalog match for one medicine: the lookup API's pick
+    (janaushadhi_lookup.resolve_medicine, through its shared cache), else the
+    cheapest of the first name-substring matches. None if nothing matched.
+    """
+    if catalog is None:
+        return None
+    r = cached_resolve(catalog, ingredient_index_for(catalog), med_name)
+    if r["matched_name"] is not None:
+        return {"match_name": r["matched_name"], "price": r["price"], "vendor": r["vendor"],
+                "strength_match": r["strength_match"]}
+    # fallback substring
+    rows = catalog.substring_rows(med_name, limit=SUBSTRING_MATCHES)
+    if not rows:
+        return None
+    row = catalog.cheapest(rows)
+    return {"match_name": catalog.names[row], "price": catalog.price_of(row), "vendor": catalog.vendors[row],
+            "strength_match": None}
+
+@st.cache_data(max_entries=PRICE_CACHE_ENTRIES, ttl=PRICE_CACHE_TTL_S, show_spinner=False)
+def price_rows(meds, stamp, _catalog):
+    """Price table rows for a medicine list; keyed by (meds, CSV version), the catalog itself isn't hashed"""
+    rows = []
+    for med in meds:
+        best = find_best_price_info(med, _catalog)
+        if best:
+            rows.append({
+                "medicine": med,
+                "matched_name": best.get("match_name"),
+                "price": (f"₹{best.get('price'):.2f}" if best.get("price") is not None else "N/A"),
+                "vendor": best.get("vendor") or "",
+                # "No": only another strength of the medicine was found
+                "strength_match": {True: "Yes", False: "No", None: ""}[best["strength_match"]]
+            })
+        else:
+            rows.append({"medicine": med, "matched_name":"", "price":"Not found", "vendor":"", "strength_match":""})
+    return rows
+
+def clear_shared_caches():
+    """Drop cached catalog, routes and price tables for every session of this server"""
+    _shared_catalog.clear()
+    _cached_route.clear()
+    price_rows.clear()
 
 # load CSV if present
-if os.path.exists(CSV_PATH):
-    df_prices, cols_map = load_price_csv(CSV_PATH)
-    st.session_state["csv_df"] = df_prices
-    st.session_state["csv_cols"] = cols_map
-else:
-    st.session_state["csv_df"] = None
-    st.session_state["csv_cols"] = None
+st.session_state["catalog"] = load_price_catalog(CSV_PATH)
 
 # ---------- Sidebar: navigation ----------
 st.sidebar.header("Navigation")
@@ -227,6 +172,11 @@ if st.sidebar.button("**Jan Aushadhi**", key="btn_jana"):
 if st.sidebar.button("Show Map", key="btn_show_map"):
     st.session_state["show_jana"] = False
 
+if st.sidebar.button("Clear caches", key="btn_clear_caches", help="Reload the price CSV and re-fetch routes for all users"):
+    clear_shared_caches()
+    st.session_state["catalog"] = load_price_catalog(CSV_PATH)
+    st.sidebar.success("Caches cleared.")
+
 st.sidebar.markdown("---")
 st.sidebar.markdown("Map controls (optional) — regenerate map to update preserved view.")
 
@@ -258,6 +208,25 @@ manual_yellows = [c for c in [safe_parse(y1), safe_parse(y2), safe_parse(y3)] if
 manual_reds = [c for c in [safe_parse(r1), safe_parse(r2)] if c]
 
 # ---------- Map build function ----------
+def map_key(origin, greens, yellows, reds):
+    """Inputs that determine the base layer (origin, stores and their routes)"""
+    return (tuple(origin) if origin else None, tuple(greens), tuple(yellows), tuple(reds))
+
+def add_assignment_layers(m, a, origin):
+    agent = a["agent_coord"]
+    store = a["store_coord"]
+    prof = a["agent_profile"]
+    folium.Marker(location=agent, icon=folium.Icon(color="purple"),
+                  popup=Popup(IFrame(f"<b>{prof['name']}</b><br/>{prof['phone']}<br/>{prof['vehicle']}", width=220, height=90))).add_to(m)
+    if a.get("coords_agent_store"):
+        folium.PolyLine(a["coords_agent_store"], color=PURPLE_HEX, weight=5, opacity=0.9).add_to(m)
+    else:
+        folium.PolyLine([agent, store], color=PURPLE_HEX, weight=4, opacity=0.8, dash_array="3,6").add_to(m)
+    if a.get("coords_store_origin"):
+        folium.PolyLine(a["coords_store_origin"], color=PURPLE_HEX, weight=7, opacity=0.95).add_to(m)
+    else:
+        folium.PolyLine([store, origin], color=PURPLE_HEX, weight=6, opacity=0.9, dash_array="3,6").add_to(m)
+
 def build_map(origin, greens, yellows, reds, govs, assignments):
     m = folium.Map(location=origin or (12.9716,77.5946), zoom_start=13, tiles=TILE_URL, attr=ATTR)
     if origin:
@@ -293,32 +262,46 @@ def build_map(origin, greens, yellows, reds, govs, assignments):
         popup_html = f"<b>{g['name']}</b><br/>{g['address']}<br/><a href='{google_maps_link(origin, coord)}' target='_blank'>Directions</a>"
         folium.Marker(location=coord, icon=folium.Icon(color="blue", icon="info-sign"),
                       popup=Popup(IFrame(popup_html, width=320, height=140))).add_to(m)
-    for a in st.session_state["assignments"]:
-        agent = a["agent_coord"]
-        store = a["store_coord"]
-        prof = a["agent_profile"]
-        folium.Marker(location=agent, icon=folium.Icon(color="purple"),
-                      popup=Popup(IFrame(f"<b>{prof['name']}</b><br/>{prof['phone']}<br/>{prof['vehicle']}", width=220, height=90))).add_to(m)
-        if a.get("coords_agent_store"):
-            folium.PolyLine(a["coords_agent_store"], color=PURPLE_HEX, weight=5, opacity=0.9).add_to(m)
-        else:
-            folium.PolyLine([agent, store], color=PURPLE_HEX, weight=4, opacity=0.8, dash_array="3,6").add_to(m)
-        if a.get("coords_store_origin"):
-            folium.PolyLine(a["coords_store_origin"], color=PURPLE_HEX, weight=7, opacity=0.95).add_to(m)
-        else:
-            folium.PolyLine([store, origin], color=PURPLE_HEX, weight=6, opacity=0.9, dash_array="3,6").add_to(m)
+    for a in assignments:
+        add_assignment_layers(m, a, origin)
     all_pts = []
     if origin: all_pts.append(origin)
-    all_pts += greens + yellows + reds + [g["latlon"] for g in govs] + HIDDEN_AGENTS_COORDS
+    all_pts += greens + yellows + reds + [g["latlon"] for g in govs] + [a["latlon"] for a in get_agent_store().all()]
     try:
-        lats = [p[0] for p in all_pts if p]
-        lons = [p[1] for p in all_pts if p]
-        if lats and lons:
-            m.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]], padding=(20,20))
+        bounds = compute_bounds(all_pts)
+        if bounds:
+            m.fit_bounds(bounds, padding=(20,20))
     except Exception:
         pass
+    # keep the base map so later assignments only add their own layers
+    st.session_state["map_obj"] = m
+    st.session_state["map_key"] = map_key(origin, greens, yellows, reds)
     st.session_state["map_html"] = m._repr_html_()
 
+def add_assignment_to_map(assignment, origin, greens, yellows, reds, govs, assignments):
+    """Add one assignment to the preserved map; full rebuild only if the base inputs changed."""
+    m = st.session_state.get("map_obj")
+    if m is None or st.session_state.get("map_key") != map_key(origin, greens, yellows, reds):
+        build_map(origin, greens, yellows, reds, govs, assignments)
+        return
+    add_assignment_layers(m, assignment, origin)
+    st.session_state["map_html"] = m._repr_html_()
+
+# ---------- Dispatch ----------
+def dispatch_and_show(orders):
+    """Assign orders to the idle agents (Hungarian on travel times) and add them to the map."""
+    if not get_agent_store().ids(STATUS_FREE):
+        st.warning("All agents are busy.")
+        return
+    result = dispatch_orders(orders)
+    for assignment in result["assignments"]:
+        st.session_state["assignments"].append(assignment)
+        add_assignment_to_map(assignment, origin, manual_greens, manual_yellows, manual_reds, GOV_INITIATIVES, st.session_state["assignments"])
+    if result["assignments"]:
+        st.success(f"Assigned {len(result['assignments'])} order(s); total ETA {int(result['total_eta_s'] / 60)} min. Map updated (preserved).")
+    if result["unassigned"]:
+        st.warning(f"{len(result['unassigned'])} order(s) left waiting for a free agent.")
+
 # ---------- Generate Map ----------
 if st.sidebar.button("Generate Map (preserve)", key="generate_map_preserve"):
     build_map(origin, manual_greens, manual_yellows, manual_reds, GOV_INITIATIVES, st.session_state["assignments"])
@@ -373,32 +356,12 @@ with col_left:
             st.markdown("### Requested medicines")
             st.write(", ".join(meds))
             # price lookup using CSV
-            df = st.session_state.get("csv_df")
-            cols = st.session_state.get("csv_cols")
-            if df is None:
+            catalog = st.session_state.get("catalog")
+            if catalog is None:
                 st.warning(f"Price CSV not found at '{CSV_PATH}'. Place the CSV in project root to enable lookups.")
             else:
                 st.markdown("### Prices (best matches from CSV)")
-                rows = []
-                for med in meds:
-                    matches = find_best_price_info(med, df, cols, top_n=5)
-                    if matches:
-                        best = None
-                        for m in matches:
-                            if m.get("price") is not None:
-                                if best is None or m["price"] < best["price"]:
-                                    best = m
-                        if best is None:
-                            best = matches[0]
-                        rows.append({
-                            "medicine": med,
-                            "matched_name": best.get("match_name"),
-                            "price": (f"₹{best.get('price'):.2f}" if best.get("price") is not None else "N/A"),
-                            "vendor": best.get("vendor") or ""
-                        })
-                    else:
-                        rows.append({"medicine": med, "matched_name":"", "price":"Not found", "vendor":""})
-                df_prices = pd.DataFrame(rows)
+                df_prices = pd.DataFrame(price_rows(tuple(meds), csv_stamp(CSV_PATH), catalog))
                 st.dataframe(df_prices, use_container_width=True)
 
         st.markdown("---")
@@ -412,13 +375,20 @@ with col_left:
 # ---------- MIDDLE: Delivery Agents ----------
 with col_mid:
     st.markdown("## Delivery Agents")
-    st.markdown("Hidden / hardcoded agents and current assignments.")
+    st.markdown("Live agents (position, status) and current assignments.")
     agents_list = []
-    for i, coord in enumerate(HIDDEN_AGENTS_COORDS):
-        prof = AGENT_PROFILES[i] if i < len(AGENT_PROFILES) else {"name":f"Agent{i}","phone":"","vehicle":""}
-        agents_list.append({"idx": i, "name": prof["name"], "phone": prof["phone"], "vehicle": prof["vehicle"], "lat": coord[0], "lon": coord[1]})
+    for a in get_agent_store().all():
+        prof = a["profile"]
+        agents_list.append({"idx": a["agent_id"], "name": prof["name"], "phone": prof["phone"], "vehicle": prof["vehicle"],
+                            "status": a["status"], "lat": a["latlon"][0], "lon": a["latlon"][1]})
     df_agents = pd.DataFrame(agents_list)
     st.dataframe(df_agents, use_container_width=True, key="df_agents")
+    busy_ids = get_agent_store().ids(STATUS_BUSY)
+    if busy_ids:
+        done_idx = st.selectbox("Mark delivery complete for agent", options=busy_ids, key="release_agent_select")
+        if st.button("Mark agent free", key="release_agent"):
+            get_agent_store().release(done_idx)
+            st.success("Agent marked free.")
 
     st.markdown("### Current assignments")
     if st.session_state["assignments"]:
@@ -444,30 +414,21 @@ with col_mid:
     for s in SHOP_DATABASE:
         store_options.append((s["name"], s["latlon"]))
     chosen_store = st.selectbox("Choose store to assign (quick)", options=store_options, format_func=lambda x: x[0], key="quick_store_select")
-    if st.button("Assign random agent to chosen store", key="assign_random_quick"):
-        store_coord = chosen_store[1]
-        agent_idx = random.randrange(len(HIDDEN_AGENTS_COORDS))
-        agent_coord = HIDDEN_AGENTS_COORDS[agent_idx]
-        agent_profile = AGENT_PROFILES[agent_idx] if agent_idx < len(AGENT_PROFILES) else {"name":"Agent","phone":"", "vehicle":""}
-        coords_ag_st, dist_ag_st, dur_ag_st = get_osrm_route(agent_coord, store_coord)
-        coords_st_org, dist_st_org, dur_st_org = get_osrm_route(store_coord, origin) if origin else (None,None,None)
-        if dist_ag_st is None:
-            dist_ag_st = haversine_m(agent_coord, store_coord)
-        if dist_st_org is None:
-            dist_st_org = haversine_m(store_coord, origin) if origin else 0.0
-        total_m = None
-        if dist_ag_st is not None and dist_st_org is not None:
-            total_m = dist_ag_st + dist_st_org
-        charge = None
-        if total_m is not None:
-            km = total_m/1000.0
-            if km <= 5: charge = 20
-            elif km <= 10: charge = 30
-            else: charge = 50
-        assignment = {"agent_idx":agent_idx,"agent_coord":agent_coord,"agent_profile":agent_profile,"store_coord":store_coord,"coords_agent_store":coords_ag_st,"coords_store_origin":coords_st_org,"total_m":total_m,"charge":charge}
-        st.session_state["assignments"].append(assignment)
-        build_map(origin, manual_greens, manual_yellows, manual_reds, GOV_INITIATIVES, st.session_state["assignments"])
-        st.success("Agent assigned and map updated (preserved).")
+    if st.button("Assign best free agent to chosen store", key="assign_random_quick"):
+        if not origin:
+            st.error("Set a valid origin first.")
+        else:
+            dispatch_and_show([{"store": chosen_store[1], "origin": origin, "shop_name": chosen_store[0]}])
+
+    # Batch dispatch: several pending orders solved together, so they don't pile onto one rider
+    batch_stores = st.multiselect("Pending orders (stores) to dispatch together", options=store_options, format_func=lambda x: x[0], key="batch_store_select")
+    if st.button("Dispatch pending orders", key="dispatch_batch"):
+        if not origin:
+            st.error("Set a valid origin first.")
+        elif not batch_stores:
+            st.info("Pick at least one store.")
+        else:
+            dispatch_and_show([{"store": latlon, "origin": origin, "shop_name": name} for name, latlon in batch_stores])
 
 # ---------- RIGHT: Map (preserved) ----------
 with col_right:
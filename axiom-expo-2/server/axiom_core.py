@@ -0,0 +1,340 @@
+"""
+Axiom core — configuration tables and the process-wide services both front
+ends (delivery_map.py for the Node server, app12.py for Streamlit) share:
+routing with its persistent route cache, travel matrices, shop/clinic lookup,
+the live agent store and the Jan Aushadhi catalog. Everything stateful is
+created on first use, once per process.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
+
+import numpy as np
+
+from sqlite_cache import SQLiteCache
+from spatial_index import SpatialIndex
+from agent_store import AgentStore
+from geo import haversine_m, haversine_matrix
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ---------- CONFIG ----------
+# routing engine: ROUTING_BACKEND=osrm (default) or local (needs ROAD_GRAPH_PATH, see build_road_graph.py)
+OSRM_SERVER = os.environ.get("OSRM_SERVER", "https://router.project-osrm.org")
+TILE_URL = "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
+ATTR = "© OpenStreetMap contributors"
+YELLOW_SHADES = ["#E0A800", "#FFD43B", "#FFEB99"]
+PURPLE_HEX = "#800080"
+BLUE_GOV_COLOR = "blue"
+# match radius for shop coordinate -> name mapping (meters)
+MATCH_RADIUS_METERS = 50.0
+
+# one deadline for every routing call, retries included (the front ends used to drift: 12 s vs 18 s);
+# while the upstream's circuit breaker is open calls fail fast and callers use the haversine estimate
+ROUTING_TIMEOUT_S = float(os.environ.get("ROUTING_TIMEOUT_S", "15"))
+
+# OSRM route cache (SQLite next to this script unless ROUTE_CACHE_PATH is set)
+ROUTE_CACHE_PATH = os.environ.get(
+    "ROUTE_CACHE_PATH", os.path.join(_HERE, "route_cache.db"))
+ROUTE_CACHE_TTL_S = 7 * 24 * 3600
+ROUTE_CACHE_MAX_ENTRIES = 5000
+# coordinates are rounded to this many decimals for the cache key (~1 m)
+ROUTE_CACHE_DECIMALS = 5
+# max concurrent route requests while building one map
+ROUTE_FETCH_WORKERS = 8
+# offline travel-time estimate when the OSRM table service is unreachable:
+# straight-line distance x road factor, driven at a typical city speed
+ROAD_FACTOR = 1.3
+FALLBACK_SPEED_MPS = 25.0 / 3.6
+
+# Jan Aushadhi product catalog (next to this script unless CATALOG_CSV_PATH is set)
+CATALOG_CSV_PATH = os.environ.get(
+    "CATALOG_CSV_PATH", os.path.join(_HERE, "Product List_6_11_2025 @ 15_1_15.csv"))
+
+# live agent state (agents.db unless AGENT_DB_PATH is set); seeded from the tables below.
+AGENT_DB_PATH = os.environ.get(
+    "AGENT_DB_PATH", os.path.join(_HERE, "agents.db"))
+
+# Hidden agents + profiles (initial fleet for the agent store)
+HIDDEN_AGENTS_COORDS = [
+    (12.9650, 77.6000),
+    (12.9800, 77.5900),
+    (12.9550, 77.6050),
+    (12.9750, 77.6100),
+    (12.9900, 77.5800)
+]
+
+AGENT_PROFILES = [
+    {"name": "Ravi Kumar", "phone": "+91-98765-00001", "vehicle": "Bike - KTM Duke"},
+    {"name": "Asha Devi", "phone": "+91-98765-00002", "vehicle": "Scooter - TVS Jupiter"},
+    {"name": "Suresh N", "phone": "+91-98765-00003", "vehicle": "Bike - Hero Splendor"},
+    {"name": "Priya R", "phone": "+91-98765-00004", "vehicle": "Scooter - Honda Activa"},
+    {"name": "Manoj K", "phone": "+91-98765-00005", "vehicle": "Bike - Yamaha FZ"}
+]
+
+# ------------------ Known shop DB ------------------
+SHOP_DATABASE = [
+    {"name": "MedPlus Rajarajeshwari Nagar", "latlon": (12.9260174804538, 77.51873873639585)},
+    {"name": "MedPLus RR Nagar, Kenchenahalli Road", "latlon": (12.916062252168635, 77.51315974188867)},
+    {"name": "MedPlus RR Nagar, 60 Feet Road", "latlon": (12.912046585611204, 77.52105616488345)},
+    {"name": "Apollo Pharmacy Kenchenahalli Road, RR Nagar", "latlon": (12.910958998147274, 77.51350306462756)},
+    {"name": "Lakshmi Pharma", "latlon": (12.900447828509314, 77.5096368705969)},
+    {"name": "Omkar Medicals and General Store", "latlon": (12.907003244263793, 77.5049541035601)},
+    {"name": "Be Well Drugs", "latlon": (12.909722477406175, 77.50923833723208)},
+    {"name": "Krishna Medicals and Departmental Stores", "latlon": (12.907120961825331, 77.49881980852739)}
+]
+
+# Hardcoded GOV initiatives with full addresses
+GOV_INITIATIVES = [
+    {
+        "name": "Pradhan Mantri JanAushadhi Kendra - Gokhale Rd",
+        "address": "921, Gokhale Rd, Behind rangamadira, III Stage 3 Block, BEML Layout 3rd Stage, Rajarajeshwari Nagar, Bengaluru, Karnataka 560098",
+        "latlon": (12.917612214940876, 77.51904488091897)
+    },
+    {
+        "name": "Pradhan Mantri Janaushadhi Kendra - BHEL / Sir M Vishveshwaraiah Main Rd",
+        "address": "Sir M Vishveshwaraiah Main Rd, BHEL 2nd Stage, Pattanagere, Rajarajeshwari Nagar, Bengaluru, Karnataka 560098",
+        "latlon": (12.917612214940876, 77.50978399033598)
+    },
+    {
+        "name": "Pradhan Mantri Jan Aushadhi Kendra - Kenchena Halli Rd (YGR signature Mall)",
+        "address": "17 ground floor, 1st main road, Kenchena Halli Rd, opposite to YGR signature Mall, 5th Stage, Rajarajeshwari Nagar, Bengaluru, Karnataka 560098",
+        "latlon": (12.910492603965448, 77.51343617253772)
+    },
+    {
+        "name": "PRADHAN MANTRI BHARTIYA JANAUSHADHI KENDRA - Channasandra",
+        "address": "No 851, Dr.Vishnuvardhan Rd, Channasandra, Srinivaspura, Bengaluru, Karnataka 560098",
+        "latlon": (12.903563502133089, 77.52067531940189)
+    },
+    {
+        "name": "Pradhan mantri Janaushadhi kendra - Kodipalya",
+        "address": "Shop No.F4, Vasthu Green Shopping Complex, near Gutte Anjaneya swamy Temple, Kodipalya, Bengaluru, Karnataka 560060",
+        "latlon": (12.906666049048614, 77.48845393143118)
+    },
+    {
+        "name": "Pradhan Mantri Bhartiya Jan Aushadhi Kendra Kengeri",
+        "address": "WF7J+W7F, #674 ,3RD MAIN ROAD, KOMMAGHATTA ROAD, NEAR HOTEL NAMMANE COFFEE KENGERI SATALLITE TOWN, Kengeri, Bengaluru, Karnataka 560060",
+        "latlon": (12.915871335395288, 77.4804822691128)
+    }
+]
+
+# Jan Aushadhi clinics as the lookup API returns them (its own names and short addresses)
+JAN_AUSHADHI_CLINICS = [
+    {
+        "name": "Pradhan Mantri JanAushadhi Kendra - Gokhale Rd",
+        "address": "921, Gokhale Rd, Rajarajeshwari Nagar, Bengaluru 560098",
+        "lat": 12.917612214940876,
+        "lon": 77.51904488091897
+    },
+    {
+        "name": "Pradhan Mantri Janaushadhi Kendra - BHEL 2nd Stage",
+        "address": "Sir M Vishnuvardhan Main Rd, Rajarajeshwari Nagar, Bengaluru 560098",
+        "lat": 12.917612214940876,
+        "lon": 77.50978399033598
+    },
+    {
+        "name": "Pradhan Mantri Jan Aushadhi Kendra - Kenchena Halli Rd",
+        "address": "17 ground floor, Kenchena Halli Rd, Rajarajeshwari Nagar, Bengaluru 560098",
+        "lat": 12.910492603965448,
+        "lon": 77.51343617253772
+    },
+    {
+        "name": "PRADHAN MANTRI BHARTIYA JANAUSHADHI KENDRA - Channasandra",
+        "address": "No 851, Dr.Vishnuvardhan Rd, Channasandra, Bengaluru 560098",
+        "lat": 12.903563502133089,
+        "lon": 77.52067531940189
+    },
+    {
+        "name": "Pradhan mantri Janaushadhi kendra - Kodipalya",
+        "address": "Shop No.F4, Vasthu Green Shopping Complex, Kodipalya, Bengaluru, Karnataka 560060",
+        "lat": 12.906666049048614,
+        "lon": 77.48845393143118
+    },
+    {
+        "name": "Pradhan Mantri Bhartiya Jan Aushadhi Kendra Kengeri",
+        "address": "Kengeri, Bengaluru, Karnataka 560060",
+        "lat": 12.915871335395288,
+        "lon": 77.4804822691128
+    }
+]
+
+# Spatial indexes over shops and clinics, built once at load
+SHOP_INDEX = SpatialIndex.from_items(SHOP_DATABASE)
+GOV_INDEX = SpatialIndex.from_items(GOV_INITIATIVES)
+
+# -------------- Helper Functions ----------------
+def parse_coord(txt: str):
+    """Parse coordinate string 'lat, lon' into tuple (lat, lon)"""
+    parts = [p.strip() for p in txt.split(",")]
+    return (float(parts[0]), float(parts[1]))
+
+def find_shop_name(coord):
+    """Return the nearest shop in SHOP_DATABASE within MATCH_RADIUS_METERS of coord, or None."""
+    hits = SHOP_INDEX.nearest(coord, k=1, max_radius_m=MATCH_RADIUS_METERS)
+    if not hits:
+        return None
+    _, shop, d = hits[0]
+    return {"name": shop["name"], "latlon": shop["latlon"], "distance_m": d}
+
+def shops_near(point, radius_m=None, k=None):
+    """Known shops around point as (shop, distance_m) pairs, nearest first (radius and/or k-nearest)."""
+    if k is None and radius_m is None:
+        raise ValueError("shops near a point need radius_m, k or both")
+    if k is not None:
+        hits = SHOP_INDEX.nearest(point, k=k, max_radius_m=radius_m)
+    else:
+        hits = SHOP_INDEX.within_radius(point, radius_m)
+    return [(shop, d) for _, shop, d in hits]
+
+def clinics_near(point, radius_m=None, k=None):
+    """Jan Aushadhi clinics around point as (clinic, distance_m) pairs, nearest first."""
+    if k is None and radius_m is None:
+        raise ValueError("clinics near a point need radius_m, k or both")
+    if k is not None:
+        hits = GOV_INDEX.nearest(point, k=k, max_radius_m=radius_m)
+    else:
+        hits = GOV_INDEX.within_radius(point, radius_m)
+    return [(clinic, d) for _, clinic, d in hits]
+
+def routing_backend():
+    """The process-wide routing backend (one HTTP session / graph per process)"""
+    # imported here so catalog-only workers never pay for requests
+    from routing_backends import get_routing_backend
+    return get_routing_backend(osrm_server=OSRM_SERVER, timeout=ROUTING_TIMEOUT_S)
+
+def google_maps_link(origin, dest):
+    """Generate Google Maps directions link"""
+    params = {
+        "api": "1",
+        "origin": f"{origin[0]},{origin[1]}",
+        "destination": f"{dest[0]},{dest[1]}",
+        "travelmode": "driving"
+    }
+    return "https://www.google.com/maps/dir/?" + "&".join(f"{k}={quote_plus(str(v))}" for k,v in params.items())
+
+_route_cache = None
+
+def get_route_cache():
+    """Lazily open the shared route cache; returns None if it can't be opened."""
+    global _route_cache
+    if _route_cache is None:
+        try:
+            _route_cache = SQLiteCache(ROUTE_CACHE_PATH, table="osrm_routes",
+                                       ttl_s=ROUTE_CACHE_TTL_S, max_entries=ROUTE_CACHE_MAX_ENTRIES)
+        except Exception:
+            _route_cache = False
+    return _route_cache or None
+
+def route_cache_key(src, dst, profile="driving"):
+    """Cache key: backend + profile + (src, dst) rounded to ROUTE_CACHE_DECIMALS."""
+    d = ROUTE_CACHE_DECIMALS
+    backend = routing_backend().name
+    return f"{backend}:{profile}:{round(src[0], d)},{round(src[1], d)};{round(dst[0], d)},{round(dst[1], d)}"
+
+def fetch_osrm_route(src, dst, profile="driving"):
+    """Uncached route from the configured routing backend. Returns (coords_list, distance_m, duration_s) or (None, None, None)"""
+    return routing_backend().route(src, dst, profile)
+
+def get_osrm_route(src, dst, profile="driving"):
+    """
+    Get route, served from the persistent route cache when possible.
+    Returns (coords_list, distance_m, duration_s) or (None, None, None).
+    Failed lookups are not cached so they are retried on the next call.
+    """
+    cache = get_route_cache()
+    key = route_cache_key(src, dst, profile)
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit["coords"], hit["distance"], hit["duration"]
+    coords, dist, dur = fetch_osrm_route(src, dst, profile)
+    if cache is not None and coords:
+        cache.set(key, {"coords": coords, "distance": dist, "duration": dur})
+    return coords, dist, dur
+
+def get_osrm_routes(src, dsts, profile="driving", max_workers=ROUTE_FETCH_WORKERS):
+    """
+    Resolve routes from src to every point in dsts concurrently.
+    Returns {(lat, lon): (coords_list, distance_m, duration_s)}; failed routes
+    map to (None, None, None) just like get_osrm_route.
+    """
+    unique = list(dict.fromkeys(tuple(d) for d in dsts))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as pool:
+        results = pool.map(lambda d: get_osrm_route(src, d, profile), unique)
+        return dict(zip(unique, results))
+
+def fetch_osrm_table(sources, destinations, profile="driving"):
+    """
+    Many-to-many matrix from the configured routing backend (OSRM /table or the local graph).
+    Returns (durations_s, distances_m) as lists of rows (one per source), cells may be None.
+    Returns (None, None) if the backend is unreachable.
+    """
+    return routing_backend().table(sources, destinations, profile)
+
+def estimate_leg(src, dst):
+    """Offline (distance_m, duration_s) estimate from haversine and ROAD_FACTOR."""
+    dist = haversine_m(src, dst) * ROAD_FACTOR
+    return dist, dist / FALLBACK_SPEED_MPS
+
+def estimate_matrix(sources, destinations):
+    """Offline (durations_s, distances_m) arrays for all pairs, one vectorized haversine."""
+    dist = haversine_matrix(sources, destinations) * ROAD_FACTOR
+    return dist / FALLBACK_SPEED_MPS, dist
+
+def get_travel_matrix(sources, destinations, profile="driving"):
+    """
+    Many-to-many travel matrix in a single request.
+    Returns (durations_s, distances_m); any cell OSRM couldn't fill (or the whole
+    matrix, when the service is down) falls back to estimate_matrix().
+    """
+    durations, distances = fetch_osrm_table(sources, destinations, profile)
+    shape = (len(sources), len(destinations))
+    # None cells become NaN, then get patched from the offline estimate
+    dur = np.array(durations, dtype=np.float64) if durations else np.full(shape, np.nan)
+    dist = np.array(distances, dtype=np.float64) if distances else np.full(shape, np.nan)
+    missing = np.isnan(dur) | np.isnan(dist)
+    if missing.any():
+        est_dur, est_dist = estimate_matrix(sources, destinations)
+        dur = np.where(np.isnan(dur), est_dur, dur)
+        dist = np.where(np.isnan(dist), est_dist, dist)
+    return dur.tolist(), dist.tolist()
+
+# ---------- AGENT STORE ----------
+_agent_store = None
+
+def get_agent_store():
+    """Process-wide AgentStore, seeded from HIDDEN_AGENTS_COORDS / AGENT_PROFILES on first use"""
+    global _agent_store
+    if _agent_store is None:
+        _agent_store = AgentStore(AGENT_DB_PATH)
+        _agent_store.seed(HIDDEN_AGENTS_COORDS, AGENT_PROFILES)
+        _agent_store.start_background_flush()
+    return _agent_store
+
+# ---------- CATALOG ----------
+def get_catalog(csv_path=None):
+    """
+    Jan Aushadhi CatalogIndex (memory-mapped, reloaded when the CSV changes).
+    Imported lazily so routing-only processes never load pandas.
+    """
+    from janaushadhi_index import load_catalog_index
+    return load_catalog_index(csv_path or CATALOG_CSV_PATH)
+
+# ---------- POPUPS ----------
+def make_popup_html(title, point, dist_m=None, dur_s=None, gm_link=None, extra_html="", route_id=None):
+    """Create HTML popup content for map markers"""
+    lines = [f"<b>{title}</b>", f"{point[0]:.6f}, {point[1]:.6f}"]
+    if dist_m is not None:
+        lines.append(f"Distance: {dist_m/1000.0:.2f} km")
+    if dur_s is not None:
+        lines.append(f"ETA: {int(dur_s/60)} min")
+    if gm_link:
+        lines.append(f"<a href='{gm_link}' target='_blank' rel='noopener noreferrer'>Open in Google Maps</a>")
+    if extra_html:
+        lines.append(extra_html)
+    # Add route_id as data attribute for JavaScript
+    route_attr = f' data-route-id="{route_id}"' if route_id else ''
+    return f'<div{route_attr}>' + "<br>".join(lines) + '</div>'
@@ -0,0 +1,109 @@
+"""
+Convert an OpenStreetMap XML extract (.osm) of the service area into the compact
+CSR road graph used by routing_backends.LocalGraphBackend.
+
+Usage:
+    python build_road_graph.py bengaluru.osm road_graph.npz
+"""
+
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from geo import haversine_pairwise
+
+# typical urban speeds per highway class (km/h)
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 80, "motorway_link": 50,
+    "trunk": 60, "trunk_link": 40,
+    "primary": 45, "primary_link": 35,
+    "secondary": 40, "secondary_link": 30,
+    "tertiary": 30, "tertiary_link": 25,
+    "unclassified": 25, "residential": 20,
+    "living_street": 10, "service": 15,
+}
+
+
+def parse_osm(osm_path):
+    """Returns ({osm_node_id: (lat, lon)}, [(node_refs, speed_kmh, oneway)])"""
+    nodes = {}
+    ways = []
+    for _, elem in ET.iterparse(osm_path, events=("end",)):
+        if elem.tag == "node":
+            nodes[elem.get("id")] = (float(elem.get("lat")), float(elem.get("lon")))
+            elem.clear()
+        elif elem.tag == "way":
+            tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+            highway = tags.get("highway")
+            if highway in HIGHWAY_SPEEDS_KMH:
+                refs = [nd.get("ref") for nd in elem.findall("nd")]
+                oneway = tags.get("oneway") in ("yes", "1", "true") or highway.startswith("motorway")
+                reverse = tags.get("oneway") == "-1"
+                if reverse:
+                    refs.reverse()
+                    oneway = True
+                ways.append((refs, HIGHWAY_SPEEDS_KMH[highway], oneway))
+            elem.clear()
+    return nodes, ways
+
+
+def build_csr(nodes, ways):
+    """Build CSR arrays over the nodes actually used by routable ways."""
+    node_index = {}
+    lat = []
+    lon = []
+    edges = []  # (u, v, speed_mps)
+
+    def idx(ref):
+        i = node_index.get(ref)
+        if i is None:
+            i = node_index[ref] = len(lat)
+            lat.append(nodes[ref][0])
+            lon.append(nodes[ref][1])
+        return i
+
+    for refs, speed_kmh, oneway in ways:
+        refs = [r for r in refs if r in nodes]
+        speed = speed_kmh / 3.6
+        for a, b in zip(refs, refs[1:]):
+            u, v = idx(a), idx(b)
+            edges.append((u, v, speed))
+            if not oneway:
+                edges.append((v, u, speed))
+
+    n = len(lat)
+    edges.sort(key=lambda e: e[0])
+    node_lat = np.asarray(lat, dtype=np.float64)
+    node_lon = np.asarray(lon, dtype=np.float64)
+    src = np.asarray([e[0] for e in edges], dtype=np.int64)
+    dst = np.asarray([e[1] for e in edges], dtype=np.int64)
+    # all edge lengths in one vectorized haversine
+    length_m = haversine_pairwise(np.column_stack([node_lat[src], node_lon[src]]),
+                                  np.column_stack([node_lat[dst], node_lon[dst]]))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(indptr, src + 1, 1)
+    np.cumsum(indptr, out=indptr)
+    return {
+        "node_lat": node_lat,
+        "node_lon": node_lon,
+        "indptr": indptr,
+        "indices": dst.astype(np.int32),
+        "length_m": length_m.astype(np.float32),
+        "speed_mps": np.asarray([e[2] for e in edges], dtype=np.float32),
+    }
+
+
+def build_road_graph(osm_path, out_path):
+    nodes, ways = parse_osm(osm_path)
+    graph = build_csr(nodes, ways)
+    np.savez_compressed(out_path, **graph)
+    return len(graph["node_lat"]), len(graph["indices"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.stderr.write("Usage: python build_road_graph.py <extract.osm> <road_graph.npz>\n")
+        sys.exit(1)
+    n_nodes, n_edges = build_road_graph(sys.argv[1], sys.argv[2])
+    print(f"Wrote {sys.argv[2]}: {n_nodes} nodes, {n_edges} edges")
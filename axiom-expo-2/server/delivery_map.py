@@ -2,580 +2,204 @@
 Delivery Map — Core Python Functions
 Pure Python implementation without Streamlit dependencies.
 All functionality extracted into callable functions for backend use.
+Shared tables, routing and the agent store live in axiom_core, agent selection
+and dispatch in agent_dispatch; this module adds map payloads, map sessions and
+the JSON-lines worker protocol.
 """
 
-import folium
-from folium import IFrame, Popup
-from branca.element import Element
-import requests
-import random
 import json
-import math
-from urllib.parse import quote_plus
+import os
+import sys
+
+from axiom_core import (
+    TILE_URL, ATTR, PURPLE_HEX, BLUE_GOV_COLOR, GOV_INITIATIVES,
+    find_shop_name, google_maps_link,
+    routing_backend, get_route_cache, get_osrm_routes,
+    get_agent_store, make_popup_html
+)
+from agent_dispatch import create_assignment, dispatch_orders, plan_batched_deliveries
+from map_renderer import render_map_html
+from map_sessions import MapSessionStore
+from agent_store import STATUS_FREE
+from route_geometry import pack_route
+from geo import compute_bounds
 
 # ---------- CONFIG ----------
-OSRM_SERVER = "https://router.project-osrm.org"
-TILE_URL = "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
-ATTR = "© OpenStreetMap contributors"
-YELLOW_SHADES = ["#E0A800", "#FFD43B", "#FFEB99"]
-PURPLE_HEX = "#800080"
-BLUE_GOV_COLOR = "blue"
-# match radius for shop coordinate -> name mapping (meters)
-MATCH_RADIUS_METERS = 50.0
-
-# Hidden agents + profiles
-HIDDEN_AGENTS_COORDS = [
-    (12.9650, 77.6000),
-    (12.9800, 77.5900),
-    (12.9550, 77.6050),
-    (12.9750, 77.6100),
-    (12.9900, 77.5800)
-]
-
-AGENT_PROFILES = [
-    {"name": "Ravi Kumar", "phone": "+91-98765-00001", "vehicle": "Bike - KTM Duke"},
-    {"name": "Asha Devi", "phone": "+91-98765-00002", "vehicle": "Scooter - TVS Jupiter"},
-    {"name": "Suresh N", "phone": "+91-98765-00003", "vehicle": "Bike - Hero Splendor"},
-    {"name": "Priya R", "phone": "+91-98765-00004", "vehicle": "Scooter - Honda Activa"},
-    {"name": "Manoj K", "phone": "+91-98765-00005", "vehicle": "Bike - Yamaha FZ"}
-]
-
-# ------------------ Known shop DB ------------------
-SHOP_DATABASE = [
-    {"name": "MedPlus Rajarajeshwari Nagar", "latlon": (12.9260174804538, 77.51873873639585)},
-    {"name": "MedPLus RR Nagar, Kenchenahalli Road", "latlon": (12.916062252168635, 77.51315974188867)},
-    {"name": "MedPlus RR Nagar, 60 Feet Road", "latlon": (12.912046585611204, 77.52105616488345)},
-    {"name": "Apollo Pharmacy Kenchenahalli Road, RR Nagar", "latlon": (12.910958998147274, 77.51350306462756)},
-    {"name": "Lakshmi Pharma", "latlon": (12.900447828509314, 77.5096368705969)},
-    {"name": "Omkar Medicals and General Store", "latlon": (12.907003244263793, 77.5049541035601)},
-    {"name": "Be Well Drugs", "latlon": (12.909722477406175, 77.50923833723208)},
-    {"name": "Krishna Medicals and Departmental Stores", "latlon": (12.907120961825331, 77.49881980852739)}
-]
-
-# Hardcoded GOV initiatives with full addresses
-GOV_INITIATIVES = [
-    {
-        "name": "Pradhan Mantri JanAushadhi Kendra - Gokhale Rd",
-        "address": "921, Gokhale Rd, Behind rangamadira, III Stage 3 Block, BEML Layout 3rd Stage, Rajarajeshwari Nagar, Bengaluru, Karnataka 560098",
-        "latlon": (12.917612214940876, 77.51904488091897)
-    },
-    {
-        "name": "Pradhan Mantri Janaushadhi Kendra - BHEL / Sir M Vishveshwaraiah Main Rd",
-        "address": "Sir M Vishveshwaraiah Main Rd, BHEL 2nd Stage, Pattanagere, Rajarajeshwari Nagar, Bengaluru, Karnataka 560098",
-        "latlon": (12.917612214940876, 77.50978399033598)
-    },
-    {
-        "name": "Pradhan Mantri Jan Aushadhi Kendra - Kenchena Halli Rd (YGR signature Mall)",
-        "address": "17 ground floor, 1st main road, Kenchena Halli Rd, opposite to YGR signature Mall, 5th Stage, Rajarajeshwari Nagar, Bengaluru, Karnataka 560098",
-        "latlon": (12.910492603965448, 77.51343617253772)
-    },
-    {
-        "name": "PRADHAN MANTRI BHARTIYA JANAUSHADHI KENDRA - Channasandra",
-        "address": "No 851, Dr.Vishnuvardhan Rd, Channasandra, Srinivaspura, Bengaluru, Karnataka 560098",
-        "latlon": (12.903563502133089, 77.52067531940189)
-    },
-    {
-        "name": "Pradhan mantri Janaushadhi kendra - Kodipalya",
-        "address": "Shop No.F4, Vasthu Green Shopping Complex, near Gutte Anjaneya swamy Temple, Kodipalya, Bengaluru, Karnataka 560060",
-        "latlon": (12.906666049048614, 77.48845393143118)
-    },
-    {
-        "name": "Pradhan Mantri Bhartiya Jan Aushadhi Kendra Kengeri",
-        "address": "WF7J+W7F, #674 ,3RD MAIN ROAD, KOMMAGHATTA ROAD, NEAR HOTEL NAMMANE COFFEE KENGERI SATALLITE TOWN, Kengeri, Bengaluru, Karnataka 560060",
-        "latlon": (12.915871335395288, 77.4804822691128)
-    }
-]
-
-# -------------- Helper Functions ----------------
-def parse_coord(txt: str):
-    """Parse coordinate string 'lat, lon' into tuple (lat, lon)"""
-    parts = [p.strip() for p in txt.split(",")]
-    return (float(parts[0]), float(parts[1]))
-
-def haversine_m(p1, p2):
-    """Calculate haversine distance between two points in meters"""
-    # p1, p2 are (lat, lon)
-    R = 6371000.0
-    lat1, lon1 = math.radians(p1[0]), math.radians(p1[1])
-    lat2, lon2 = math.radians(p2[0]), math.radians(p2[1])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)**2
-    return 2 * R * math.asin(math.sqrt(a))
-
-def find_shop_name(coord):
-    """Return shop dict if any in SHOP_DATABASE is within MATCH_RADIUS_METERS of coord."""
-    for shop in SHOP_DATABASE:
-        d = haversine_m(coord, shop["latlon"])
-        if d <= MATCH_RADIUS_METERS:
-            return {"name": shop["name"], "latlon": shop["latlon"], "distance_m": d}
-    return None
-
-def google_maps_link(origin, dest):
-    """Generate Google Maps directions link"""
-    params = {
-        "api": "1",
-        "origin": f"{origin[0]},{origin[1]}",
-        "destination": f"{dest[0]},{dest[1]}",
-        "travelmode": "driving"
-    }
-    return "https://www.google.com/maps/dir/?" + "&".join(f"{k}={quote_plus(str(v))}" for k,v in params.items())
-
-def get_osrm_route(src, dst, profile="driving"):
-    """Get route from OSRM server. Returns (coords_list, distance_m, duration_s) or (None, None, None)"""
-    coords_str = f"{src[1]},{src[0]};{dst[1]},{dst[0]}"
-    url = f"{OSRM_SERVER}/route/v1/{profile}/{coords_str}?overview=full&geometries=geojson"
-    try:
-        r = requests.get(url, timeout=18)
-        r.raise_for_status()
-        j = r.json()
-        if j.get("code") != "Ok" or not j.get("routes"):
-            return None, None, None
-        route = j["routes"][0]
-        geom = route["geometry"]["coordinates"]  # lon,lat
-        coords_latlon = [[c[1], c[0]] for c in geom]
-        return coords_latlon, route.get("distance"), route.get("duration")
-    except Exception:
-        return None, None, None
-
-def compute_billing_from_meters(total_m):
-    """Compute billing charge from total distance in meters"""
-    if total_m is None:
-        return None
-    km = total_m/1000.0
-    if km <= 5.0:
-        return 20
-    elif km <= 10.0:
-        return 30
+# shared tables, routing, agent store: see axiom_core.py
+# marker pin colors (same palette the old Folium icons used)
+MARKER_COLORS = {
+    "red": "#d63e2a",
+    "orange": "#f69730",
+    "green": "#72af26",
+    "blue": "#38aadd",
+    "purple": "#d252b9"
+}
+# route geometry transport: Douglas-Peucker tolerance (meters) and encoded-polyline precision (5 or 6)
+ROUTE_SIMPLIFY_TOLERANCE_M = float(os.environ.get("ROUTE_SIMPLIFY_TOLERANCE_M", "5"))
+POLYLINE_PRECISION = int(os.environ.get("POLYLINE_PRECISION", "5"))
+
+def _marker(latlon, color, popup, route_id=None, glyph=None, marker_id=None):
+    m = {"latlon": list(latlon), "color": MARKER_COLORS.get(color, color), "popup": popup}
+    if marker_id:
+        m["id"] = marker_id
+    if route_id:
+        m["route_id"] = route_id
+    if glyph:
+        m["glyph"] = glyph
+    return m
+
+def _polyline(routes, route_id, coords, color, weight, opacity, dash=None, fallback=False):
+    """Polyline style entry; its simplified, encoded geometry goes into routes[route_id]."""
+    routes[route_id] = pack_route(coords, ROUTE_SIMPLIFY_TOLERANCE_M, POLYLINE_PRECISION)
+    p = {"id": route_id, "color": color, "weight": weight, "opacity": opacity}
+    if dash:
+        p["dash"] = dash
+    if fallback:
+        p["fallback"] = True
+    return p
+
+def assignment_layers(a, origin, prefix):
+    """
+    Map layers for one assignment: agent marker, purple agent->store and
+    store->origin legs, and the store circle. Every layer id starts with prefix
+    so the assignment can be patched in or out of a rendered map on its own.
+    Returns {"markers", "polylines", "circles", "routes"}.
+    """
+    routes_geom = {}
+    polylines = []
+    agent_coord = a["agent_coord"]
+    profile = a["agent_profile"]
+    store_coord = a["store_coord"]
+    profile_html = f"<b>{profile['name']}</b><br>{profile['phone']}<br>{profile['vehicle']}"
+    popup = make_popup_html("Assigned Agent", agent_coord, gm_link=google_maps_link(agent_coord, store_coord), extra_html=profile_html)
+    marker = _marker(agent_coord, "purple", popup, marker_id=f"{prefix}_agent")
+    if a.get("coords_agent_store"):
+        polylines.append(_polyline(routes_geom, f"{prefix}_agent_store", a["coords_agent_store"], PURPLE_HEX, 5, 0.9))
+    else:
+        polylines.append(_polyline(routes_geom, f"{prefix}_agent_store", [agent_coord, store_coord], PURPLE_HEX, 4, 0.8, dash="3,6"))
+    if a.get("coords_store_origin"):
+        polylines.append(_polyline(routes_geom, f"{prefix}_store_origin", a["coords_store_origin"], PURPLE_HEX, 7, 0.95))
     else:
-        return 50
-
-def make_popup_html(title, point, dist_m=None, dur_s=None, gm_link=None, extra_html="", route_id=None):
-    """Create HTML popup content for Folium markers"""
-    lines = [f"<b>{title}</b>", f"{point[0]:.6f}, {point[1]:.6f}"]
-    if dist_m is not None:
-        lines.append(f"Distance: {dist_m/1000.0:.2f} km")
-    if dur_s is not None:
-        lines.append(f"ETA: {int(dur_s/60)} min")
-    if gm_link:
-        lines.append(f"<a href='{gm_link}' target='_blank' rel='noopener noreferrer'>Open in Google Maps</a>")
-    if extra_html:
-        lines.append(extra_html)
-    # Add route_id as data attribute for JavaScript
-    route_attr = f' data-route-id="{route_id}"' if route_id else ''
-    html = f'<div{route_attr}>' + "<br>".join(lines) + '</div>'
-    return IFrame(html, width=340, height=160)
+        polylines.append(_polyline(routes_geom, f"{prefix}_store_origin", [store_coord, origin], PURPLE_HEX, 6, 0.9, dash="3,6"))
+    circle = {"id": f"{prefix}_store", "latlon": list(store_coord), "radius": 6, "color": PURPLE_HEX}
+    return {"markers": [marker], "polylines": polylines, "circles": [circle], "routes": routes_geom}
 
-def build_map_html(origin, stores_flat, gov_items, assignments):
+def build_map_payload(origin, stores_flat, gov_items, assignments):
     """
-    Build Folium map with all markers and routes.
-    Routes are hidden initially and shown when marker is clicked.
-    Returns the HTML string representation of the map.
+    Build the compact map description (markers, polylines, popups, bounds)
+    consumed by templates/delivery_map_shell.html.
+    Store routes are visible and highlighted when their marker is clicked;
+    gov routes are hidden until toggled from their popup.
     """
-    m = folium.Map(location=origin, zoom_start=13, tiles=TILE_URL, attr=ATTR)
+    markers = []
+    polylines = []
+    circles = []
+    # route_id -> encoded polyline; every geometry is stored exactly once
+    routes_geom = {}
 
     # origin marker
-    folium.Marker(
-        location=origin,
-        icon=folium.Icon(color="blue", icon="home"),
-        popup=Popup(make_popup_html("Origin", origin, gm_link=google_maps_link(origin, origin)), max_width=300)
-    ).add_to(m)
-
-    # Store route data for JavaScript interaction
-    store_routes_data = []
+    markers.append(_marker(origin, "blue", make_popup_html("Origin", origin, gm_link=google_maps_link(origin, origin)), glyph="&#8962;"))
+
+    # Resolve every origin -> store/clinic route concurrently up front
+    routes = get_osrm_routes(origin, [s["coord"] for s in stores_flat] + [g["latlon"] for g in gov_items])
+
     route_id_counter = 0
 
     # red -> yellow -> green -> blue stacking
-    for s in [s for s in stores_flat if s["color"] == "red"]:
-        coord = s["coord"]
-        gm = google_maps_link(origin, coord)
-        shop_name = s.get("meta", {}).get("shop_name")
-        title = shop_name if shop_name else "Some Missing"
-        extra = f"<small>{shop_name}</small>" if shop_name else ""
-        
-        # Get route
-        coords, dist, dur = get_osrm_route(origin, coord)
-        route_id = f"route_red_{route_id_counter}"
-        route_id_counter += 1
-        
-        # Create marker with click handler
-        marker = folium.Marker(
-            location=coord,
-            icon=folium.Icon(color="red", icon="info-sign"),
-            popup=Popup(make_popup_html(title, coord, dist_m=dist, dur_s=dur, gm_link=gm, extra_html=extra, route_id=route_id), max_width=360)
-        )
-        marker.add_to(m)
-        
-        # Create route and show it (opacity 0.6 for red routes)
-        if coords:
-            polyline = folium.PolyLine(coords, color="red", weight=4, opacity=0.6, name=route_id).add_to(m)
-        else:
-            polyline = folium.PolyLine([origin, coord], color="red", weight=3, opacity=0.4, dash_array="5,5", name=route_id).add_to(m)
-        
-        store_routes_data.append({
-            "route_id": route_id,
-            "marker_id": f"marker_{route_id_counter}",
-            "coords": coords if coords else [origin, coord],
-            "color": "red",
-            "distance": dist,
-            "duration": dur
-        })
-
-    yellow_shades = YELLOW_SHADES
-    yellow_list = [s for s in stores_flat if s["color"] == "yellow"]
-    for idx, s in enumerate(yellow_list):
-        coord = s["coord"]
-        gm = google_maps_link(origin, coord)
-        shop_name = s.get("meta", {}).get("shop_name")
-        title = shop_name if shop_name else "Has Alternatives"
-        extra = f"<small>{shop_name}</small>" if shop_name else ""
-        
-        # Get route
-        coords, dist, dur = get_osrm_route(origin, coord)
-        route_id = f"route_yellow_{route_id_counter}"
-        route_id_counter += 1
-        color = yellow_shades[min(idx, len(yellow_shades) - 1)]
-        
-        # Create marker with orange color for alternatives (yellow not supported by Folium)
-        marker = folium.Marker(
-            location=coord,
-            icon=folium.Icon(color="orange", icon="info-sign"),
-            popup=Popup(make_popup_html(title, coord, dist_m=dist, dur_s=dur, gm_link=gm, extra_html=extra, route_id=route_id), max_width=360)
-        )
-        marker.add_to(m)
-        
-        # Create route and show it (use orange color for route to match marker)
-        route_color = "orange"
-        if coords:
-            polyline = folium.PolyLine(coords, color=route_color, weight=4, opacity=0.6, name=route_id).add_to(m)
-        else:
-            polyline = folium.PolyLine([origin, coord], color=route_color, weight=3, opacity=0.4, dash_array="5,5", name=route_id).add_to(m)
-        
-        store_routes_data.append({
-            "route_id": route_id,
-            "marker_id": f"marker_{route_id_counter}",
-            "coords": coords if coords else [origin, coord],
-            "color": route_color,
-            "distance": dist,
-            "duration": dur
-        })
-
-    for s in [s for s in stores_flat if s["color"] == "green"]:
-        coord = s["coord"]
-        gm = google_maps_link(origin, coord)
-        shop_name = s.get("meta", {}).get("shop_name")
-        title = shop_name if shop_name else "All Available"
-        extra = f"<small>{shop_name}</small>" if shop_name else ""
-        
-        # Get route
-        coords, dist, dur = get_osrm_route(origin, coord)
-        route_id = f"route_green_{route_id_counter}"
-        route_id_counter += 1
-        
-        # Create marker
-        marker = folium.Marker(
-            location=coord,
-            icon=folium.Icon(color="green", icon="info-sign"),
-            popup=Popup(make_popup_html(title, coord, dist_m=dist, dur_s=dur, gm_link=gm, extra_html=extra, route_id=route_id), max_width=360)
-        )
-        marker.add_to(m)
-        
-        # Create route and show it (green routes for all available)
-        if coords:
-            polyline = folium.PolyLine(coords, color="green", weight=5, opacity=0.7, name=route_id).add_to(m)
-        else:
-            polyline = folium.PolyLine([origin, coord], color="green", weight=4, opacity=0.45, dash_array="5,5", name=route_id).add_to(m)
-        
-        store_routes_data.append({
-            "route_id": route_id,
-            "marker_id": f"marker_{route_id_counter}",
-            "coords": coords if coords else [origin, coord],
-            "color": "green",
-            "distance": dist,
-            "duration": dur
-        })
-
-    # blue gov markers
-    gov_routes_data = []
+    # (color, marker color, default title, line weight/opacity, fallback weight/opacity)
+    store_styles = [
+        ("red", "red", "Some Missing", (4, 0.6), (3, 0.4)),
+        ("yellow", "orange", "Has Alternatives", (4, 0.6), (3, 0.4)),
+        ("green", "green", "All Available", (5, 0.7), (4, 0.45)),
+    ]
+    for color, route_color, default_title, (weight, opacity), (fb_weight, fb_opacity) in store_styles:
+        for s in [s for s in stores_flat if s["color"] == color]:
+            coord = s["coord"]
+            gm = google_maps_link(origin, coord)
+            shop_name = s.get("meta", {}).get("shop_name")
+            title = shop_name if shop_name else default_title
+            extra = f"<small>{shop_name}</small>" if shop_name else ""
+
+            coords, dist, dur = routes[tuple(coord)]
+            route_id = f"route_{color}_{route_id_counter}"
+            route_id_counter += 1
+
+            # yellow is drawn orange to match the marker
+            markers.append(_marker(coord, route_color, make_popup_html(title, coord, dist_m=dist, dur_s=dur, gm_link=gm, extra_html=extra, route_id=route_id), route_id=route_id))
+            if coords:
+                polylines.append(_polyline(routes_geom, route_id, coords, route_color, weight, opacity))
+            else:
+                polylines.append(_polyline(routes_geom, route_id, [origin, coord], route_color, fb_weight, fb_opacity, dash="5,5", fallback=True))
+
+    # blue gov markers, routes hidden until "Show route on map"
     for i, g in enumerate(gov_items):
         coord = g["latlon"]
         gm = google_maps_link(origin, coord)
         extra_html = f"<a href='#show-gov-{i}' class='show-gov' data-idx='{i}'>Show route on map</a><br><small>{g['name']}</small>"
-        popup_iframe = make_popup_html("Gov Initiative (blue)", coord, gm_link=gm, extra_html=extra_html)
-        folium.Marker(location=coord, icon=folium.Icon(color=BLUE_GOV_COLOR, icon="info-sign"), popup=Popup(popup_iframe, max_width=360)).add_to(m)
-        coords, dist, dur = get_osrm_route(origin, coord)
-        gov_routes_data.append({"index": i, "coords": coords, "distance": dist, "duration": dur, "meta": {"name": g["name"], "address": g["address"]}})
-        if not coords:
-            folium.PolyLine([origin, coord], color="blue", weight=3, opacity=0.0, dash_array="5,5").add_to(m)
-
-    # draw assignments (visible purple) - matching working app.py implementation
-    for a in assignments:
-        agent_coord = a["agent_coord"]
-        profile = a["agent_profile"]
-        store_coord = a["store_coord"]
-        profile_html = f"<b>{profile['name']}</b><br>{profile['phone']}<br>{profile['vehicle']}"
-        popup = make_popup_html("Assigned Agent", agent_coord, gm_link=google_maps_link(agent_coord, store_coord), extra_html=profile_html)
-        folium.Marker(location=agent_coord, icon=folium.Icon(color="purple"), popup=Popup(popup, max_width=300)).add_to(m)
-        if a.get("coords_agent_store"):
-            folium.PolyLine(a["coords_agent_store"], color=PURPLE_HEX, weight=5, opacity=0.9).add_to(m)
-        else:
-            folium.PolyLine([agent_coord, store_coord], color=PURPLE_HEX, weight=4, opacity=0.8, dash_array="3,6").add_to(m)
-        if a.get("coords_store_origin"):
-            folium.PolyLine(a["coords_store_origin"], color=PURPLE_HEX, weight=7, opacity=0.95).add_to(m)
+        markers.append(_marker(coord, BLUE_GOV_COLOR, make_popup_html("Gov Initiative (blue)", coord, gm_link=gm, extra_html=extra_html)))
+        coords, dist, dur = routes[tuple(coord)]
+        if coords:
+            polylines.append(_polyline(routes_geom, f"gov_{i}", coords, "blue", 5, 0.0))
         else:
-            folium.PolyLine([store_coord, origin], color=PURPLE_HEX, weight=6, opacity=0.9, dash_array="3,6").add_to(m)
-        folium.CircleMarker(location=store_coord, radius=6, color=PURPLE_HEX, fill=True, fill_color=PURPLE_HEX).add_to(m)
-
-    # Inject JavaScript to handle marker clicks and show/hide routes
-    store_routes_json = json.dumps(store_routes_data)
-    gov_routes_json = json.dumps(gov_routes_data)
-    
-    js_template = """
-    <script>
-    (function(){
-        try {
-            const storeRoutes = STORE_ROUTES_JSON;
-            const govRoutes = GOV_ROUTES_JSON;
-            const Lmap = window.map || window._leaflet_map || (function(){
-                for (const k in window) {
-                    try {
-                        const v = window[k];
-                        if (v && typeof v === 'object' && v.hasOwnProperty && v.hasOwnProperty('_layers')) return v;
-                    } catch(e){}
-                }
-                return null;
-            })();
-            
-            // Store route polylines - routes are already created by Python, we just track them
-            let activeRouteId = null;
-            
-            // Handle marker clicks to highlight routes (all routes are already visible)
-            if (Lmap) {
-                // Find all existing polylines on the map
-                const allPolylines = [];
-                Lmap.eachLayer(function(layer) {
-                    if (layer instanceof L.Polyline && layer.options && layer.options.name) {
-                        allPolylines.push(layer);
-                    }
-                });
-                
-                Lmap.on('popupopen', function(e) {
-                    // Get route_id from popup content
-                    const popup = e.popup;
-                    if (!popup || !popup._content) return;
-                    
-                    let routeId = null;
-                    try {
-                        // Try to get route_id from iframe content
-                        const iframe = popup._content.querySelector ? popup._content.querySelector('iframe') : null;
-                        if (iframe && iframe.contentDocument) {
-                            const div = iframe.contentDocument.querySelector('[data-route-id]');
-                            if (div) {
-                                routeId = div.getAttribute('data-route-id');
-                            }
-                        }
-                        // Fallback: try to find in popup container
-                        if (!routeId) {
-                            const container = popup._container;
-                            if (container) {
-                                const div = container.querySelector('[data-route-id]');
-                                if (div) {
-                                    routeId = div.getAttribute('data-route-id');
-                                }
-                            }
-                        }
-                    } catch(err) {
-                        console.warn('Error reading route_id from popup:', err);
-                    }
-                    
-                    // If we have a route_id, highlight the route
-                    if (routeId) {
-                        // Reset all routes to normal opacity
-                        allPolylines.forEach(function(pl) {
-                            if (pl.options && pl.options.name) {
-                                const originalColor = pl.options.color || 'gray';
-                                const originalWeight = pl.options.weight || 4;
-                                if (pl.options.name === routeId) {
-                                    // Highlight selected route
-                                    pl.setStyle({opacity: 0.9, weight: originalWeight + 1});
-                                    pl.bringToFront();
-                                } else {
-                                    // Dim other routes slightly
-                                    pl.setStyle({opacity: 0.3, weight: originalWeight});
-                                }
-                            }
-                        });
-                        activeRouteId = routeId;
-                    } else {
-                        // Fallback: match by coordinates
-                        const marker = e.popup._source;
-                        if (marker) {
-                            const markerLat = marker._latlng.lat;
-                            const markerLng = marker._latlng.lng;
-                            
-                            for (let i = 0; i < storeRoutes.length; i++) {
-                                const sr = storeRoutes[i];
-                                if (sr.coords && sr.coords.length > 0) {
-                                    const lastCoord = sr.coords[sr.coords.length - 1];
-                                    const latDiff = Math.abs(lastCoord[0] - markerLat);
-                                    const lngDiff = Math.abs(lastCoord[1] - markerLng);
-                                    if (latDiff < 0.0001 && lngDiff < 0.0001) {
-                                        routeId = sr.route_id;
-                                        // Highlight this route
-                                        allPolylines.forEach(function(pl) {
-                                            if (pl.options && pl.options.name === routeId) {
-                                                pl.setStyle({opacity: 0.9, weight: (pl.options.weight || 4) + 1});
-                                                pl.bringToFront();
-                                            } else if (pl.options && pl.options.name) {
-                                                pl.setStyle({opacity: 0.3, weight: pl.options.weight || 4});
-                                            }
-                                        });
-                                        activeRouteId = routeId;
-                                        break;
-                                    }
-                                }
-                            }
-                        }
-                    }
-                });
-                
-                Lmap.on('popupclose', function(e) {
-                    // Reset all routes to normal visibility when popup closes
-                    allPolylines.forEach(function(pl) {
-                        if (pl.options && pl.options.name) {
-                            const originalWeight = pl.options.weight || 4;
-                            const originalOpacity = pl.options.color === 'green' ? 0.7 : 
-                                                   (pl.options.color === 'orange' ? 0.6 : 0.6);
-                            pl.setStyle({opacity: originalOpacity, weight: originalWeight});
-                        }
-                    });
-                    activeRouteId = null;
-                });
-            }
-            
-            // Gov routes handling (existing code)
-            const govPolylines = {};
-            if (govRoutes && govRoutes.length>0) {
-                govRoutes.forEach(function(gr){
-                    if (!gr.coords) {
-                        govPolylines[gr.index] = null;
-                        return;
-                    }
-                    const latlngs = gr.coords.map(function(pt){ return [pt[0], pt[1]]; });
-                    try {
-                        const pl = L.polyline(latlngs, {color: 'blue', weight: 5, opacity: 0.0});
-                        if (Lmap && Lmap.addLayer) pl.addTo(Lmap);
-                        govPolylines[gr.index] = pl;
-                    } catch(e) {
-                        console.warn('gov polyline creation failed', e);
-                        govPolylines[gr.index] = null;
-                    }
-                });
-            }
-            document.addEventListener('click', function(ev){
-                const target = ev.target;
-                if (!target) return;
-                if (target.tagName === 'A' && target.getAttribute('href') && target.getAttribute('href').startsWith('#show-gov-')) {
-                    ev.preventDefault();
-                    const idxStr = target.getAttribute('data-idx') || target.getAttribute('href').split('-').pop();
-                    const idx = parseInt(idxStr);
-                    const pl = govPolylines[idx];
-                    if (!pl) {
-                        alert('Route not available for this government initiative (OSRM may have failed). A straight-line fallback is shown instead.');
-                        return;
-                    }
-                    const current = pl.options.opacity || (pl._path && pl._path.getAttribute ? parseFloat(pl._path.getAttribute('stroke-opacity') || 0.0) : 0.0);
-                    if (current <= 0.01) {
-                        pl.setStyle({opacity:0.95});
-                        try{ pl.bringToFront(); }catch(e){}
-                    } else {
-                        pl.setStyle({opacity:0.0});
-                    }
-                }
-            }, false);
-        } catch(err) { console.error('route-js', err); }
-    })();
-    </script>
-    """
-    js_filled = js_template.replace("STORE_ROUTES_JSON", store_routes_json).replace("GOV_ROUTES_JSON", gov_routes_json)
-    safe_script = "{% raw %}\n" + js_filled + "\n{% endraw %}"
-    m.get_root().html.add_child(Element(safe_script))
-
-    # bounds - include agent coordinates from assignments (matching working app.py)
+            polylines.append(_polyline(routes_geom, f"gov_{i}", [origin, coord], "blue", 3, 0.0, dash="5,5", fallback=True))
+
+    # draw assignments (visible purple)
+    for n, a in enumerate(assignments):
+        layers = assignment_layers(a, origin, f"assign_{n}")
+        markers.extend(layers["markers"])
+        polylines.extend(layers["polylines"])
+        circles.extend(layers["circles"])
+        routes_geom.update(layers["routes"])
+
+    # bounds - what is drawn: origin, stores, gov markers and the assigned agents
+    # (not the whole fleet, which would zoom every map out to the fleet's extent)
     all_points = [origin] + [s["coord"] for s in stores_flat] + [g["latlon"] for g in gov_items]
-    # Add agent coordinates from assignments
     for a in assignments:
         if a.get("agent_coord"):
             all_points.append(a["agent_coord"])
-    # Also include all hidden agents for bounds (as in working code)
-    all_points.extend(HIDDEN_AGENTS_COORDS)
-    try:
-        lats = [p[0] for p in all_points if p]
-        lons = [p[1] for p in all_points if p]
-        if lats and lons:
-            m.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]], padding=(20,20))
-    except Exception:
-        pass
-
-    return m._repr_html_()
-
-def create_assignment(store_coord, store_color, origin, shop_name=None, agent_idx=None):
+
+    return {
+        "origin": list(origin),
+        "tiles": {"url": TILE_URL, "attr": ATTR},
+        "bounds": compute_bounds(all_points),
+        "precision": POLYLINE_PRECISION,
+        "routes": routes_geom,
+        "markers": markers,
+        "polylines": polylines,
+        "circles": circles
+    }
+
+def build_map_html(origin, stores_flat, gov_items, assignments):
     """
-    Create an assignment for a store to an agent.
-    Returns assignment dictionary with route info and billing.
-    
-    Parameters:
-    -----------
-    store_coord : tuple
-        (lat, lon) coordinates of the store
-    store_color : str
-        Color category of the store (green/yellow/red/blue)
-    origin : tuple
-        (lat, lon) coordinates of the origin point
-    shop_name : str, optional
-        Name of the shop if matched
-    agent_idx : int, optional
-        Index of agent to assign. If None, randomly selects one.
-    
-    Returns:
-    --------
-    dict: Assignment dictionary with route info and billing
+    Build the delivery map as a standalone HTML page.
+    Returns the HTML string: the static shell with this map's JSON payload inlined.
     """
-    if agent_idx is None:
-        agent_idx = random.randrange(len(HIDDEN_AGENTS_COORDS))
-    
-    agent_coord = HIDDEN_AGENTS_COORDS[agent_idx]
-    agent_profile = AGENT_PROFILES[agent_idx] if agent_idx < len(AGENT_PROFILES) else {"name":"Agent","phone":"NA","vehicle":"NA"}
-
-    coords_ag_st, dist_ag_st, dur_ag_st = get_osrm_route(agent_coord, store_coord)
-    coords_st_org, dist_st_org, dur_st_org = get_osrm_route(store_coord, origin)
-
-    if dist_ag_st is None:
-        dist_ag_st = haversine_m(agent_coord, store_coord)
-    if dist_st_org is None:
-        dist_st_org = haversine_m(store_coord, origin)
-
-    total_m = None
-    if dist_ag_st is not None and dist_st_org is not None:
-        total_m = dist_ag_st + dist_st_org
-
-    charge = compute_billing_from_meters(total_m) if total_m is not None else None
-
-    assignment = {
-        "agent_idx": agent_idx,
-        "agent_coord": agent_coord,
-        "agent_profile": agent_profile,
-        "store_coord": store_coord,
-        "store_color": store_color,
-        "store_shop_name": shop_name,
-        "coords_agent_store": coords_ag_st,
-        "dist1_m": dist_ag_st,
-        "coords_store_origin": coords_st_org,
-        "dist2_m": dist_st_org,
-        "total_m": total_m,
-        "charge": charge
-    }
-    return assignment
+    return render_map_html(build_map_payload(origin, stores_flat, gov_items, assignments))
+
+def build_stores_flat(green_stores, yellow_stores, red_stores, gov_initiatives):
+    """Flat store list with matched shop names, including GOV initiatives as selectable "blue" stores"""
+    stores_flat = []
+
+    def add_store(coord, color):
+        meta = {}
+        shop = find_shop_name(coord)
+        if shop:
+            meta["shop_name"] = shop["name"]
+            meta["matched_shop_coord"] = shop["latlon"]
+            meta["match_distance_m"] = shop["distance_m"]
+        stores_flat.append({"color": color, "coord": coord, "label": color.capitalize(), "meta": meta})
+
+    for c in green_stores:
+        add_store(c, "green")
+    for c in yellow_stores:
+        add_store(c, "yellow")
+    for c in red_stores:
+        add_store(c, "red")
+
+    # append govt initiatives as blue
+    for g in gov_initiatives:
+        stores_flat.append({"color": "blue", "coord": g["latlon"], "label": "Gov", "meta": {"name": g["name"], "address": g["address"]}})
+    return stores_flat
 
 def generate_delivery_map(
     origin,
@@ -621,28 +245,7 @@ def generate_delivery_map(
     if gov_initiatives is None:
         gov_initiatives = GOV_INITIATIVES
 
-    # Build stores_flat including GOV as selectable "blue" stores
-    stores_flat = []
-    
-    def add_store(coord, color):
-        meta = {}
-        shop = find_shop_name(coord)
-        if shop:
-            meta["shop_name"] = shop["name"]
-            meta["matched_shop_coord"] = shop["latlon"]
-            meta["match_distance_m"] = shop["distance_m"]
-        stores_flat.append({"color": color, "coord": coord, "label": color.capitalize(), "meta": meta})
-
-    for c in green_stores:
-        add_store(c, "green")
-    for c in yellow_stores:
-        add_store(c, "yellow")
-    for c in red_stores:
-        add_store(c, "red")
-    
-    # append govt initiatives as blue
-    for g in gov_initiatives:
-        stores_flat.append({"color": "blue", "coord": g["latlon"], "label": "Gov", "meta": {"name": g["name"], "address": g["address"]}})
+    stores_flat = build_stores_flat(green_stores, yellow_stores, red_stores, gov_initiatives)
 
     # Build map
     map_html = build_map_html(origin, stores_flat, gov_initiatives, assignments)
@@ -653,6 +256,146 @@ def generate_delivery_map(
         "assignments": assignments
     }
 
+def serialize_assignment(a, prefix, routes):
+    """
+    JSON-serializable assignment. Leg geometries are not inlined: the assignment
+    carries route_agent_store / route_store_origin ids ("{prefix}_{leg}") pointing
+    into routes, which receives the simplified, encoded polylines (POLYLINE_PRECISION).
+    """
+    route_ids = {}
+    for leg in ("agent_store", "store_origin"):
+        coords = a.get(f"coords_{leg}")
+        if coords:
+            route_id = f"{prefix}_{leg}"
+            routes[route_id] = pack_route(coords, ROUTE_SIMPLIFY_TOLERANCE_M, POLYLINE_PRECISION)
+            route_ids[leg] = route_id
+    agent_coord = a.get("agent_coord")
+    store_coord = a.get("store_coord")
+    return {
+        "agent_idx": a.get("agent_idx"),
+        "agent_coord": list(agent_coord) if agent_coord is not None else None,
+        "agent_profile": a.get("agent_profile", {}),
+        "store_coord": list(store_coord) if store_coord is not None else None,
+        "store_color": a.get("store_color"),
+        "store_shop_name": a.get("store_shop_name"),
+        "route_agent_store": route_ids.get("agent_store"),
+        "dist1_m": a.get("dist1_m"),
+        "route_store_origin": route_ids.get("store_origin"),
+        "dist2_m": a.get("dist2_m"),
+        "total_m": a.get("total_m"),
+        "charge": a.get("charge")
+    }
+
+def serialize_assignments(assignments):
+    """
+    JSON-serializable assignments (see serialize_assignment).
+    Returns (serialized_assignments, routes).
+    """
+    routes = {}
+    serialized_assignments = [serialize_assignment(a, f"assign_{n}", routes) for n, a in enumerate(assignments or [])]
+    return serialized_assignments, routes
+
+# ---------- MAP SESSIONS (incremental updates) ----------
+MAP_SESSIONS = MapSessionStore()
+
+def create_map_session(origin, green_stores=None, yellow_stores=None, red_stores=None, gov_initiatives=None, session_id=None):
+    """
+    Render the base layer (origin, stores, clinics and their routes) once and keep
+    it in MAP_SESSIONS. Returns (session, map_html).
+    """
+    if gov_initiatives is None:
+        gov_initiatives = GOV_INITIATIVES
+    stores_flat = build_stores_flat(green_stores or [], yellow_stores or [], red_stores or [], gov_initiatives)
+    payload = build_map_payload(origin, stores_flat, gov_initiatives, [])
+    session = MAP_SESSIONS.create(origin, stores_flat, payload, session_id=session_id)
+    return session, render_map_html(payload)
+
+def add_session_assignment(session_id, store_coord, store_color=None, shop_name=None, agent_idx=None):
+    """
+    Assign an agent to store_coord within a map session. Only the two new legs are
+    routed; the base layer is untouched. Returns (patch, serialized_assignment).
+    """
+    session = MAP_SESSIONS.get(session_id)
+    store_coord = tuple(store_coord)
+    for s in session.stores_flat:
+        if tuple(s["coord"]) == store_coord:
+            store_color = store_color or s["color"]
+            shop_name = shop_name or s.get("meta", {}).get("shop_name")
+            break
+    assignment = create_assignment(
+        store_coord=store_coord,
+        store_color=store_color or "green",
+        origin=session.origin,
+        shop_name=shop_name,
+        agent_idx=agent_idx
+    )
+    assignment_id = session.new_assignment_id()
+    prefix = f"assign_{assignment_id}"
+    patch = session.add_layers(assignment_id, assignment, assignment_layers(assignment, session.origin, prefix))
+    # the patch already carries the leg geometries under the same route ids
+    serialized = serialize_assignment(assignment, prefix, {})
+    serialized["assignment_id"] = assignment_id
+    return patch, serialized
+
+def remove_session_assignment(session_id, assignment_id):
+    """Remove one assignment from a map session and free its agent; returns the removal patch."""
+    session = MAP_SESSIONS.get(session_id)
+    entry = session.assignments.get(assignment_id)
+    patch = session.remove_assignment(assignment_id)
+    if entry is not None:
+        get_agent_store().release(entry["assignment"]["agent_idx"])
+    return patch
+
+def handle_session_request(op, input_data):
+    """
+    Map-session operations:
+    - session_create:   origin, green/yellow/red stores[, session_id] -> base map
+    - session_assign:   session_id, best_store[, agent_idx, store_color] -> add patch
+    - session_unassign: session_id, assignment_id -> remove patch
+    - session_map:      session_id -> full map for the current session state
+    - session_close:    session_id
+    """
+    if op == "session_create":
+        session, map_html = create_map_session(
+            origin=tuple(input_data.get("origin", [12.9716, 77.5946])),
+            green_stores=[tuple(s) for s in input_data.get("green_stores", [])],
+            yellow_stores=[tuple(s) for s in input_data.get("yellow_stores", [])],
+            red_stores=[tuple(s) for s in input_data.get("red_stores", [])],
+            session_id=input_data.get("session_id")
+        )
+        return {
+            "session_id": session.session_id,
+            "map_html": map_html,
+            "stores_count": len(session.stores_flat),
+            "stores": session.stores_flat,
+            "polyline_precision": POLYLINE_PRECISION
+        }
+    session_id = input_data.get("session_id")
+    if op == "session_assign":
+        agent_idx = input_data.get("agent_idx")
+        if agent_idx is not None and agent_idx not in get_agent_store().ids():
+            sys.stderr.write(f"Warning: Invalid agent_idx {agent_idx}, using fastest agent\n")
+            agent_idx = None
+        patch, assignment = add_session_assignment(
+            session_id,
+            input_data["best_store"],
+            store_color=input_data.get("store_color"),
+            agent_idx=agent_idx
+        )
+        return {"session_id": session_id, "patch": patch, "assignment": assignment}
+    if op == "session_unassign":
+        return {"session_id": session_id, "patch": remove_session_assignment(session_id, input_data["assignment_id"])}
+    if op == "session_map":
+        session = MAP_SESSIONS.get(session_id)
+        return {"session_id": session_id, "map_html": render_map_html(session.snapshot()), "assignment_ids": list(session.assignments)}
+    if op == "session_close":
+        session = MAP_SESSIONS.drop(session_id)
+        # closing the session abandons its deliveries; their leases would free the agents eventually
+        for entry in (session.assignments.values() if session is not None else ()):
+            get_agent_store().release(entry["assignment"]["agent_idx"])
+        return {"session_id": session_id, "closed": True}
+    raise ValueError(f"Unknown op: {op}")
+
 # Example usage function
 def example_usage():
     """Example of how to use the generate_delivery_map function"""
@@ -677,128 +420,203 @@ def example_usage():
     
     return result
 
-if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1:
-        # Accept JSON input from command line
+def handle_map_request(input_data):
+    """
+    Handle one /delivery-map request body (origin, green/yellow/red stores and an
+    optional delivery to create) and return the JSON-serializable response.
+    """
+    origin = tuple(input_data.get("origin", [12.9716, 77.5946]))
+    green_stores = [tuple(s) for s in input_data.get("green_stores", [])]
+    yellow_stores = [tuple(s) for s in input_data.get("yellow_stores", [])]
+    red_stores = [tuple(s) for s in input_data.get("red_stores", [])]
+
+    assignments = []
+    # If delivery is requested, create assignment for best store
+    if input_data.get("create_delivery") and input_data.get("best_store"):
+        best_store_coord = tuple(input_data.get("best_store"))
+        # Find the store color (check if it's in green, yellow, or red)
+        store_color = "green"  # Default to green for best store
+        if best_store_coord in green_stores:
+            store_color = "green"
+        elif best_store_coord in yellow_stores:
+            store_color = "yellow"
+        elif best_store_coord in red_stores:
+            store_color = "red"
+
+        # Get agent index (if provided, use it; otherwise fastest agent)
+        agent_idx = input_data.get("agent_idx")
+        # Validate agent_idx is within range
+        if agent_idx is not None and agent_idx not in get_agent_store().ids():
+            sys.stderr.write(f"Warning: Invalid agent_idx {agent_idx}, using fastest agent\n")
+            agent_idx = None
+
+        # Create assignment with specified or fastest agent
         try:
-            import json
-            input_data = json.loads(sys.argv[1])
-            origin = tuple(input_data.get("origin", [12.9716, 77.5946]))
-            green_stores = [tuple(s) for s in input_data.get("green_stores", [])]
-            yellow_stores = [tuple(s) for s in input_data.get("yellow_stores", [])]
-            red_stores = [tuple(s) for s in input_data.get("red_stores", [])]
-            
-            assignments = []
-            # If delivery is requested, create assignment for best store
-            if input_data.get("create_delivery") and input_data.get("best_store"):
-                best_store_coord = tuple(input_data.get("best_store"))
-                # Find the store color (check if it's in green, yellow, or red)
-                store_color = "green"  # Default to green for best store
-                # Convert lists to tuples for comparison
-                green_tuples = [tuple(s) for s in green_stores]
-                yellow_tuples = [tuple(s) for s in yellow_stores]
-                red_tuples = [tuple(s) for s in red_stores]
-                
-                if best_store_coord in green_tuples:
-                    store_color = "green"
-                elif best_store_coord in yellow_tuples:
-                    store_color = "yellow"
-                elif best_store_coord in red_tuples:
-                    store_color = "red"
-                
-                # Get agent index (if provided, use it; otherwise random)
-                agent_idx = input_data.get("agent_idx")
-                # Validate agent_idx is within range
-                if agent_idx is not None:
-                    if agent_idx < 0 or agent_idx >= len(HIDDEN_AGENTS_COORDS):
-                        import sys
-                        sys.stderr.write(f"Warning: Invalid agent_idx {agent_idx}, using random selection\n")
-                        agent_idx = None
-                else:
-                    agent_idx = None  # Will be randomly selected in create_assignment
-                
-                # Create assignment with specified or closest agent
-                try:
-                    assignment = create_assignment(
-                        store_coord=best_store_coord,
-                        store_color=store_color,
-                        origin=origin,
-                        shop_name=None,
-                        agent_idx=agent_idx
-                    )
-                    assignments = [assignment]
-                    import sys
-                    sys.stderr.write(f"Created assignment: agent_idx={assignment.get('agent_idx')}, agent={assignment.get('agent_profile', {}).get('name', 'Unknown')}\n")
-                except Exception as e:
-                    import sys
-                    sys.stderr.write(f"Error creating assignment: {str(e)}\n")
-                    assignments = []
-            
-            result = generate_delivery_map(
+            assignment = create_assignment(
+                store_coord=best_store_coord,
+                store_color=store_color,
                 origin=origin,
-                green_stores=green_stores,
-                yellow_stores=yellow_stores,
-                red_stores=red_stores,
-                assignments=assignments
+                shop_name=None,
+                agent_idx=agent_idx
             )
-            
-            # Output JSON with map HTML
-            output = {
-                "map_html": result["map_html"],
-                "stores_count": len(result["stores_flat"]),
-                "stores": result["stores_flat"],
-                "assignments": result.get("assignments", [])
-            }
-            # Convert assignments to JSON-serializable format
-            if output["assignments"]:
-                serialized_assignments = []
-                for a in output["assignments"]:
-                    # Convert tuple coordinates to lists
-                    agent_coord = a.get("agent_coord")
-                    if isinstance(agent_coord, tuple):
-                        agent_coord = list(agent_coord)
-                    
-                    store_coord = a.get("store_coord")
-                    if isinstance(store_coord, tuple):
-                        store_coord = list(store_coord)
-                    
-                    # Convert route coordinates (list of tuples) to list of lists
-                    coords_agent_store = a.get("coords_agent_store")
-                    if coords_agent_store:
-                        if isinstance(coords_agent_store[0], tuple):
-                            coords_agent_store = [list(c) for c in coords_agent_store]
-                    
-                    coords_store_origin = a.get("coords_store_origin")
-                    if coords_store_origin:
-                        if isinstance(coords_store_origin[0], tuple):
-                            coords_store_origin = [list(c) for c in coords_store_origin]
-                    
-                    serialized_a = {
-                        "agent_idx": a.get("agent_idx"),
-                        "agent_coord": agent_coord,
-                        "agent_profile": a.get("agent_profile", {}),
-                        "store_coord": store_coord,
-                        "store_color": a.get("store_color"),
-                        "store_shop_name": a.get("store_shop_name"),
-                        "coords_agent_store": coords_agent_store,
-                        "dist1_m": a.get("dist1_m"),
-                        "coords_store_origin": coords_store_origin,
-                        "dist2_m": a.get("dist2_m"),
-                        "total_m": a.get("total_m"),
-                        "charge": a.get("charge")
-                    }
-                    serialized_assignments.append(serialized_a)
-                output["assignments"] = serialized_assignments
+            assignments = [assignment]
+            sys.stderr.write(f"Created assignment: agent_idx={assignment.get('agent_idx')}, agent={assignment.get('agent_profile', {}).get('name', 'Unknown')}\n")
+        except Exception as e:
+            sys.stderr.write(f"Error creating assignment: {str(e)}\n")
+            assignments = []
+
+    result = generate_delivery_map(
+        origin=origin,
+        green_stores=green_stores,
+        yellow_stores=yellow_stores,
+        red_stores=red_stores,
+        assignments=assignments
+    )
+
+    cache = get_route_cache()
+    if cache is not None:
+        sys.stderr.write(f"Route cache: {json.dumps(cache.stats())}\n")
+    routing = routing_backend().stats()
+    if routing is not None:
+        sys.stderr.write(f"Routing client: {json.dumps(routing)}\n")
+
+    # Output JSON with map HTML; assignment legs as encoded polylines
+    serialized, routes = serialize_assignments(result.get("assignments", []))
+    return {
+        "map_html": result["map_html"],
+        "stores_count": len(result["stores_flat"]),
+        "stores": result["stores_flat"],
+        "assignments": serialized,
+        "routes": routes,
+        "polyline_precision": POLYLINE_PRECISION
+    }
+
+def handle_dispatch_request(input_data):
+    """
+    Batch dispatch request: {"orders": [{"store": [lat, lon], "origin": [lat, lon], ...}],
+    "agent_indices": [...] (optional)} -> serialized assignments with their legs.
+    """
+    orders = []
+    for o in input_data.get("orders", []):
+        order = dict(o)
+        order["store"] = tuple(o["store"])
+        order["origin"] = tuple(o["origin"])
+        orders.append(order)
+    result = dispatch_orders(orders, agent_indices=input_data.get("agent_indices"))
+    routes = {}
+    serialized = []
+    for n, a in enumerate(result["assignments"]):
+        item = serialize_assignment(a, f"assign_{n}", routes)
+        item["order_id"] = a["order_id"]
+        item["eta_s"] = a["eta_s"]
+        serialized.append(item)
+    unassigned = [dict(o, store=list(o["store"]), origin=list(o["origin"])) for o in result["unassigned"]]
+    return {
+        "assignments": serialized,
+        "unassigned": unassigned,
+        "total_eta_s": result["total_eta_s"],
+        "routes": routes,
+        "polyline_precision": POLYLINE_PRECISION
+    }
+
+def handle_batch_request(input_data):
+    """
+    Multi-stop planning request: {"orders": [...], "agent_indices": [...] (optional)}.
+    Leg geometries go into the routes dict as encoded polylines ("batch_{n}_leg_{i}").
+    """
+    result = plan_batched_deliveries(input_data.get("orders", []), agent_indices=input_data.get("agent_indices"))
+    encoded = {}
+    plans = []
+    for n, r in enumerate(result["routes"]):
+        leg_ids = []
+        for i, coords in enumerate(r["legs"]):
+            route_id = f"batch_{n}_leg_{i}"
+            encoded[route_id] = pack_route(coords, ROUTE_SIMPLIFY_TOLERANCE_M, POLYLINE_PRECISION)
+            leg_ids.append(route_id)
+        plan = {k: v for k, v in r.items() if k != "legs"}
+        plan["legs"] = leg_ids
+        plans.append(plan)
+    unassigned = [dict(o, store=list(o["store"]), origin=list(o["origin"])) for o in result["unassigned"]]
+    return {
+        "plans": plans,
+        "unassigned": unassigned,
+        "routes": encoded,
+        "polyline_precision": POLYLINE_PRECISION
+    }
+
+def handle_agent_request(op, input_data):
+    """
+    Agent-store operations:
+    - agents:          [status] -> every agent (or those with that status)
+    - agent_positions: updates [{"agent_id", "lat", "lon"}, ...] -> count applied
+    - agent_status:    agent_id, status (free/busy/offline)[, job]
+    """
+    store = get_agent_store()
+    if op == "agents":
+        status = input_data.get("status")
+        agents = [a for a in store.all() if status is None or a["status"] == status]
+        return {"agents": [dict(a, latlon=list(a["latlon"])) for a in agents]}
+    if op == "agent_positions":
+        updates = [(u["agent_id"], (u["lat"], u["lon"])) for u in input_data.get("updates", [])]
+        return {"applied": store.update_positions(updates)}
+    if op == "agent_status":
+        agent_id = input_data["agent_id"]
+        store.set_status(agent_id, input_data.get("status", STATUS_FREE), input_data.get("job"))
+        agent = store.get(agent_id)
+        return {"agent": dict(agent, latlon=list(agent["latlon"]))}
+    raise ValueError(f"Unknown op: {op}")
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Resident worker mode: one JSON request per line on stdin, one JSON response
+    per line on stdout, each tagged with the request's "id". Imports, the routing
+    backend, its HTTP session and the route cache stay warm between requests.
+    Requests may carry an "op":
+    - "dispatch" / "plan_batches": batch dispatch and multi-stop plans
+      (handle_dispatch_request / handle_batch_request)
+    - "agents", "agent_*": agent store reads and updates (handle_agent_request)
+    - "session_*": map sessions (handle_session_request); sessions live in this
+      process, so callers must pin a session to one worker
+    """
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        req_id = None
+        try:
+            input_data = json.loads(line)
+            req_id = input_data.pop("id", None)
+            op = input_data.pop("op", None)
+            if op == "dispatch":
+                response = handle_dispatch_request(input_data)
+            elif op == "plan_batches":
+                response = handle_batch_request(input_data)
+            elif op and op.startswith("agent"):
+                response = handle_agent_request(op, input_data)
+            elif op:
+                response = handle_session_request(op, input_data)
             else:
-                output["assignments"] = []
-            print(json.dumps(output))
+                response = handle_map_request(input_data)
+        except Exception as e:
+            sys.stderr.write(f"Error: {str(e)}\n")
+            response = {"error": str(e)}
+        response["id"] = req_id
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve()
+    elif len(sys.argv) > 1:
+        # Accept JSON input from command line, or from stdin with "-"
+        try:
+            if sys.argv[1] == "-":
+                input_data = json.load(sys.stdin)
+            else:
+                input_data = json.loads(sys.argv[1])
+            print(json.dumps(handle_map_request(input_data)))
         except Exception as e:
-            import sys
             sys.stderr.write(f"Error: {str(e)}\n")
             sys.exit(1)
     else:
         example_usage()
-
-
-
@@ -0,0 +1,94 @@
+"""
+Assignment solvers for batch dispatch.
+Given a cost matrix (rows = agents, cols = orders, e.g. travel times in seconds),
+pick at most one order per agent and one agent per order at minimum total cost.
+- hungarian(): exact, O(n^2 m) with the inner loop vectorized over columns
+- greedy_assignment(): cheapest-pair-first, for batches too large for the exact solver
+"""
+
+import numpy as np
+
+# above this many agents or orders, solve_assignment() switches to greedy
+HUNGARIAN_MAX_N = 300
+
+
+def hungarian(cost):
+    """
+    Minimum-cost assignment for a rectangular cost matrix.
+    Returns a list of (row, col) pairs, one per row or per column (whichever is fewer).
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # potentials and matching, 1-based with column 0 as the virtual start
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j] = row matched to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            cand = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(cand)) + 1
+            delta = cand[j1 - 1]
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # augment along the alternating path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j] != 0]
+    if transposed:
+        pairs = [(c, r) for r, c in pairs]
+    return sorted(pairs)
+
+
+def greedy_assignment(cost):
+    """Repeatedly take the cheapest remaining (row, col) pair. Returns (row, col) pairs."""
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return []
+    n, m = cost.shape
+    rows_used = np.zeros(n, dtype=bool)
+    cols_used = np.zeros(m, dtype=bool)
+    pairs = []
+    limit = min(n, m)
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        r, c = divmod(int(flat), m)
+        if rows_used[r] or cols_used[c]:
+            continue
+        rows_used[r] = cols_used[c] = True
+        pairs.append((r, c))
+        if len(pairs) == limit:
+            break
+    return sorted(pairs)
+
+
+def solve_assignment(cost, max_exact=HUNGARIAN_MAX_N):
+    """Exact Hungarian for normal batches, greedy fallback when either side exceeds max_exact."""
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size and max(cost.shape) > max_exact:
+        return greedy_assignment(cost)
+    return hungarian(cost)
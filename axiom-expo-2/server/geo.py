@@ -0,0 +1,88 @@
+"""
+Shared geo utilities — haversine distances (scalar and NumPy-vectorized),
+map bounds and distance-based delivery billing.
+Points are (lat, lon) in degrees; distances are meters.
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+# delivery billing slabs: up to 5 km -> 20, up to 10 km -> 30, beyond -> 50
+BILLING_SLABS_KM = (5.0, 10.0)
+BILLING_CHARGES = (20, 30, 50)
+
+
+def haversine_m(p1, p2):
+    """Haversine distance between two points in meters (scalar, no NumPy overhead)."""
+    lat1, lon1 = math.radians(p1[0]), math.radians(p1[1])
+    lat2, lon2 = math.radians(p2[0]), math.radians(p2[1])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)**2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _as_latlon_array(points):
+    arr = np.asarray(points, dtype=np.float64)
+    return arr.reshape(-1, 2)
+
+
+def haversine_pairwise(a, b):
+    """Element-wise distances between two equal-length point arrays -> shape (n,)."""
+    a = np.radians(_as_latlon_array(a))
+    b = np.radians(_as_latlon_array(b))
+    dlat = b[:, 0] - a[:, 0]
+    dlon = b[:, 1] - a[:, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, 0]) * np.cos(b[:, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(h))
+
+
+def haversine_one_to_many(origin, points):
+    """Distances from one point to each of points -> shape (n,)."""
+    pts = _as_latlon_array(points)
+    return haversine_pairwise(np.broadcast_to(_as_latlon_array(origin), pts.shape), pts)
+
+
+def haversine_matrix(sources, destinations):
+    """All-pairs distances -> shape (len(sources), len(destinations))."""
+    a = np.radians(_as_latlon_array(sources))[:, None, :]
+    b = np.radians(_as_latlon_array(destinations))[None, :, :]
+    dlat = b[..., 0] - a[..., 0]
+    dlon = b[..., 1] - a[..., 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[..., 0]) * np.cos(b[..., 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(h))
+
+
+def compute_bounds(points):
+    """[[min_lat, min_lon], [max_lat, max_lon]] over the non-empty points, or None."""
+    pts = [p for p in points if p]
+    if not pts:
+        return None
+    arr = _as_latlon_array(pts)
+    lo = arr.min(axis=0)
+    hi = arr.max(axis=0)
+    return [[float(lo[0]), float(lo[1])], [float(hi[0]), float(hi[1])]]
+
+
+def compute_billing_from_meters(total_m):
+    """
+    Billing charge for a delivery distance in meters.
+    Scalar in -> int (or None for None). Array in -> int array (NaN distances bill 0).
+    """
+    if total_m is None:
+        return None
+    if np.ndim(total_m) == 0:
+        km = total_m/1000.0
+        if km <= BILLING_SLABS_KM[0]:
+            return BILLING_CHARGES[0]
+        elif km <= BILLING_SLABS_KM[1]:
+            return BILLING_CHARGES[1]
+        else:
+            return BILLING_CHARGES[2]
+    km = np.asarray(total_m, dtype=np.float64) / 1000.0
+    slab = np.searchsorted(np.asarray(BILLING_SLABS_KM), km, side="left")
+    charges = np.asarray(BILLING_CHARGES)[np.minimum(slab, len(BILLING_CHARGES) - 1)]
+    return np.where(np.isnan(km), 0, charges)
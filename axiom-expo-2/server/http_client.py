@@ -0,0 +1,193 @@
+"""
+Shared outbound HTTP client for upstream services (OSRM today).
+- one keep-alive connection pool per client
+- bounded concurrency (a semaphore, waited on within the call's deadline)
+- jittered exponential backoff, retrying only transient failures of GET
+  requests: connection errors, timeouts, 429/502/503/504
+- a per-call deadline budget that covers every attempt and backoff sleep
+- a circuit breaker: after BREAKER_FAILURES consecutive failed calls (transient
+  failures once retries run out, or any other 5xx) the client fails fast for
+  BREAKER_COOLDOWN_S, then lets one probe through
+
+get_json() never raises; it returns None on any failure so callers can switch
+to their offline estimate straight away.
+"""
+
+import random
+import threading
+import time
+
+import requests
+
+MAX_CONCURRENCY = 16
+# per-attempt cap; the call's deadline can only shorten it
+ATTEMPT_TIMEOUT_S = 6.0
+MAX_RETRIES = 2
+BACKOFF_BASE_S = 0.2
+BACKOFF_CAP_S = 2.0
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN_S = 30.0
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, cooldown_s=BREAKER_COOLDOWN_S):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a request may go out now."""
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown_s:
+                    return False
+                self.state = BREAKER_HALF_OPEN
+                self._probing = False
+            # half-open: exactly one probe at a time
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def is_open(self):
+        """True while failing fast (open and still cooling down)."""
+        with self._lock:
+            return self.state == BREAKER_OPEN and time.monotonic() - self.opened_at < self.cooldown_s
+
+    def cancel_probe(self):
+        """A let-through request never reached the upstream; allow another probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == BREAKER_HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != BREAKER_OPEN:
+                    self.trips += 1
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+
+
+class OutboundClient:
+    def __init__(self, name, max_concurrency=MAX_CONCURRENCY, attempt_timeout_s=ATTEMPT_TIMEOUT_S,
+                 max_retries=MAX_RETRIES, breaker=None):
+        self.name = name
+        self.attempt_timeout_s = attempt_timeout_s
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self.counters = {"calls": 0, "ok": 0, "retries": 0, "failed": 0, "short_circuited": 0, "rejected": 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.counters[key] += 1
+
+    def get_json(self, url, deadline_s):
+        """
+        GET url and parse JSON within deadline_s seconds in total.
+        Non-retryable 4xx errors (e.g. OSRM's 400 NoRoute) still return their
+        JSON body, since the upstream itself is healthy; other 5xx count against
+        the breaker and are not retried. Returns None on failure.
+        """
+        self._count("calls")
+        # cheap check first so an open breaker never waits for a slot
+        if self.breaker.is_open():
+            self._count("short_circuited")
+            return None
+        deadline = time.monotonic() + deadline_s
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            # saturated: don't queue past our budget
+            self._count("rejected")
+            return None
+        try:
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                return None
+            return self._get_with_retries(url, deadline)
+        finally:
+            self._slots.release()
+
+    def _get_with_retries(self, url, deadline):
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            retry_after = None
+            try:
+                r = self.session.get(url, timeout=min(self.attempt_timeout_s, remaining))
+                if r.status_code >= 500 and r.status_code not in RETRY_STATUSES:
+                    # a server error that retrying won't fix: unhealthy, not transient
+                    self.breaker.record_failure()
+                    self._count("failed")
+                    return None
+                if r.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    try:
+                        body = r.json()
+                    except ValueError:
+                        body = None
+                    self._count("ok" if r.ok else "failed")
+                    return body
+                retry_after = _retry_after_s(r)
+            except (requests.ConnectionError, requests.Timeout):
+                pass
+            except requests.RequestException:
+                # malformed URL and the like: not transient, not the upstream's fault
+                self.breaker.cancel_probe()
+                self._count("failed")
+                return None
+            if attempt >= self.max_retries:
+                break
+            # full jitter, or the server's Retry-After if it asked for one
+            sleep_s = retry_after if retry_after is not None else random.uniform(
+                0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * (2 ** attempt)))
+            if time.monotonic() + sleep_s >= deadline:
+                break
+            time.sleep(sleep_s)
+            attempt += 1
+            self._count("retries")
+        self.breaker.record_failure()
+        self._count("failed")
+        return None
+
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self.counters)
+        counters.update({"name": self.name, "breaker": self.breaker.state, "breaker_trips": self.breaker.trips})
+        return counters
+
+
+def _retry_after_s(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
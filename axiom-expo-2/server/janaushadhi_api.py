@@ -1,32 +1,169 @@
 import sys
 import json
-from janaushadhi_lookup import janaushadhi_lookup
+import os
+from axiom_core import CATALOG_CSV_PATH
+from janaushadhi_lookup import janaushadhi_lookup, lookup_cache_stats, lookup_many
+
+# Default CSV path (server directory unless CATALOG_CSV_PATH is set)
+CSV_PATH = CATALOG_CSV_PATH
+
+
+def handle_lookup(medicine_list, csv_path=CSV_PATH):
+    """Run one lookup and return the JSON-serializable response dict."""
+    df_results, jan_aushadhi_clinics = janaushadhi_lookup(medicine_list, csv_path)
+    return {
+        "prices": df_results.to_dict('records'),
+        "clinics": jan_aushadhi_clinics
+    }
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Persistent worker mode: one JSON request per line on stdin,
+    one JSON response per line on stdout.
+
+    Request:  {"id": <any>, "medicine_names": [...]}
+    Response: {"id": <same>, "prices": [...], "clinics": [...]}  or
+              {"id": <same>, "error": "...", "prices": [], "clinics": []}
+
+    {"id": <any>, "op": "cache_stats"} returns {"id": <same>, "cache": {...}}
+    with this worker's lookup-cache counters.
+
+    The catalog index is loaded once and stays warm across requests.
+    """
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        req_id = None
+        try:
+            req = json.loads(line)
+            req_id = req.get("id")
+            if req.get("op") == "cache_stats":
+                response = {"cache": lookup_cache_stats()}
+            else:
+                medicine_list = req.get("medicine_names") or []
+                response = handle_lookup(medicine_list)
+        except Exception as e:
+            response = {"error": str(e), "prices": [], "clinics": []}
+        response["id"] = req_id
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+def medicine_names_of(doc):
+    """
+    Medicine names from any prescription shape we store: a plain list,
+    {"medicine_names": [...]} (API requests), {"medicines": [...]} (ocr_results/)
+    or {"requested": [{"name": ...}]} (logs/).
+    """
+    if isinstance(doc, list):
+        return [str(m) for m in doc]
+    if not isinstance(doc, dict):
+        return []
+    for key in ("medicine_names", "medicines"):
+        if isinstance(doc.get(key), list):
+            return [str(m) for m in doc[key]]
+    if isinstance(doc.get("requested"), list):
+        return [str(r["name"]) for r in doc["requested"] if isinstance(r, dict) and r.get("name")]
+    return []
+
+
+def _skip(errors, record_id, e):
+    """One unreadable record: warn on stderr and keep going."""
+    sys.stderr.write(f"Warning: skipping {record_id}: {e}\n")
+    if errors is not None:
+        errors.append({"id": record_id, "error": str(e)})
+
+
+def _jsonl_prescriptions(stream, source, errors=None):
+    lineno = 0
+    try:
+        for lineno, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError as e:
+                _skip(errors, f"{source}:{lineno}", e)
+                continue
+            presc_id = doc.get("id") if isinstance(doc, dict) and "id" in doc else f"{source}:{lineno}"
+            yield presc_id, medicine_names_of(doc)
+    except (OSError, ValueError) as e:
+        # undecodable bytes or a read error: the rest of this file is lost, not the batch
+        _skip(errors, f"{source}:{lineno + 1}", e)
+
+
+def iter_prescriptions(paths, stdin=sys.stdin, errors=None):
+    """
+    (id, medicine_names) for every prescription in paths: JSONL files (one per
+    line), JSON files (one per file) and directories of *.json files. No paths
+    or "-" reads JSONL from stdin. Unreadable files and lines are skipped with a
+    warning on stderr, and appended to errors as {"id", "error"} if given.
+    """
+    if not paths:
+        paths = ["-"]
+    for path in paths:
+        try:
+            if path == "-":
+                yield from _jsonl_prescriptions(stdin, "stdin", errors)
+            elif os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.endswith(".json"):
+                        yield from iter_prescriptions([os.path.join(path, name)], stdin, errors)
+            elif path.endswith(".jsonl"):
+                with open(path, encoding="utf-8") as f:
+                    yield from _jsonl_prescriptions(f, path, errors)
+            else:
+                with open(path, encoding="utf-8") as f:
+                    doc = json.load(f)
+                yield path, medicine_names_of(doc)
+        except (OSError, ValueError) as e:
+            _skip(errors, path, e)
+
+
+def run_batch(paths, stdin=sys.stdin, stdout=sys.stdout, csv_path=CSV_PATH):
+    """
+    Batch mode: stream one {"id", "prices"} JSON line per prescription, with
+    raw numeric prices (see janaushadhi_lookup.resolve_medicine). Returns the
+    number of prescriptions written. Unreadable input is skipped (see
+    iter_prescriptions) and counted in the summary on stderr.
+
+        python janaushadhi_api.py --batch ocr_results logs > prices.jsonl
+        cat prescriptions.jsonl | python janaushadhi_api.py --batch
+    """
+    count = 0
+    errors = []
+    for result in lookup_many(iter_prescriptions(paths, stdin, errors), csv_path):
+        stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        count += 1
+    stdout.flush()
+    stats = lookup_cache_stats(csv_path)
+    sys.stderr.write(f"{count} prescriptions, lookup cache hit rate {stats['hit_rate']:.1%} "
+                     f"({stats['computed']} names resolved, {len(errors)} unreadable skipped)\n")
+    return count
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve()
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        run_batch(sys.argv[2:])
+        sys.exit(0)
+
     try:
         # Read medicine list from stdin or command line
         if len(sys.argv) > 1:
             medicine_list = json.loads(sys.argv[1])
         else:
             medicine_list = json.load(sys.stdin)
-        
-        # Default CSV path (relative to server directory)
-        import os
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        csv_path = os.path.join(script_dir, "Product List_6_11_2025 @ 15_1_15.csv")
-        
+
         # Perform lookup
-        df_results, jan_aushadhi_clinics = janaushadhi_lookup(medicine_list, csv_path)
-        
-        # Convert DataFrame to JSON-serializable format
-        results = df_results.to_dict('records')
-        
-        # Prepare response
-        response = {
-            "prices": results,
-            "clinics": jan_aushadhi_clinics
-        }
-        
+        response = handle_lookup(medicine_list)
+
         print(json.dumps(response))
     except Exception as e:
         error_response = {
@@ -36,4 +173,3 @@ if __name__ == "__main__":
         }
         print(json.dumps(error_response))
         sys.exit(1)
-
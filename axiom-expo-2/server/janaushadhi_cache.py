@@ -0,0 +1,152 @@
+"""
+Two-level cache of medicine lookup results.
+- L1: bounded in-process LRU, query key -> match result
+- L2: optional SQLiteCache on disk, shared by every worker process
+Keys carry the catalog's content hash and RESOLVER_VERSION, so replacing the
+product CSV or changing how names are resolved starts a fresh key space (old L2
+rows simply age out of the LRU).
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from sqlite_cache import SQLiteCache
+
+# disk level next to this script unless LOOKUP_CACHE_PATH is set ("" disables it)
+LOOKUP_CACHE_PATH = os.environ.get(
+    "LOOKUP_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lookup_cache.db"))
+LOOKUP_CACHE_TTL_S = 30 * 24 * 3600
+LOOKUP_CACHE_MAX_ENTRIES = 20000
+MEMO_MAX_ENTRIES = 4096
+# bump whenever resolve_medicine()'s matching, result shape or query_key() changes
+RESOLVER_VERSION = 4
+
+
+class MemoLRU:
+    """Thread-safe bounded LRU dict with hit/miss counters."""
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+        }
+
+
+def catalog_namespace(fingerprint):
+    """Key prefix for one catalog and resolver version: content hash, else mtime/size."""
+    catalog = fingerprint.get("sha1") or f"{fingerprint.get('mtime_ns')}-{fingerprint.get('size')}"
+    return f"v{RESOLVER_VERSION}:{catalog}"
+
+
+def query_key(med):
+    """
+    Cache key for a medicine query: case and spacing don't matter, punctuation
+    does ("125mg/5ml" is a syrup, "125mg 5ml" is not; "0.5mg" is not "0 5mg").
+    """
+    return re.sub(r"\s+", " ", str(med).strip().casefold())
+
+
+class LookupCache:
+    """
+    Memo in front of an optional disk cache. Values must be JSON-serializable
+    (they are stored as-is in L1 and as JSON in L2).
+    """
+
+    def __init__(self, catalog_fingerprint, disk_path=LOOKUP_CACHE_PATH, memo_entries=MEMO_MAX_ENTRIES):
+        self.namespace = catalog_namespace(catalog_fingerprint)
+        self.memo = MemoLRU(memo_entries)
+        self.disk = None
+        if disk_path:
+            try:
+                self.disk = SQLiteCache(disk_path, table="jan_lookup",
+                                        ttl_s=LOOKUP_CACHE_TTL_S, max_entries=LOOKUP_CACHE_MAX_ENTRIES)
+            except Exception:
+                # unwritable location: memo only
+                self.disk = None
+        self.computed = 0
+
+    def get_or_compute(self, med, compute):
+        """Cached result for med, calling compute(med) only on a miss in both levels."""
+        key = query_key(med)
+        value = self.memo.get(key)
+        if value is not None:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(f"{self.namespace}:{key}")
+            if value is not None:
+                self.memo.set(key, value)
+                return value
+        value = compute(med)
+        self.computed += 1
+        self.memo.set(key, value)
+        if self.disk is not None:
+            self.disk.set(f"{self.namespace}:{key}", value)
+        return value
+
+    def clear(self):
+        self.memo.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        memo = self.memo.stats()
+        disk = self.disk.stats() if self.disk is not None else None
+        lookups = memo["hits"] + memo["misses"]
+        return {
+            "memo": memo,
+            "disk": disk,
+            "computed": self.computed,
+            # share of lookups answered by either level
+            "hit_rate": ((lookups - self.computed) / lookups) if lookups else 0.0,
+        }
+
+
+# process-wide: catalog namespace -> LookupCache
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def lookup_cache_for(catalog, disk_path=LOOKUP_CACHE_PATH):
+    """The LookupCache for a loaded CatalogIndex (a rebuilt catalog gets a new one)."""
+    namespace = catalog_namespace(catalog.fingerprint)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(namespace)
+        if cache is None:
+            cache = _CACHES[namespace] = LookupCache(catalog.fingerprint, disk_path)
+        return cache
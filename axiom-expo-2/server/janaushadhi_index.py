@@ -0,0 +1,389 @@
+"""
+Jan Aushadhi catalog index.
+Converts the product CSV once into a columnar store next to it (a directory of
+.npy arrays: UTF-8 string tables with offsets, float64 prices, CSR trigram
+postings) and reuses it until the CSV changes (mtime/size, then content hash).
+The arrays are opened with mmap_mode="r", so every worker process shares one
+copy of the pages and startup does no CSV parsing or column guessing.
+Queries only score the small candidate set that shares trigrams with them.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import difflib
+import heapq
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+INDEX_VERSION = 4
+INDEX_SUFFIX = ".catalog"
+META_FILE = "meta.json"
+STRING_COLUMNS = ("names", "norm_names", "vendors", "units", "groups")
+# how many trigram-overlap candidates are re-scored with difflib per query
+MAX_CANDIDATES = 64
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+# thousands separators, currency marks and spaces stripped from price cells
+_PRICE_JUNK = r"[,\s₹]|Rs\.?"
+
+# process-wide memo: csv_path -> CatalogIndex
+_LOADED = {}
+
+
+def normalize_name(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return _NON_ALNUM.sub(" ", str(text).lower()).strip()
+
+
+def trigrams(norm):
+    """Set of padded character trigrams for an already-normalized string."""
+    if not norm:
+        return set()
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def file_fingerprint(path, with_hash=True):
+    """Return {'mtime_ns', 'size', 'sha1'} for a file (sha1 only if with_hash)."""
+    st = os.stat(path)
+    fp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    if with_hash:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        fp["sha1"] = h.hexdigest()
+    return fp
+
+
+def detect_columns(columns):
+    """Guess name/price/vendor columns by substring, same rules the lookup always used."""
+    name_col = None; price_col = None; vendor_col = None
+    for c in columns:
+        cl = c.lower()
+        if any(k in cl for k in ["product", "product name", "name", "medicine", "item", "title"]) and not name_col:
+            name_col = c
+        if any(k in cl for k in ["price", "mrp", "rate", "amount"]) and not price_col:
+            price_col = c
+        if any(k in cl for k in ["vendor", "seller", "store", "shop", "source"]) and not vendor_col:
+            vendor_col = c
+    return name_col, price_col, vendor_col
+
+
+def detect_detail_columns(columns):
+    """Guess the pack-size and therapeutic-group columns (None when absent)."""
+    unit_col = None; group_col = None
+    for c in columns:
+        cl = c.lower()
+        if any(k in cl for k in ["unit size", "pack size", "pack", "unit"]) and not unit_col:
+            unit_col = c
+        if any(k in cl for k in ["group", "category", "class"]) and not group_col:
+            group_col = c
+    return unit_col, group_col
+
+
+def read_catalog_csv(csv_path):
+    """Read the product CSV, falling back to latin1 for odd encodings."""
+    try:
+        return pd.read_csv(csv_path)
+    except Exception:
+        return pd.read_csv(csv_path, encoding="latin1")
+
+
+def clean_price_column(series):
+    """Whole price column -> float64 array in one vectorized pass; unparseable cells are NaN."""
+    cleaned = series.astype(str).str.replace(_PRICE_JUNK, "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=np.float64)
+
+
+class StringColumn:
+    """
+    Read-only sequence of strings stored as one UTF-8 byte array plus int64
+    offsets (row i is data[offsets[i]:offsets[i + 1]]). Works the same over
+    in-memory and memory-mapped arrays.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [("" if s is None else str(s)).encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        buf = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for i in range(len(offsets) - 1):
+            yield buf[offsets[i]:offsets[i + 1]].decode("utf-8")
+
+    def tolist(self):
+        return list(self)
+
+
+def _as_column(values, n):
+    if isinstance(values, StringColumn):
+        return values
+    return StringColumn.from_strings(values if values is not None else [""] * n)
+
+
+class CatalogIndex:
+    """
+    Catalog rows plus an inverted trigram index over their names.
+    String columns are StringColumns (missing cells and absent columns are "");
+    prices is a float64 array (NaN = missing/unparseable); postings are CSR:
+    rows sharing trigram g are post_rows[post_indptr[gram_ids[g]]:post_indptr[gram_ids[g] + 1]].
+    """
+
+    def __init__(self, names, prices, vendors, columns, grams, post_indptr, post_rows, fingerprint,
+                 norm_names, gram_counts, units=None, groups=None):
+        n = len(names)
+        self.names = _as_column(names, n)
+        self.norm_names = _as_column(norm_names, n)
+        self.vendors = _as_column(vendors, n)
+        self.units = _as_column(units, n)
+        self.groups = _as_column(groups, n)
+        self.prices = prices
+        self.gram_counts = gram_counts
+        self.columns = columns
+        self.grams = _as_column(grams, len(post_indptr) - 1)
+        self.gram_ids = {g: i for i, g in enumerate(self.grams)}
+        self.post_indptr = post_indptr
+        self.post_rows = post_rows
+        self.fingerprint = fingerprint
+        self._norm_array = None
+        # janaushadhi_ingredients.IngredientIndex, built on first use
+        self.ingredients = None
+
+    # ---------- build / persist ----------
+    @classmethod
+    def build(cls, csv_path, fingerprint=None):
+        df = read_catalog_csv(csv_path)
+        name_col, price_col, vendor_col = detect_columns(df.columns)
+        if name_col is None:
+            raise ValueError("Could not find a product/medicine name column in the CSV file.")
+
+        names = df[name_col].astype(str).tolist()
+        prices = clean_price_column(df[price_col]) if price_col else np.full(len(names), np.nan)
+        vendors = df[vendor_col].astype(str).tolist() if vendor_col else None
+        unit_col, group_col = detect_detail_columns(df.columns)
+        units = df[unit_col].fillna("").astype(str).tolist() if unit_col else None
+        groups = df[group_col].fillna("").astype(str).tolist() if group_col else None
+        norm_names = (df[name_col].astype(str).str.lower()
+                      .str.replace(_NON_ALNUM, " ", regex=True).str.strip().tolist())
+
+        postings = defaultdict(list)
+        gram_counts = np.empty(len(names), dtype=np.int32)
+        for row, norm in enumerate(norm_names):
+            grams = trigrams(norm)
+            gram_counts[row] = len(grams)
+            for g in grams:
+                postings[g].append(row)
+        grams = sorted(postings)
+        post_indptr = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum([len(postings[g]) for g in grams], out=post_indptr[1:])
+        post_rows = np.fromiter((r for g in grams for r in postings[g]), dtype=np.int32, count=int(post_indptr[-1]))
+
+        if fingerprint is None:
+            fingerprint = file_fingerprint(csv_path)
+        columns = {"name": name_col, "price": price_col, "vendor": vendor_col, "unit": unit_col, "group": group_col}
+        return cls(names, prices, vendors, columns, grams, post_indptr, post_rows, fingerprint,
+                   norm_names, gram_counts, units, groups)
+
+    def _arrays(self):
+        arrays = {"prices": self.prices, "gram_counts": self.gram_counts,
+                  "post_indptr": self.post_indptr, "post_rows": self.post_rows,
+                  "grams.data": self.grams.data, "grams.offsets": self.grams.offsets}
+        for col in STRING_COLUMNS:
+            arrays[f"{col}.data"] = getattr(self, col).data
+            arrays[f"{col}.offsets"] = getattr(self, col).offsets
+        return arrays
+
+    def save(self, index_dir):
+        """Write the columnar store to index_dir, replacing any previous one."""
+        tmp = f"{index_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, arr in self._arrays().items():
+            np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(arr), allow_pickle=False)
+        meta = {"version": INDEX_VERSION, "fingerprint": self.fingerprint, "columns": self.columns,
+                "rows": len(self.names)}
+        with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        old = f"{index_dir}.old-{os.getpid()}"
+        if os.path.exists(index_dir):
+            os.replace(index_dir, old)
+        os.replace(tmp, index_dir)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def open(cls, index_dir, meta):
+        """Memory-map a store written by save(); meta is its parsed meta.json."""
+        def load(name):
+            return np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r", allow_pickle=False)
+
+        cols = {col: StringColumn(load(f"{col}.data"), load(f"{col}.offsets")) for col in STRING_COLUMNS}
+        return cls(cols["names"], load("prices"), cols["vendors"], meta["columns"],
+                   StringColumn(load("grams.data"), load("grams.offsets")),
+                   load("post_indptr"), load("post_rows"), meta["fingerprint"],
+                   cols["norm_names"], load("gram_counts"), cols["units"], cols["groups"])
+
+    # ---------- query ----------
+    def price_of(self, row):
+        """Price of a row as a float, or None when the catalog has no usable price."""
+        p = self.prices[row]
+        return None if np.isnan(p) else float(p)
+
+    def cheapest(self, rows):
+        """Row with the lowest known price among rows (the first row if none has a price)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        prices = self.prices[rows]
+        if np.isnan(prices).all():
+            return int(rows[0])
+        return int(rows[np.nanargmin(prices)])
+
+    def substring_rows(self, query, limit=None):
+        """Rows whose normalized name contains the normalized query (vectorized scan)."""
+        q = normalize_name(query)
+        if not q:
+            return []
+        if self._norm_array is None:
+            self._norm_array = np.array(self.norm_names.tolist(), dtype=str)
+        rows = np.flatnonzero(np.char.find(self._norm_array, q) >= 0)
+        return rows[:limit].tolist() if limit else rows.tolist()
+
+    def candidates(self, norm_query, limit=MAX_CANDIDATES):
+        """Row ids sharing the most trigrams with the query (Jaccard-ranked)."""
+        gids = [self.gram_ids[g] for g in trigrams(norm_query) if g in self.gram_ids]
+        if not gids:
+            return []
+        nq = len(trigrams(norm_query))
+        rows = np.concatenate([self.post_rows[self.post_indptr[i]:self.post_indptr[i + 1]] for i in gids])
+        rows, hits = np.unique(rows, return_counts=True)
+        score = hits / (nq + self.gram_counts[rows] - hits)
+        # best score first, lower row first among ties
+        order = np.lexsort((rows, -score))[:limit]
+        return rows[order].tolist()
+
+    def search(self, query, n=5, cutoff=0.5):
+        """
+        Fuzzy match a medicine name against the catalog.
+        Same scoring as difflib.get_close_matches, but only over the trigram
+        candidate set. Returns a list of row ids, best first.
+        """
+        norm_query = normalize_name(query)
+        s = difflib.SequenceMatcher()
+        s.set_seq2(norm_query)
+        scored = []
+        for row in self.candidates(norm_query):
+            s.set_seq1(self.norm_names[row])
+            if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff and s.ratio() >= cutoff:
+                scored.append((s.ratio(), -row))
+        return [-r for _, r in heapq.nlargest(n, scored)]
+
+
+def index_path_for(csv_path):
+    return csv_path + INDEX_SUFFIX
+
+
+def _load_meta(index_dir):
+    try:
+        with open(os.path.join(index_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except Exception:
+        return None
+    if meta.get("version") != INDEX_VERSION:
+        return None
+    return meta
+
+
+def _open_persisted(index_dir, meta):
+    try:
+        return CatalogIndex.open(index_dir, meta)
+    except (OSError, ValueError, KeyError):
+        # half-written or damaged store: rebuild
+        return None
+
+
+def load_catalog_index(csv_path):
+    """
+    Return the CatalogIndex for csv_path, memory-mapped from its columnar store
+    and building that store only when the CSV has changed since it was written.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV not found at: {csv_path}")
+
+    key = os.path.abspath(csv_path)
+    quick_fp = file_fingerprint(csv_path, with_hash=False)
+
+    # already loaded in this process and the file hasn't been touched
+    cached = _LOADED.get(key)
+    if cached is not None and _same_stat(cached.fingerprint, quick_fp):
+        return cached
+
+    index_dir = index_path_for(csv_path)
+    meta = _load_meta(index_dir)
+    if meta is not None:
+        index = None
+        if _same_stat(meta["fingerprint"], quick_fp):
+            index = _open_persisted(index_dir, meta)
+        else:
+            # mtime/size changed — content may still be identical (e.g. a fresh checkout)
+            full_fp = file_fingerprint(csv_path)
+            if meta["fingerprint"].get("sha1") == full_fp["sha1"]:
+                meta["fingerprint"] = full_fp
+                _try_write_meta(index_dir, meta)
+                index = _open_persisted(index_dir, meta)
+        if index is not None:
+            _LOADED[key] = index
+            return index
+
+    index = CatalogIndex.build(csv_path)
+    if _try_save(index, index_dir):
+        # serve from the mapped files so this process shares pages with the others
+        index = _open_persisted(index_dir, _load_meta(index_dir)) or index
+    _LOADED[key] = index
+    return index
+
+
+def _same_stat(fp_a, fp_b):
+    return fp_a.get("mtime_ns") == fp_b.get("mtime_ns") and fp_a.get("size") == fp_b.get("size")
+
+
+def _try_write_meta(index_dir, meta):
+    tmp = os.path.join(index_dir, f"{META_FILE}.tmp-{os.getpid()}")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(index_dir, META_FILE))
+    except OSError:
+        pass
+
+
+def _try_save(index, index_dir):
+    # a read-only deployment still works, it just rebuilds per process
+    try:
+        index.save(index_dir)
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,396 @@
+"""
+Ingredient-aware view of the Jan Aushadhi catalog.
+Every row's "Generic Name" is parsed once into its molecules and strengths, and
+"Unit Size" into a pack count, so a brand or generic query ("Dolo 650",
+"Paracetamol 650mg", "pan d") resolves by exact key to all equivalent SKUs,
+ranked by price per unit. "Group Name" (the therapeutic group) is reported with
+each row; it is a category shared by hundreds of unrelated drugs, so it plays no
+part in deciding which rows are equivalent.
+"""
+
+import difflib
+import math
+import re
+from collections import defaultdict
+
+import numpy as np
+
+# brand -> generic composition (parsed like a catalog name); longest brand wins.
+# Strengths are the brand's usual dose, used only when the query names none
+# ("Augmentin" is the 625 tablet, "Augmentin 1000" is not).
+BRAND_ALIASES = {
+    "dolo": "paracetamol 650mg",
+    "crocin": "paracetamol 500mg",
+    "calpol": "paracetamol 500mg",
+    "pacimol": "paracetamol",
+    "combiflam": "ibuprofen 400mg and paracetamol 325mg",
+    "brufen": "ibuprofen",
+    "voveran": "diclofenac",
+    "enzoflam": "diclofenac, paracetamol and serratiopeptidase",
+    "zerodol": "aceclofenac 100mg",
+    "zerodol p": "aceclofenac 100mg and paracetamol 325mg",
+    "ultrafen plus": "aceclofenac 100mg and paracetamol 325mg",
+    "pan": "pantoprazole 40mg",
+    "pantocid": "pantoprazole 40mg",
+    "pan d": "pantoprazole 40mg and domperidone 30mg",
+    "omez": "omeprazole",
+    "omeproz": "omeprazole",
+    "ocid": "omeprazole",
+    "rantac": "ranitidine",
+    "aciloc": "ranitidine",
+    "augmentin": "amoxycillin 500mg and clavulanic acid 125mg",
+    "mox": "amoxycillin",
+    "azithral": "azithromycin",
+    "azee": "azithromycin",
+    "cifran": "ciprofloxacin",
+    "glycomet": "metformin",
+    "glycomet gp": "glimepiride and metformin",
+    "amaryl": "glimepiride",
+    "januvia": "sitagliptin",
+    "ecosprin": "aspirin",
+    "telma": "telmisartan",
+    "telma h": "telmisartan and hydrochlorothiazide",
+    "amlong": "amlodipine",
+    "amlokind": "amlodipine",
+    "betaloc": "metoprolol",
+    "atorva": "atorvastatin",
+    "lipitor": "atorvastatin",
+    "rosuvas": "rosuvastatin",
+    "thyronorm": "thyroxine",
+    "eltroxin": "thyroxine",
+    "cetzine": "cetirizine",
+    "okacet": "cetirizine",
+    "allegra": "fexofenadine",
+    "montair lc": "montelukast and levocetirizine",
+    "montek lc": "montelukast and levocetirizine",
+    "asthalin": "salbutamol",
+    "shelcal": "calcium carbonate and vitamin d3",
+    "ultracal d": "calcium carbonate and vitamin d3",
+    "hexigel": "chlorhexidine",
+    "becosules": "vitamin b complex",
+    "limcee": "vitamin c",
+}
+
+# spelling variants -> one canonical molecule name
+MOLECULE_SYNONYMS = {
+    "amoxicillin": "amoxycillin",
+    "acetaminophen": "paracetamol",
+    "clavulanate": "clavulanic acid",
+    "potassium clavulanate": "clavulanic acid",
+    "duloxetin": "duloxetine",
+    "levothyroxine": "thyroxine",
+    "albuterol": "salbutamol",
+    "cholecalciferol": "vitamin d3",
+    "ascorbic acid": "vitamin c",
+    "dorzolamidum": "dorzolamide",
+}
+
+# dosage-form words: recorded as the form, never part of a molecule name
+FORM_WORDS = {
+    "tablet": "tablet", "tablets": "tablet", "tab": "tablet", "tabs": "tablet",
+    "capsule": "capsule", "capsules": "capsule", "cap": "capsule", "caps": "capsule",
+    "injection": "injection", "inj": "injection", "infusion": "injection", "vial": "injection",
+    "syrup": "syrup", "suspension": "suspension", "drops": "drops", "drop": "drops",
+    "cream": "cream", "ointment": "ointment", "gel": "gel", "lotion": "lotion",
+    "powder": "powder", "sachet": "powder", "granules": "powder",
+    "spray": "spray", "inhaler": "inhaler", "rotacaps": "inhaler", "respules": "inhaler",
+    "solution": "solution", "gargle": "solution", "mouthwash": "solution", "paint": "solution",
+}
+# release modifiers, pharmacopoeia marks and filler words
+FILLER_WORDS = {
+    "ip", "bp", "usp", "nf", "gastro", "resistant", "resistance", "enteric", "coated", "film",
+    "delayed", "release", "extended", "sustained", "prolonged", "modified", "controlled",
+    "immediate", "dispersible", "chewable", "orally", "disintegrating", "effervescent",
+    "sr", "er", "xr", "cr", "mr", "dr", "od", "dt", "retard", "for", "of", "per", "in", "w", "v",
+    "oral", "eye", "ear", "nasal", "topical", "ophthalmic", "otic", "janaushadhi", "each",
+    "contains", "containing", "mono", "pack", "bottle", "strip", "plain", "forte", "ds",
+    "soft", "hard", "gelatin", "gelatine", "dry", "strips", "million", "spore", "spores",
+    "combo", "combipack", "kit", "digestive",
+    "mg", "mcg", "g", "gm", "ml", "iu",
+}
+# salt / ester words, dropped unless they start the molecule ("sodium valproate")
+SALT_WORDS = {
+    "hydrochloride", "hcl", "dihydrochloride", "sodium", "potassium", "calcium", "magnesium",
+    "maleate", "hydrobromide", "besylate", "besilate", "succinate", "tartrate", "fumarate",
+    "mesylate", "mesilate", "citrate", "sulphate", "sulfate", "phosphate", "hyclate",
+    "monohydrate", "trihydrate", "dihydrate", "anhydrous", "acetate", "bromide", "medoxomil",
+    "gluconate", "ethanolate", "etabonate", "dipropionate", "propionate", "valerate", "furoate",
+    "disodium", "hydrate",
+}
+
+_STRENGTH = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(mcg|mg|gm|g|iu|%)(?:\s*w\s*/\s*[wv])?"
+    r"(?:\s*(?:per|/)\s*(\d+(?:\.\d+)?)?\s*(ml|gm|g|l\b))?"
+)
+_BARE_NUMBER = re.compile(r"\b(\d+(?:\.\d+)?)\b")
+_SPLIT = re.compile(r",|\s\+\s|\+|\band\b|\bwith\b")
+_WORD = re.compile(r"[a-z][a-z0-9\-]*")
+_PAREN = re.compile(r"\([^)]*\)")
+_PACK_COUNT = re.compile(
+    r"^\s*(\d+)\s*'?\s*s\b|pack of\s*(\d+)|strip of\s*(\d+)"
+    r"|^\s*(\d+)\s*(?:tablets|capsules|nos|sachets?|vials?|ampoules?)\b"
+)
+_BARE = re.compile(r"[\d.]+")
+_STRENGTH_PARTS = re.compile(r"([\d.]+)([a-z%]*)(?:/([\d.]*)([a-z]+))?")
+# unit -> (factor, base unit): mass in mg, volume in ml
+_BASE_UNITS = {"mcg": (0.001, "mg"), "mg": (1.0, "mg"), "g": (1000.0, "mg"), "ml": (1.0, "ml"), "l": (1000.0, "ml")}
+_PACK_WORDS = {"one": 1, "single": 1, "vial": 1, "pair": 2, "two": 2, "three": 3, "four": 4, "five": 5}
+
+
+def _num(text):
+    v = float(text)
+    return f"{v:g}"
+
+
+def _strength_key(m):
+    value, unit, per_value, per_unit = m.groups()
+    unit = {"gm": "g"}.get(unit, unit)
+    key = _num(value) + unit
+    if per_unit:
+        key += "/" + (_num(per_value) if per_value else "") + {"gm": "g"}.get(per_unit, per_unit)
+    return key
+
+
+def canonical_molecule(words):
+    """Molecule name from its words: salt words dropped unless leading, synonyms folded."""
+    kept = [w for i, w in enumerate(words) if i == 0 or w not in SALT_WORDS]
+    name = " ".join(kept)
+    return MOLECULE_SYNONYMS.get(name, name)
+
+
+def parse_composition(text, allow_bare_numbers=False):
+    """
+    Split a generic name into ([(molecule, strength or None), ...], form).
+    Strengths are canonical strings such as "650mg", "10mg/5ml" or "0.2%".
+    allow_bare_numbers treats unitless numbers as strengths (for queries like "dolo 650").
+    """
+    t = str(text).lower()
+    # parentheticals are release notes or salt forms when the strengths sit
+    # outside them ("Pantoprazole 40mg (Gastro-resistant)"), else part of the
+    # composition ("Faropenem (200mg) + Clavulanic Acid (125mg)")
+    outside = _PAREN.sub(" ", t)
+    t = outside if _STRENGTH.search(outside) else t.replace("(", " ").replace(")", " ")
+
+    form = None
+    parts = []
+    orphans = []
+    for chunk in _SPLIT.split(t):
+        strengths = [_strength_key(m) for m in _STRENGTH.finditer(chunk)]
+        rest = _STRENGTH.sub(" ", chunk)
+        if allow_bare_numbers:
+            strengths += [_num(n) for n in _BARE_NUMBER.findall(rest)]
+            rest = _BARE_NUMBER.sub(" ", rest)
+        words = []
+        for w in _WORD.findall(rest):
+            if "-" in w and all(p in FILLER_WORDS for p in w.split("-") if p):
+                continue
+            if w in FORM_WORDS:
+                form = form or FORM_WORDS[w]
+            elif w not in FILLER_WORDS:
+                words.append(w)
+        if words:
+            parts.append([canonical_molecule(words), strengths[0] if strengths else None])
+            orphans.extend(strengths[1:])
+        else:
+            orphans.extend(strengths)
+    # "X Tablets IP 650 mg" / "A and B Tablets 10mg/5mg": hand loose strengths out in order
+    for part in parts:
+        if part[1] is None and orphans:
+            part[1] = orphans.pop(0)
+    return [tuple(p) for p in parts], form
+
+
+def parse_pack_count(unit_size):
+    """Units per pack from a "Unit Size" cell ("10's", "Pack of 4", "Pair in Mono-Pack"), else None."""
+    t = str(unit_size or "").lower().strip()
+    m = _PACK_COUNT.search(t)
+    if m:
+        return int(next(g for g in m.groups() if g))
+    first = t.split(" ", 1)[0]
+    return _PACK_WORDS.get(first)
+
+
+def molecule_key(composition):
+    return "+".join(sorted({mol for mol, _ in composition}))
+
+
+def strength_value(strength):
+    """
+    A canonical strength as (amount, unit, per_unit) in base units (mg, ml), so
+    "0.5g" and "500mg" compare equal, and "125mg/5ml" equals "25mg/ml".
+    per_unit is None for plain amounts; None for an unparseable strength.
+    """
+    m = _STRENGTH_PARTS.fullmatch(strength or "")
+    if m is None:
+        return None
+    value, unit, per_value, per_unit = m.groups()
+    factor, unit = _BASE_UNITS.get(unit, (1.0, unit))
+    amount = float(value) * factor
+    if not per_unit:
+        return amount, unit, None
+    per_factor, per_unit = _BASE_UNITS.get(per_unit, (1.0, per_unit))
+    return amount / (float(per_value or 1) * per_factor), unit, per_unit
+
+
+def _same_strength(a, b):
+    return a is not None and b is not None and a[1:] == b[1:] and math.isclose(a[0], b[0], rel_tol=1e-9)
+
+
+def _strength_matches(wanted, have):
+    """Query strength vs catalog strength, compared in base units; a bare number matches on value alone."""
+    if wanted is None:
+        return True
+    if have is None:
+        return False
+    if _BARE.fullmatch(wanted):
+        return math.isclose(float(wanted), float(_BARE.match(have).group(0)), rel_tol=1e-9)
+    return _same_strength(strength_value(wanted), strength_value(have))
+
+
+def _mass_mg(strength):
+    """A plain mass strength ("500mg", "1g") in mg, else None."""
+    value = strength_value(strength)
+    return value[0] if value is not None and value[1:] == ("mg", None) else None
+
+
+# preferred when the query doesn't name a form: "Pan 40" means the tablet
+ORAL_SOLID_FORMS = {"tablet", "capsule"}
+
+
+class IngredientIndex:
+    """Per-row composition, form and pack size of a CatalogIndex, keyed by molecule set."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        n = len(catalog.names)
+        self.compositions = []
+        self.forms = []
+        self.pack_counts = np.full(n, np.nan)
+        self.by_molecules = defaultdict(list)
+        for row, name in enumerate(catalog.names):
+            comp, form = parse_composition(name)
+            self.compositions.append(comp)
+            self.forms.append(form)
+            count = parse_pack_count(catalog.units[row])
+            if count:
+                self.pack_counts[row] = count
+            if comp:
+                self.by_molecules[molecule_key(comp)].append(row)
+        # MRP 0.00 marks items without a current price; never rank them as cheapest
+        prices = np.where(catalog.prices > 0, catalog.prices, np.nan)
+        self.unit_prices = prices / self.pack_counts
+        self.vocabulary = {mol for comp in self.compositions for mol, _ in comp}
+        # difflib wants a sequence; sorted so close-match ties break the same way every run
+        self._vocabulary_list = sorted(self.vocabulary)
+
+    def parse_query(self, query):
+        """Brand aliases expanded, molecules snapped to the catalog vocabulary."""
+        q = str(query).lower().replace("-", " ")
+        words = q.split()
+        for size in range(min(3, len(words)), 0, -1):
+            brand = " ".join(words[:size])
+            if brand in BRAND_ALIASES:
+                rest = " ".join(words[size:])
+                alias = BRAND_ALIASES[brand]
+                if re.search(r"\d", rest):
+                    # the query's own strength replaces the brand's usual dose
+                    alias = _STRENGTH.sub(" ", alias)
+                q = alias + " " + rest
+                break
+        comp, form = parse_composition(q, allow_bare_numbers=True)
+        snapped = []
+        for mol, strength in comp:
+            if mol not in self.by_molecules and mol not in self.vocabulary:
+                close = difflib.get_close_matches(mol, self._vocabulary_list, n=1, cutoff=0.85)
+                if close:
+                    mol = close[0]
+            snapped.append((mol, strength))
+        return snapped, form
+
+    def _total_matches(self, row, comp, total):
+        """A combination's strengths add up to one bare number ("Augmentin 625" = 500mg + 125mg)."""
+        have = dict(self.compositions[row])
+        masses = [_mass_mg(have.get(mol)) for mol, _ in comp]
+        return None not in masses and abs(sum(masses) - float(total)) < 1e-6
+
+    def _strength_group(self, rows):
+        """
+        Rows of one strength and form, cheapest per unit first. Unit prices are
+        only comparable within a group; the group kept is the one with a price,
+        an oral solid form and the most SKUs, in that order.
+        """
+        groups = defaultdict(list)
+        for row in rows:
+            strengths = tuple(strength_value(s) or s for _, s in self.compositions[row])
+            groups[(strengths, self.forms[row])].append(row)
+
+        def preference(item):
+            (_, form), members = item
+            priced = any(not np.isnan(self.unit_prices[r]) or self.catalog.prices[r] > 0 for r in members)
+            return (not priced, form not in ORAL_SOLID_FORMS, -len(members), min(members))
+
+        group = min(groups.items(), key=preference)[1]
+        # unit price, then pack price; unpriced rows last
+        return sorted(group, key=lambda r: (np.nan_to_num(self.unit_prices[r], nan=np.inf),
+                                            np.nan_to_num(self.catalog.prices[r], nan=np.inf), r))
+
+    def match(self, query):
+        """
+        Catalog rows with the query's molecules, all of one strength and form,
+        cheapest per unit first. Returns (rows, strength_match):
+        - True: the rows have the strength the query asked for
+        - None: the query named no strength (nor does its brand); rows are the
+          most stocked strength
+        - False: no row has the asked strength; rows are the same molecules at
+          another strength and must not be presented as equivalent
+        rows is empty when the query isn't a known drug.
+        """
+        comp, form = self.parse_query(query)
+        if not comp:
+            return [], None
+        rows = [r for r in self.by_molecules.get(molecule_key(comp), [])
+                if form is None or self.forms[r] in (None, form)]
+        if not rows:
+            return [], None
+        wanted = [(mol, s) for mol, s in comp if s is not None]
+        if not wanted:
+            return self._strength_group(rows), None
+        tests = [lambda r: all(_strength_matches(s, dict(self.compositions[r]).get(mol)) for mol, s in wanted)]
+        if len(comp) > 1 and len(wanted) == 1 and _BARE.fullmatch(wanted[0][1]):
+            # one number for a combination: its total, else the lead molecule's ("Pan D 40")
+            total = wanted[0][1]
+            tests = [lambda r: self._total_matches(r, comp, total),
+                     lambda r: _strength_matches(total, dict(self.compositions[r]).get(comp[0][0]))]
+        for test in tests:
+            same = [r for r in rows if test(r)]
+            if same:
+                return self._strength_group(same), True
+        return self._strength_group(rows), False
+
+    def resolve(self, query):
+        """
+        Equivalent SKUs for the query: match() rows of the asked strength (or
+        of the usual one when none was asked). Empty when only other strengths
+        exist or the query isn't a known drug.
+        """
+        rows, strength_match = self.match(query)
+        return rows if strength_match is not False else []
+
+    def describe(self, row):
+        """Composition, form, therapeutic group, pack count and unit price of one row."""
+        count = self.pack_counts[row]
+        unit_price = self.unit_prices[row]
+        return {
+            "composition": [{"molecule": m, "strength": s} for m, s in self.compositions[row]],
+            "form": self.forms[row],
+            "group": self.catalog.groups[row] or None,
+            "pack_count": None if np.isnan(count) else int(count),
+            "unit_price": None if np.isnan(unit_price) else float(unit_price),
+        }
+
+
+def ingredient_index_for(catalog):
+    """IngredientIndex of a CatalogIndex, built once and kept on the catalog."""
+    if catalog.ingredients is None:
+        catalog.ingredients = IngredientIndex(catalog)
+    return catalog.ingredients
@@ -1,8 +1,62 @@
 import pandas as pd
-import difflib
-import os
 
-def janaushadhi_lookup(medicine_list, csv_path="Product List_6_11_2025 @ 15_1_15.csv"):
+from axiom_core import CATALOG_CSV_PATH, JAN_AUSHADHI_CLINICS
+from janaushadhi_cache import lookup_cache_for
+from janaushadhi_index import load_catalog_index
+from janaushadhi_ingredients import ingredient_index_for
+
+DEFAULT_CSV_PATH = CATALOG_CSV_PATH
+
+
+def resolve_medicine(index, ingredients, med):
+    """
+    Best Jan Aushadhi match for one medicine name, with raw numbers.
+    Returns {'medicine', 'matched_name', 'price', 'vendor', 'unit_price',
+    'pack', 'equivalents', 'strength_match'}; price/unit_price are floats or
+    None, matched_name is None when nothing matched. strength_match is False
+    when the match has the right molecules but not the asked strength (see
+    IngredientIndex.match), None when no strength was asked or the match is a
+    fuzzy name match.
+    """
+    rows, strength_match = ingredients.match(med)
+    if rows:
+        # one strength, already ranked by price per unit
+        best = rows[0]
+    else:
+        strength_match = None
+        rows = index.search(med, n=5, cutoff=0.5)
+        # Pick the lowest valid price straight from the typed price array
+        best = index.cheapest(rows) if rows else None
+
+    if best is None:
+        return {"medicine": med, "matched_name": None, "price": None, "vendor": None,
+                "unit_price": None, "pack": None, "equivalents": 0, "strength_match": None}
+    return {
+        "medicine": med,
+        "matched_name": index.names[best],
+        "price": index.price_of(best),
+        "vendor": index.vendors[best] or None,
+        "unit_price": ingredients.describe(best)["unit_price"],
+        "pack": index.units[best] or None,
+        # other strengths are never counted as equivalents
+        "equivalents": len(rows) if strength_match is not False else 0,
+        "strength_match": strength_match
+    }
+
+
+def cached_resolve(index, ingredients, med):
+    """resolve_medicine() through the catalog's two-level lookup cache."""
+    cache = lookup_cache_for(index)
+    hit = cache.get_or_compute(med, lambda m: resolve_medicine(index, ingredients, m))
+    return dict(hit, medicine=med)
+
+
+def lookup_cache_stats(csv_path=DEFAULT_CSV_PATH):
+    """Hit/miss counters of the lookup cache for csv_path's catalog."""
+    return lookup_cache_for(load_catalog_index(csv_path)).stats()
+
+
+def janaushadhi_lookup(medicine_list, csv_path=DEFAULT_CSV_PATH):
     """
     Perform Jan Aushadhi medicine price lookup and return nearby clinic information.
 
@@ -16,110 +70,59 @@ def janaushadhi_lookup(medicine_list, csv_path="Product List_6_11_2025 @ 15_1_15
     Returns
     -------
     tuple (pandas.DataFrame, list[dict])
-        - DataFrame: columns ['Medicine', 'Matched_Name', 'Price', 'Vendor']
+        - DataFrame: columns ['Medicine', 'Matched_Name', 'Price', 'Vendor',
+          'Unit_Price', 'Pack', 'Equivalents', 'Strength_Match']; Strength_Match
+          is "No" when only another strength of the medicine was found.
         - List of dicts: [{'name', 'address', 'lat', 'lon'}] for Jan Aushadhi clinics.
     """
 
-    # --- Load the CSV safely ---
-    if not os.path.exists(csv_path):
-        raise FileNotFoundError(f"CSV not found at: {csv_path}")
-
-    try:
-        df = pd.read_csv(csv_path)
-    except Exception:
-        df = pd.read_csv(csv_path, encoding="latin1")
-
-    # --- Identify key columns automatically ---
-    name_col = None; price_col = None; vendor_col = None
-    for c in df.columns:
-        cl = c.lower()
-        if any(k in cl for k in ["product", "product name", "name", "medicine", "item", "title"]) and not name_col:
-            name_col = c
-        if any(k in cl for k in ["price", "mrp", "rate", "amount"]) and not price_col:
-            price_col = c
-        if any(k in cl for k in ["vendor", "seller", "store", "shop", "source"]) and not vendor_col:
-            vendor_col = c
-
-    if name_col is None:
-        raise ValueError("Could not find a product/medicine name column in the CSV file.")
-
-    candidates = df[name_col].astype(str).tolist()
+    # --- Load the prebuilt catalog index (rebuilt only when the CSV changes) ---
+    index = load_catalog_index(csv_path)
+    ingredients = ingredient_index_for(index)
 
-    # --- Perform fuzzy match & price lookup ---
+    # --- Resolve by active ingredient, fall back to fuzzy name match ---
     results = []
     for med in medicine_list:
-        matches = difflib.get_close_matches(med, candidates, n=5, cutoff=0.5)
-
-        if matches:
-            best = None
-            for m in matches:
-                idx = candidates.index(m)
-                price_val = None
-                vendor_val = None
-                if price_col and price_col in df.columns:
-                    try:
-                        price_val = float(str(df.at[idx, price_col]).replace(",", "").strip())
-                    except Exception:
-                        price_val = None
-                if vendor_col and vendor_col in df.columns:
-                    vendor_val = str(df.at[idx, vendor_col])
-
-                # Pick the lowest valid price
-                if best is None or (price_val is not None and (best["price"] is None or price_val < best["price"])):
-                    best = {"match_name": m, "price": price_val, "vendor": vendor_val}
-
-            if best is None:
-                best = {"match_name": matches[0], "price": None, "vendor": None}
-
-            results.append({
-                "Medicine": med,
-                "Matched_Name": best["match_name"],
-                "Price": f"₹{best['price']:.2f}" if best["price"] is not None else "N/A",
-                "Vendor": best.get("vendor") or ""
-            })
-        else:
-            results.append({"Medicine": med, "Matched_Name": "", "Price": "Not found", "Vendor": ""})
+        r = cached_resolve(index, ingredients, med)
+        if r["matched_name"] is None:
+            results.append({"Medicine": med, "Matched_Name": "", "Price": "Not found", "Vendor": "",
+                            "Unit_Price": "", "Pack": "", "Equivalents": 0, "Strength_Match": ""})
+            continue
+        results.append({
+            "Medicine": med,
+            "Matched_Name": r["matched_name"],
+            "Price": f"₹{r['price']:.2f}" if r["price"] is not None else "N/A",
+            "Vendor": r["vendor"] or "",
+            "Unit_Price": f"₹{r['unit_price']:.2f}" if r["unit_price"] is not None else "",
+            "Pack": r["pack"] or "",
+            "Equivalents": r["equivalents"],
+            "Strength_Match": {True: "Yes", False: "No", None: ""}[r["strength_match"]]
+        })
 
     df_results = pd.DataFrame(results)
 
-    # --- Jan Aushadhi clinic info (from app12.py) ---
-    jan_aushadhi_clinics = [
-        {
-            "name": "Pradhan Mantri JanAushadhi Kendra - Gokhale Rd",
-            "address": "921, Gokhale Rd, Rajarajeshwari Nagar, Bengaluru 560098",
-            "lat": 12.917612214940876,
-            "lon": 77.51904488091897
-        },
-        {
-            "name": "Pradhan Mantri Janaushadhi Kendra - BHEL 2nd Stage",
-            "address": "Sir M Vishnuvardhan Main Rd, Rajarajeshwari Nagar, Bengaluru 560098",
-            "lat": 12.917612214940876,
-            "lon": 77.50978399033598
-        },
-        {
-            "name": "Pradhan Mantri Jan Aushadhi Kendra - Kenchena Halli Rd",
-            "address": "17 ground floor, Kenchena Halli Rd, Rajarajeshwari Nagar, Bengaluru 560098",
-            "lat": 12.910492603965448,
-            "lon": 77.51343617253772
-        },
-        {
-            "name": "PRADHAN MANTRI BHARTIYA JANAUSHADHI KENDRA - Channasandra",
-            "address": "No 851, Dr.Vishnuvardhan Rd, Channasandra, Bengaluru 560098",
-            "lat": 12.903563502133089,
-            "lon": 77.52067531940189
-        },
-        {
-            "name": "Pradhan mantri Janaushadhi kendra - Kodipalya",
-            "address": "Shop No.F4, Vasthu Green Shopping Complex, Kodipalya, Bengaluru, Karnataka 560060",
-            "lat": 12.906666049048614,
-            "lon": 77.48845393143118
-        },
-        {
-            "name": "Pradhan Mantri Bhartiya Jan Aushadhi Kendra Kengeri",
-            "address": "Kengeri, Bengaluru, Karnataka 560060",
-            "lat": 12.915871335395288,
-            "lon": 77.4804822691128
-        }
-    ]
-
-    return df_results, jan_aushadhi_clinics
+    return df_results, JAN_AUSHADHI_CLINICS
+
+
+def lookup_many(prescriptions, csv_path=DEFAULT_CSV_PATH):
+    """
+    Batch lookup over many prescriptions.
+
+    Parameters
+    ----------
+    prescriptions : iterable of (id, list[str])
+        Consumed lazily, so a generator over a large file is fine.
+    csv_path : str
+        Path to the catalog CSV.
+
+    Yields
+    ------
+    dict
+        {'id', 'prices': [resolve_medicine() dicts]} per prescription, in input
+        order. Each distinct medicine name (ignoring case and spacing, see
+        janaushadhi_cache.query_key) is resolved once; repeats are lookup-cache hits.
+    """
+    index = load_catalog_index(csv_path)
+    ingredients = ingredient_index_for(index)
+    for presc_id, medicine_list in prescriptions:
+        yield {"id": presc_id, "prices": [cached_resolve(index, ingredients, med) for med in medicine_list]}
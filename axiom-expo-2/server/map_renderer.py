@@ -0,0 +1,33 @@
+"""
+Fast delivery-map renderer.
+The HTML/JS shell (templates/delivery_map_shell.html) is static and read once per
+process; each map is just a compact JSON payload of markers, polylines and popups
+dropped into it. No Folium object graph, no iframes, no per-request script injection.
+"""
+
+import json
+import os
+
+SHELL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "delivery_map_shell.html")
+PAYLOAD_PLACEHOLDER = "/*__MAP_DATA__*/null"
+
+_shell = None
+
+
+def load_shell():
+    """Static map shell, cached for the life of the process."""
+    global _shell
+    if _shell is None:
+        with open(SHELL_PATH, "r", encoding="utf-8") as f:
+            _shell = f.read()
+    return _shell
+
+
+def payload_to_json(payload):
+    """Compact JSON that is safe to inline inside a <script> element."""
+    return json.dumps(payload, separators=(",", ":")).replace("</", "<\\/")
+
+
+def render_map_html(payload):
+    """Full standalone HTML document for a map payload."""
+    return load_shell().replace(PAYLOAD_PLACEHOLDER, payload_to_json(payload), 1)
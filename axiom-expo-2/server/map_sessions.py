@@ -0,0 +1,118 @@
+"""
+Map sessions for incremental delivery-map updates.
+A session keeps the base layer (origin, stores, clinics and their routes) of a
+rendered map plus its assignment layers, keyed by session id. Adding or removing
+an assignment returns a patch with only the layers that changed, which the map
+shell applies in place via window.applyMapPatch(patch).
+"""
+
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+MAX_SESSIONS = 200
+SESSION_TTL_S = 2 * 3600
+
+
+class MapSession:
+    def __init__(self, session_id, origin, stores_flat, payload):
+        self.session_id = session_id
+        self.origin = origin
+        self.stores_flat = stores_flat
+        self.payload = payload
+        # assignment_id -> {"assignment": dict, "layer_ids": [...]}
+        self.assignments = OrderedDict()
+        self._next_assignment = 0
+        self.touched_at = time.time()
+
+    def new_assignment_id(self):
+        assignment_id = f"a{self._next_assignment}"
+        self._next_assignment += 1
+        return assignment_id
+
+    def add_layers(self, assignment_id, assignment, layers):
+        """
+        Record an assignment and its layers ({"markers", "polylines", "circles", "routes"}).
+        Returns the patch that adds them to a rendered map.
+        """
+        layer_ids = ([m["id"] for m in layers.get("markers", [])]
+                     + [p["id"] for p in layers.get("polylines", [])]
+                     + [c["id"] for c in layers.get("circles", [])])
+        self.assignments[assignment_id] = {"assignment": assignment, "layer_ids": layer_ids}
+        for key in ("markers", "polylines", "circles"):
+            self.payload[key].extend(layers.get(key, []))
+        self.payload["routes"].update(layers.get("routes", {}))
+        return {
+            "session_id": self.session_id,
+            "assignment_id": assignment_id,
+            "add": {
+                "markers": layers.get("markers", []),
+                "polylines": layers.get("polylines", []),
+                "circles": layers.get("circles", []),
+                "routes": layers.get("routes", {}),
+                "precision": self.payload.get("precision")
+            },
+            "remove": []
+        }
+
+    def remove_assignment(self, assignment_id):
+        """Drop an assignment's layers; returns the removal patch (LookupError if unknown)."""
+        entry = self.assignments.pop(assignment_id, None)
+        if entry is None:
+            raise LookupError(f"Unknown assignment in map session {self.session_id}: {assignment_id}")
+        gone = set(entry["layer_ids"])
+        for key in ("markers", "polylines", "circles"):
+            self.payload[key] = [x for x in self.payload[key] if x.get("id") not in gone]
+        for layer_id in gone:
+            self.payload["routes"].pop(layer_id, None)
+        return {"session_id": self.session_id, "assignment_id": assignment_id,
+                "add": {"markers": [], "polylines": [], "circles": [], "routes": {}},
+                "remove": sorted(gone)}
+
+    def snapshot(self):
+        """Full current payload (base layer + live assignments) for a fresh render."""
+        return copy.deepcopy(self.payload)
+
+
+class MapSessionStore:
+    """Bounded, TTL-expiring LRU of MapSession objects for one worker process."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl_s=SESSION_TTL_S):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, origin, stores_flat, payload, session_id=None):
+        session_id = session_id or uuid.uuid4().hex
+        session = MapSession(session_id, origin, stores_flat, payload)
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._expire()
+        return session
+
+    def get(self, session_id):
+        """Live session or LookupError (unknown or expired — the client should re-create it)."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise LookupError(f"Unknown or expired map session: {session_id}")
+            self._sessions.move_to_end(session_id)
+            session.touched_at = time.time()
+            return session
+
+    def drop(self, session_id):
+        """Forget a session; returns it, or None if it was already gone."""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def _expire(self):
+        now = time.time()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.touched_at > self.ttl_s]:
+            del self._sessions[sid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
@@ -0,0 +1,136 @@
+"""
+Multi-stop route batching.
+- group_orders(): bundle pending orders created within a time window whose
+  pickups and drop-offs are close together
+- plan_sequence(): order the stops of one bundle for one agent, every pickup
+  before its drop-off, minimizing total travel time (exact subset DP for small
+  bundles, cheapest insertion above that)
+
+Stop numbering used by plan_sequence(): 0 = agent start, 1..n = pickups,
+n+1..2n = drop-offs (drop-off of order k is n+k).
+"""
+
+import math
+
+import numpy as np
+
+from geo import haversine_one_to_many
+
+BATCH_WINDOW_S = 10 * 60
+PICKUP_RADIUS_M = 1500.0
+DROPOFF_RADIUS_M = 3000.0
+MAX_ORDERS_PER_BATCH = 4
+# bundles up to this size are sequenced exactly (2^(2n) * (2n)^2 work); kept
+# below MAX_ORDERS_PER_BATCH, so full bundles take the insertion heuristic
+MAX_EXACT_ORDERS = 3
+
+
+def group_orders(orders, window_s=BATCH_WINDOW_S, pickup_radius_m=PICKUP_RADIUS_M,
+                 dropoff_radius_m=DROPOFF_RADIUS_M, max_orders=MAX_ORDERS_PER_BATCH):
+    """
+    Greedy bundling. Orders are dicts with "store" and "origin" (lat, lon) and an
+    optional "created_at" (epoch seconds). The oldest open order seeds a bundle and
+    pulls in the nearest compatible orders (same window, pickup and drop-off within
+    the radii of the seed's) up to max_orders.
+    Returns a list of bundles, each a list of indices into orders.
+    """
+    if not orders:
+        return []
+    created = np.array([float(o.get("created_at") or 0.0) for o in orders])
+    stores = np.array([o["store"] for o in orders], dtype=np.float64)
+    drops = np.array([o["origin"] for o in orders], dtype=np.float64)
+    open_ = np.ones(len(orders), dtype=bool)
+    bundles = []
+    for seed in np.argsort(created, kind="stable"):
+        if not open_[seed]:
+            continue
+        open_[seed] = False
+        pickup_d = haversine_one_to_many(stores[seed], stores)
+        drop_d = haversine_one_to_many(drops[seed], drops)
+        ok = (open_
+              & (np.abs(created - created[seed]) <= window_s)
+              & (pickup_d <= pickup_radius_m)
+              & (drop_d <= dropoff_radius_m))
+        candidates = np.flatnonzero(ok)
+        candidates = candidates[np.argsort(pickup_d[candidates] + drop_d[candidates], kind="stable")]
+        members = [int(seed)] + [int(c) for c in candidates[:max_orders - 1]]
+        open_[members] = False
+        bundles.append(members)
+    return bundles
+
+
+def _sequence_exact(dur, n):
+    """Subset DP over stops with pickup-before-drop-off precedence."""
+    stops = 2 * n
+    full = (1 << stops) - 1
+    best = {}
+    parent = {}
+    for k in range(1, n + 1):
+        state = (1 << (k - 1), k)
+        best[state] = dur[0][k]
+        parent[state] = None
+    # every transition adds a bit, so increasing mask order is a valid processing order
+    for mask in range(1, full + 1):
+        for last in range(1, stops + 1):
+            cost = best.get((mask, last))
+            if cost is None:
+                continue
+            for nxt in range(1, stops + 1):
+                bit = 1 << (nxt - 1)
+                if mask & bit:
+                    continue
+                if nxt > n and not mask & (1 << (nxt - n - 1)):
+                    continue
+                state = (mask | bit, nxt)
+                c = cost + dur[last][nxt]
+                if c < best.get(state, math.inf):
+                    best[state] = c
+                    parent[state] = (mask, last)
+    last = min(range(n + 1, stops + 1), key=lambda j: best.get((full, j), math.inf))
+    total = best[(full, last)]
+    seq = []
+    state = (full, last)
+    while state is not None:
+        seq.append(state[1])
+        state = parent[state]
+    seq.reverse()
+    return seq, total
+
+
+def _path_cost(dur, seq):
+    prev, total = 0, 0.0
+    for s in seq:
+        total += dur[prev][s]
+        prev = s
+    return total
+
+
+def _sequence_insertion(dur, n):
+    """Cheapest insertion of (pickup, drop-off) pairs, nearest pickups first."""
+    seq = []
+    for k in sorted(range(1, n + 1), key=lambda k: dur[0][k]):
+        best = None
+        for i in range(len(seq) + 1):
+            with_pickup = seq[:i] + [k] + seq[i:]
+            for j in range(i + 1, len(with_pickup) + 1):
+                cand = with_pickup[:j] + [n + k] + with_pickup[j:]
+                c = _path_cost(dur, cand)
+                if best is None or c < best[1]:
+                    best = (cand, c)
+        seq = best[0]
+    return seq, _path_cost(dur, seq)
+
+
+def plan_sequence(dur, n_orders):
+    """
+    Best stop order for one agent and one bundle.
+    dur: (2n+1) x (2n+1) travel times between stops (see module docstring).
+    Returns (sequence of stop numbers, total_duration_s); the route is open (it
+    ends at the last drop-off).
+    """
+    if n_orders == 0:
+        return [], 0.0
+    dur = np.asarray(dur, dtype=np.float64).tolist()
+    if n_orders <= MAX_EXACT_ORDERS:
+        return _sequence_exact(dur, n_orders)
+    return _sequence_insertion(dur, n_orders)
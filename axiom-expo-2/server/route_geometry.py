@@ -0,0 +1,105 @@
+"""
+Route geometry helpers — Douglas-Peucker simplification and Google encoded
+polylines (precision 5 or 6) used as the transport format for route shapes.
+Coordinates are [lat, lon] pairs.
+"""
+
+import math
+
+import numpy as np
+
+METERS_PER_DEG_LAT = 111320.0
+
+
+def _project_m(coords):
+    """Local equirectangular projection to meters (fine at city scale)."""
+    arr = np.asarray(coords, dtype=np.float64)
+    lat0 = math.radians(float(arr[:, 0].mean()))
+    x = arr[:, 1] * METERS_PER_DEG_LAT * math.cos(lat0)
+    y = arr[:, 0] * METERS_PER_DEG_LAT
+    return np.column_stack([x, y])
+
+
+def simplify(coords, tolerance_m):
+    """
+    Douglas-Peucker simplification. Keeps the endpoints and every vertex that
+    deviates more than tolerance_m from the simplified line.
+    """
+    n = len(coords)
+    if n <= 2 or not tolerance_m or tolerance_m <= 0:
+        return [list(c) for c in coords]
+    pts = _project_m(coords)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, b = pts[i], pts[j]
+        seg = b - a
+        seg_len2 = float(seg @ seg)
+        mid = pts[i + 1:j]
+        if seg_len2 == 0.0:
+            d = np.hypot(*(mid - a).T)
+        else:
+            # distance to the segment (clamped projection), vectorized over the span
+            t = np.clip(((mid - a) @ seg) / seg_len2, 0.0, 1.0)
+            d = np.hypot(*(mid - (a + t[:, None] * seg)).T)
+        k = int(np.argmax(d))
+        if d[k] > tolerance_m:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return [list(coords[i]) for i in np.flatnonzero(keep)]
+
+
+def _encode_value(v, out):
+    v = ~(v << 1) if v < 0 else (v << 1)
+    while v >= 0x20:
+        out.append(chr((0x20 | (v & 0x1F)) + 63))
+        v >>= 5
+    out.append(chr(v + 63))
+
+
+def encode_polyline(coords, precision=5):
+    """Google encoded polyline for [[lat, lon], ...]."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        ilat = int(round(lat * factor))
+        ilon = int(round(lon * factor))
+        _encode_value(ilat - prev_lat, out)
+        _encode_value(ilon - prev_lon, out)
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def decode_polyline(encoded, precision=5):
+    """Inverse of encode_polyline -> [[lat, lon], ...]."""
+    factor = 10 ** precision
+    coords = []
+    index = lat = lon = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append([lat / factor, lon / factor])
+    return coords
+
+
+def pack_route(coords, tolerance_m, precision=5):
+    """Simplify then encode a route geometry for transport."""
+    return encode_polyline(simplify(coords, tolerance_m), precision)
@@ -0,0 +1,264 @@
+"""
+Routing backends behind get_osrm_route().
+- OSRMBackend: HTTP calls to an OSRM server (public demo server by default)
+- LocalGraphBackend: in-process A*/Dijkstra over a prepared road graph (.npz CSR
+  arrays, see build_road_graph.py), no network needed
+
+Pick one with ROUTING_BACKEND=osrm|local (and ROAD_GRAPH_PATH for local).
+"""
+
+import heapq
+import math
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+from geo import haversine_m
+from http_client import OutboundClient
+
+DEFAULT_OSRM_SERVER = "https://router.project-osrm.org"
+DEFAULT_ROAD_GRAPH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "road_graph.npz")
+
+# snapping grid cell size for the local graph (degrees, ~550 m)
+SNAP_CELL_DEG = 0.005
+# give up snapping a point further than this from any road node (meters)
+MAX_SNAP_DISTANCE_M = 2000.0
+
+# process-wide backends keyed by their configuration
+_BACKENDS = {}
+
+
+class RoadGraphError(Exception):
+    """The local road graph is missing or unreadable."""
+
+
+class RoutingBackend:
+    """Interface every routing engine implements. Points are (lat, lon)."""
+
+    name = "base"
+
+    def stats(self):
+        """Outbound-call counters, if the backend makes any."""
+        return None
+
+    def route(self, src, dst, profile="driving"):
+        """Returns (coords_list [[lat, lon], ...], distance_m, duration_s) or (None, None, None)."""
+        raise NotImplementedError
+
+    def table(self, sources, destinations, profile="driving"):
+        """Returns (durations_s, distances_m) as row-per-source lists (cells may be None), or (None, None)."""
+        raise NotImplementedError
+
+
+class OSRMBackend(RoutingBackend):
+    name = "osrm"
+
+    def __init__(self, server=DEFAULT_OSRM_SERVER, timeout=18):
+        self.server = server
+        # total budget per call, retries included
+        self.timeout = timeout
+        # pooled keep-alive client with retries and a circuit breaker, shared by the route-fetch threads
+        self.client = OutboundClient(f"osrm {server}")
+
+    def route(self, src, dst, profile="driving"):
+        coords_str = f"{src[1]},{src[0]};{dst[1]},{dst[0]}"
+        url = f"{self.server}/route/v1/{profile}/{coords_str}?overview=full&geometries=geojson"
+        j = self.client.get_json(url, self.timeout)
+        if not isinstance(j, dict) or j.get("code") != "Ok" or not j.get("routes"):
+            return None, None, None
+        try:
+            route = j["routes"][0]
+            geom = route["geometry"]["coordinates"]  # lon,lat
+            coords_latlon = [[c[1], c[0]] for c in geom]
+            return coords_latlon, route.get("distance"), route.get("duration")
+        except (KeyError, IndexError, TypeError):
+            return None, None, None
+
+    def table(self, sources, destinations, profile="driving"):
+        points = list(sources) + list(destinations)
+        coords_str = ";".join(f"{p[1]},{p[0]}" for p in points)
+        src_idx = ";".join(str(i) for i in range(len(sources)))
+        dst_idx = ";".join(str(len(sources) + j) for j in range(len(destinations)))
+        url = (f"{self.server}/table/v1/{profile}/{coords_str}"
+               f"?sources={src_idx}&destinations={dst_idx}&annotations=duration,distance")
+        j = self.client.get_json(url, self.timeout)
+        if not isinstance(j, dict) or j.get("code") != "Ok" or not j.get("durations"):
+            return None, None
+        return j["durations"], j.get("distances")
+
+    def stats(self):
+        return self.client.stats()
+
+
+class LocalGraphBackend(RoutingBackend):
+    """
+    Shortest-time routing over a directed road graph stored as CSR arrays:
+    node_lat, node_lon, indptr, indices, length_m, speed_mps.
+    """
+
+    name = "local"
+
+    def __init__(self, graph_path=DEFAULT_ROAD_GRAPH_PATH):
+        self.graph_path = graph_path
+        try:
+            with np.load(graph_path) as g:
+                self.node_lat = g["node_lat"].astype(np.float64)
+                self.node_lon = g["node_lon"].astype(np.float64)
+                indptr = g["indptr"]
+                indices = g["indices"]
+                length_m = g["length_m"].astype(np.float64)
+                speed = g["speed_mps"].astype(np.float64)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+            raise RoadGraphError(f"Could not load road graph {graph_path}: {e}") from e
+        # plain lists are much faster than numpy scalars in the search loop
+        self.indptr = indptr.tolist()
+        self.indices = indices.tolist()
+        self.length_m = length_m.tolist()
+        self.time_s = (length_m / speed).tolist()
+        self.lat = self.node_lat.tolist()
+        self.lon = self.node_lon.tolist()
+        self.max_speed = float(speed.max()) if len(speed) else 1.0
+        self._build_snap_grid()
+
+    def _build_snap_grid(self):
+        self._grid = {}
+        cells_lat = np.floor(self.node_lat / SNAP_CELL_DEG).astype(np.int64)
+        cells_lon = np.floor(self.node_lon / SNAP_CELL_DEG).astype(np.int64)
+        for node, cell in enumerate(zip(cells_lat.tolist(), cells_lon.tolist())):
+            self._grid.setdefault(cell, []).append(node)
+
+    def snap(self, point):
+        """Nearest graph node to (lat, lon), or None if nothing within MAX_SNAP_DISTANCE_M."""
+        clat = math.floor(point[0] / SNAP_CELL_DEG)
+        clon = math.floor(point[1] / SNAP_CELL_DEG)
+        max_ring = int(MAX_SNAP_DISTANCE_M / (SNAP_CELL_DEG * 111000.0)) + 1
+        best = None
+        for ring in range(max_ring + 1):
+            for dlat in range(-ring, ring + 1):
+                for dlon in range(-ring, ring + 1):
+                    if max(abs(dlat), abs(dlon)) != ring:
+                        continue
+                    for node in self._grid.get((clat + dlat, clon + dlon), ()):
+                        d = haversine_m(point, (self.lat[node], self.lon[node]))
+                        if best is None or d < best[1]:
+                            best = (node, d)
+            # anything in the next ring is at least `ring` cells away
+            if best is not None and best[1] <= ring * SNAP_CELL_DEG * 111000.0 * math.cos(math.radians(point[0])):
+                break
+        if best is None or best[1] > MAX_SNAP_DISTANCE_M:
+            return None
+        return best[0]
+
+    def _astar(self, s, t):
+        lat, lon = self.lat, self.lon
+        indptr, indices, time_s = self.indptr, self.indices, self.time_s
+        target = (lat[t], lon[t])
+        inv_speed = 1.0 / self.max_speed
+
+        def h(n):
+            return haversine_m((lat[n], lon[n]), target) * inv_speed
+
+        g = {s: 0.0}
+        parent = {s: -1}
+        heap = [(h(s), 0.0, s)]
+        closed = set()
+        while heap:
+            _, gu, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == t:
+                break
+            closed.add(u)
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                gv = gu + time_s[e]
+                if gv < g.get(v, math.inf):
+                    g[v] = gv
+                    parent[v] = (u, e)
+                    heapq.heappush(heap, (gv + h(v), gv, v))
+        if t not in g:
+            return None
+        path = [t]
+        dist = 0.0
+        n = t
+        while parent[n] != -1:
+            u, e = parent[n]
+            dist += self.length_m[e]
+            path.append(u)
+            n = u
+        path.reverse()
+        return path, dist, g[t]
+
+    def _dijkstra_many(self, s, targets):
+        """One-to-many shortest times from s; stops once every target is settled."""
+        indptr, indices, time_s, length_m = self.indptr, self.indices, self.time_s, self.length_m
+        remaining = set(targets)
+        best = {s: (0.0, 0.0)}
+        heap = [(0.0, 0.0, s)]
+        closed = set()
+        while heap and remaining:
+            tu, du, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            closed.add(u)
+            remaining.discard(u)
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                tv = tu + time_s[e]
+                if v not in best or tv < best[v][0]:
+                    best[v] = (tv, du + length_m[e])
+                    heapq.heappush(heap, (tv, du + length_m[e], v))
+        return best
+
+    def route(self, src, dst, profile="driving"):
+        s = self.snap(src)
+        t = self.snap(dst)
+        if s is None or t is None:
+            return None, None, None
+        found = self._astar(s, t)
+        if found is None:
+            return None, None, None
+        path, dist, dur = found
+        coords = [[src[0], src[1]]] + [[self.lat[n], self.lon[n]] for n in path] + [[dst[0], dst[1]]]
+        return coords, dist, dur
+
+    def table(self, sources, destinations, profile="driving"):
+        dst_nodes = [self.snap(d) for d in destinations]
+        targets = [n for n in dst_nodes if n is not None]
+        durations = []
+        distances = []
+        for src in sources:
+            s = self.snap(src)
+            reached = self._dijkstra_many(s, targets) if s is not None else {}
+            durations.append([reached[n][0] if n in reached else None for n in dst_nodes])
+            distances.append([reached[n][1] if n in reached else None for n in dst_nodes])
+        return durations, distances
+
+
+def get_routing_backend(kind=None, osrm_server=None, timeout=18, graph_path=None):
+    """
+    Process-wide routing backend. kind/osrm_server/graph_path default to the
+    ROUTING_BACKEND / OSRM_SERVER / ROAD_GRAPH_PATH environment variables.
+    Raises RoadGraphError if the local backend is selected but its graph can't
+    be loaded: quietly routing over the network instead would hide it.
+    """
+    kind = kind or os.environ.get("ROUTING_BACKEND", "osrm")
+    osrm_server = osrm_server or os.environ.get("OSRM_SERVER", DEFAULT_OSRM_SERVER)
+    graph_path = graph_path or os.environ.get("ROAD_GRAPH_PATH", DEFAULT_ROAD_GRAPH_PATH)
+    key = (kind, osrm_server, timeout, graph_path)
+    backend = _BACKENDS.get(key)
+    if backend is None:
+        if kind == "local":
+            try:
+                backend = LocalGraphBackend(graph_path)
+            except RoadGraphError as e:
+                sys.stderr.write(f"Error: ROUTING_BACKEND=local but {e}\n")
+                raise
+        elif kind == "osrm":
+            backend = OSRMBackend(osrm_server, timeout)
+        else:
+            raise ValueError(f"Unknown ROUTING_BACKEND: {kind}")
+        _BACKENDS[key] = backend
+    return backend
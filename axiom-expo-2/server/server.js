@@ -8,6 +8,7 @@ try {
   const path = require('path');
   const fs = require('fs');
   const { spawn } = require('child_process');
+  const crypto = require('crypto');
   const multer = require('multer');
 
   console.log('Dependencies loaded.');
@@ -233,6 +234,116 @@ try {
 
   console.log('Routes configured.');
 
+  // Helper: Pool of long-running Python workers speaking line-delimited JSON.
+  // Each worker is started once with `--serve`, keeps its imports/data warm and
+  // answers many requests; a request is routed to the least busy worker.
+  // A request that times out means its worker may be hung: that worker is
+  // killed, its other in-flight requests fail, and the slot is respawned on
+  // the next request (so pinned sessions don't stay stuck on it).
+  function createJsonLineWorkerPool(label, scriptPath, size, timeoutMs) {
+    const readline = require('readline');
+    const pythonPath = process.env.PYTHON_PATH || 'python';
+    const workers = [];
+    let nextId = 1;
+
+    function startWorker(slot) {
+      const proc = spawn(pythonPath, [scriptPath, '--serve'], { cwd: __dirname });
+      const worker = { proc, pending: new Map(), alive: true };
+
+      readline.createInterface({ input: proc.stdout }).on('line', (line) => {
+        let parsed;
+        try {
+          parsed = JSON.parse(line);
+        } catch (e) {
+          console.error(`[${label} worker ${slot}] bad output`, line);
+          return;
+        }
+        const entry = worker.pending.get(parsed.id);
+        if (!entry) return;
+        worker.pending.delete(parsed.id);
+        clearTimeout(entry.timer);
+        delete parsed.id;
+        entry.resolve(parsed);
+      });
+      proc.stderr.on('data', (d) => {
+        console.error(`[${label} worker ${slot} stderr]`, d.toString().trim());
+      });
+      proc.on('close', (code) => {
+        console.log(`[${label} worker ${slot} exit code]`, code);
+        failWorker(worker, new Error(`${label} worker exited with code ${code}`));
+      });
+      proc.on('error', (err) => {
+        console.error(`[${label} worker ${slot} error]`, err.message);
+      });
+      // writes to a worker that just died must not crash the server
+      proc.stdin.on('error', (err) => {
+        console.error(`[${label} worker ${slot} stdin error]`, err.message);
+      });
+
+      workers[slot] = worker;
+      return worker;
+    }
+
+    // Mark a worker dead and reject everything still waiting on it
+    function failWorker(worker, err) {
+      worker.alive = false;
+      worker.pending.forEach((entry) => {
+        clearTimeout(entry.timer);
+        entry.reject(err);
+      });
+      worker.pending.clear();
+    }
+
+    function pickWorker(affinityKey) {
+      if (affinityKey) {
+        // state kept inside a worker (e.g. map sessions) must always hit the same slot
+        let h = 0;
+        for (let i = 0; i < affinityKey.length; i++) h = (h * 31 + affinityKey.charCodeAt(i)) >>> 0;
+        const slot = h % size;
+        const w = workers[slot];
+        return w && w.alive ? w : startWorker(slot);
+      }
+      let best = null;
+      for (let i = 0; i < size; i++) {
+        let w = workers[i];
+        if (!w || !w.alive) w = startWorker(i);
+        if (!best || w.pending.size < best.pending.size) best = w;
+      }
+      return best;
+    }
+
+    function request(payload, affinityKey) {
+      return new Promise((resolve, reject) => {
+        const worker = pickWorker(affinityKey);
+        const id = nextId++;
+        const timer = setTimeout(() => {
+          const err = new Error(`${label} worker timed out after ${timeoutMs} ms`);
+          console.error(`[${label}] request ${id} timed out; restarting its worker`);
+          failWorker(worker, err);
+          worker.proc.kill('SIGKILL');
+        }, timeoutMs);
+        worker.pending.set(id, { resolve, reject, timer });
+        worker.proc.stdin.write(JSON.stringify({ ...payload, id }) + '\n');
+      });
+    }
+
+    return { request };
+  }
+
+  const deliveryMapPool = createJsonLineWorkerPool(
+    'DELIVERY_MAP',
+    path.join(__dirname, 'delivery_map.py'),
+    parseInt(process.env.DELIVERY_MAP_WORKERS || '2', 10),
+    120000
+  );
+
+  const janaushadhiPool = createJsonLineWorkerPool(
+    'JANAUSHADHI',
+    path.join(__dirname, 'janaushadhi_api.py'),
+    parseInt(process.env.JANAUSHADHI_WORKERS || '2', 10),
+    30000
+  );
+
   // Helper: Split array into N chunks as evenly as possible
   function chunkArray(arr, n) {
     if (n <= 0 || arr.length === 0) return [];
@@ -418,10 +529,7 @@ try {
         return res.status(400).json({ error: 'Origin coordinates (latitude, longitude) are required' });
       }
 
-      const pythonPath = process.env.PYTHON_PATH || 'python';
-      const scriptPath = path.join(__dirname, 'delivery_map.py');
-
-      // Prepare arguments for Python script
+      // Request body for the resident delivery-map worker
       const mapData = {
         origin: [origin.latitude, origin.longitude],
         green_stores: green_stores || [],
@@ -438,36 +546,211 @@ try {
         }
       }
 
-      const args = [
-        scriptPath,
-        JSON.stringify(mapData)
-      ];
+      // Streamed to a warm worker over stdin; no argv limits, no cold imports
+      const parsed = await deliveryMapPool.request(mapData);
+      if (parsed.error) {
+        return res.status(500).json({ error: 'Delivery map generation failed', details: parsed.error });
+      }
+      return res.status(200).json(parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Delivery map server error', details: String(err) });
+    }
+  });
 
-      const proc = spawn(pythonPath, args, { cwd: __dirname });
-      let stdoutData = '';
-      let stderrData = '';
+  // Orders for /dispatch and /dispatch/batched: [{ store: {latitude, longitude}, origin: {latitude, longitude}, ... }]
+  // Returns { orders } in worker format, or { error } describing the first bad entry.
+  function parseDispatchOrders(orders) {
+    if (!orders || !Array.isArray(orders) || orders.length === 0) {
+      return { error: 'orders array is required and cannot be empty' };
+    }
+    const toLatLon = (p) => (p && p.latitude && p.longitude ? [p.latitude, p.longitude] : null);
+    const parsed = [];
+    for (let i = 0; i < orders.length; i++) {
+      const o = orders[i];
+      const store = toLatLon(o.store);
+      const origin = toLatLon(o.origin);
+      if (!store || !origin) {
+        return { error: `orders[${i}] needs store and origin coordinates (latitude, longitude)` };
+      }
+      const item = { store, origin, order_id: o.order_id !== undefined ? o.order_id : i };
+      if (o.store_color) item.store_color = o.store_color;
+      if (o.shop_name) item.shop_name = o.shop_name;
+      if (o.created_at) item.created_at = o.created_at;
+      parsed.push(item);
+    }
+    return { orders: parsed };
+  }
 
-      proc.stdout.on('data', (d) => { stdoutData += d.toString(); });
-      proc.stderr.on('data', (d) => { stderrData += d.toString(); });
+  // Batch dispatch endpoint: accepts { orders, agent_indices? }
+  // Assigns all pending orders at once (minimum total agent -> store -> origin time).
+  app.post('/dispatch', async (req, res) => {
+    try {
+      const { orders, error } = parseDispatchOrders(req.body.orders);
+      if (error) return res.status(400).json({ error });
+      const payload = { op: 'dispatch', orders };
+      if (Array.isArray(req.body.agent_indices)) payload.agent_indices = req.body.agent_indices;
+      const parsed = await deliveryMapPool.request(payload);
+      if (parsed.error) {
+        return res.status(500).json({ error: 'Dispatch failed', details: parsed.error });
+      }
+      return res.status(200).json(parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Dispatch server error', details: String(err) });
+    }
+  });
 
-      await new Promise((resolve) => {
-        proc.on('close', () => resolve());
-      });
+  // Multi-stop batching endpoint: accepts { orders (optional created_at epoch seconds), agent_indices? }
+  // Bundles nearby orders and returns one pickup/drop-off route per agent with per-order billing.
+  app.post('/dispatch/batched', async (req, res) => {
+    try {
+      const { orders, error } = parseDispatchOrders(req.body.orders);
+      if (error) return res.status(400).json({ error });
+      const payload = { op: 'plan_batches', orders };
+      if (Array.isArray(req.body.agent_indices)) payload.agent_indices = req.body.agent_indices;
+      const parsed = await deliveryMapPool.request(payload);
+      if (parsed.error) {
+        return res.status(500).json({ error: 'Batch planning failed', details: parsed.error });
+      }
+      return res.status(200).json(parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Dispatch server error', details: String(err) });
+    }
+  });
 
-      if (stderrData) {
-        console.error('[DELIVERY_MAP stderr]', stderrData.trim());
+  // Live agent store (positions, status, current job), shared by the delivery-map workers via agents.db
+  app.get('/agents', async (req, res) => {
+    try {
+      const payload = { op: 'agents' };
+      if (req.query.status) payload.status = req.query.status;
+      const parsed = await deliveryMapPool.request(payload);
+      if (parsed.error) return res.status(500).json({ error: 'Agent lookup failed', details: parsed.error });
+      return res.status(200).json(parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Agent server error', details: String(err) });
+    }
+  });
+
+  // Accepts { updates: [{ agent_id, latitude, longitude }] }; buffered in memory, written to the DB in batches
+  app.post('/agents/positions', async (req, res) => {
+    try {
+      const { updates } = req.body;
+      if (!updates || !Array.isArray(updates) || updates.length === 0) {
+        return res.status(400).json({ error: 'updates array is required and cannot be empty' });
+      }
+      const parsedUpdates = [];
+      for (let i = 0; i < updates.length; i++) {
+        const u = updates[i];
+        if (u.agent_id === undefined || u.latitude === undefined || u.longitude === undefined) {
+          return res.status(400).json({ error: `updates[${i}] needs agent_id, latitude and longitude` });
+        }
+        parsedUpdates.push({ agent_id: u.agent_id, lat: u.latitude, lon: u.longitude });
       }
+      const parsed = await deliveryMapPool.request({ op: 'agent_positions', updates: parsedUpdates });
+      if (parsed.error) return res.status(500).json({ error: 'Position update failed', details: parsed.error });
+      return res.status(200).json(parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Agent server error', details: String(err) });
+    }
+  });
 
-      try {
-        const parsed = JSON.parse(stdoutData);
-        return res.status(200).json(parsed);
-      } catch (e) {
-        return res.status(500).json({
-          error: 'Failed to parse delivery map output',
-          stderr: stderrData,
-          raw: stdoutData
-        });
+  // Accepts { status: 'free' | 'busy' | 'offline', job? }, e.g. status 'free' when a delivery completes
+  app.post('/agents/:agentId/status', async (req, res) => {
+    try {
+      const agentId = parseInt(req.params.agentId, 10);
+      const { status, job } = req.body;
+      if (Number.isNaN(agentId) || !status) {
+        return res.status(400).json({ error: 'agent id and status are required' });
+      }
+      const parsed = await deliveryMapPool.request({ op: 'agent_status', agent_id: agentId, status, job: job || null });
+      if (parsed.error) return res.status(500).json({ error: 'Status update failed', details: parsed.error });
+      return res.status(200).json(parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Agent server error', details: String(err) });
+    }
+  });
+
+  // Delivery map sessions: render the base layer once, then send only patches
+  // (window.applyMapPatch in the map shell) as assignments are added or removed.
+  // A session lives in one delivery-map worker; requests are pinned by session id.
+  function sendSessionResult(res, parsed) {
+    if (parsed.error) {
+      const gone = /Unknown or expired map session/.test(parsed.error);
+      return res.status(gone ? 404 : 500).json({ error: 'Delivery map session request failed', details: parsed.error });
+    }
+    return res.status(200).json(parsed);
+  }
+
+  app.post('/delivery-map/session', async (req, res) => {
+    try {
+      const { origin, green_stores, yellow_stores, red_stores } = req.body;
+      if (!origin || !origin.latitude || !origin.longitude) {
+        return res.status(400).json({ error: 'Origin coordinates (latitude, longitude) are required' });
       }
+      const sessionId = crypto.randomBytes(12).toString('hex');
+      const parsed = await deliveryMapPool.request({
+        op: 'session_create',
+        session_id: sessionId,
+        origin: [origin.latitude, origin.longitude],
+        green_stores: green_stores || [],
+        yellow_stores: yellow_stores || [],
+        red_stores: red_stores || []
+      }, sessionId);
+      return sendSessionResult(res, parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Delivery map server error', details: String(err) });
+    }
+  });
+
+  app.get('/delivery-map/session/:sessionId', async (req, res) => {
+    try {
+      const { sessionId } = req.params;
+      const parsed = await deliveryMapPool.request({ op: 'session_map', session_id: sessionId }, sessionId);
+      return sendSessionResult(res, parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Delivery map server error', details: String(err) });
+    }
+  });
+
+  app.post('/delivery-map/session/:sessionId/assignments', async (req, res) => {
+    try {
+      const { sessionId } = req.params;
+      const { best_store, agent_idx, store_color } = req.body;
+      if (!best_store || !best_store.latitude || !best_store.longitude) {
+        return res.status(400).json({ error: 'best_store coordinates (latitude, longitude) are required' });
+      }
+      const payload = {
+        op: 'session_assign',
+        session_id: sessionId,
+        best_store: [best_store.latitude, best_store.longitude]
+      };
+      if (agent_idx !== undefined && agent_idx !== null) payload.agent_idx = agent_idx;
+      if (store_color) payload.store_color = store_color;
+      const parsed = await deliveryMapPool.request(payload, sessionId);
+      return sendSessionResult(res, parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Delivery map server error', details: String(err) });
+    }
+  });
+
+  app.delete('/delivery-map/session/:sessionId/assignments/:assignmentId', async (req, res) => {
+    try {
+      const { sessionId, assignmentId } = req.params;
+      const parsed = await deliveryMapPool.request({
+        op: 'session_unassign',
+        session_id: sessionId,
+        assignment_id: assignmentId
+      }, sessionId);
+      return sendSessionResult(res, parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Delivery map server error', details: String(err) });
+    }
+  });
+
+  app.delete('/delivery-map/session/:sessionId', async (req, res) => {
+    try {
+      const { sessionId } = req.params;
+      const parsed = await deliveryMapPool.request({ op: 'session_close', session_id: sessionId }, sessionId);
+      return sendSessionResult(res, parsed);
     } catch (err) {
       return res.status(500).json({ error: 'Delivery map server error', details: String(err) });
     }
@@ -483,43 +766,19 @@ try {
         return res.status(400).json({ error: 'medicine_names array is required and cannot be empty' });
       }
 
-      const pythonPath = process.env.PYTHON_PATH || 'python';
-      const scriptPath = path.join(__dirname, 'janaushadhi_api.py');
-
-      // Prepare arguments for Python script
-      const args = [
-        scriptPath,
-        JSON.stringify(medicine_names)
-      ];
-
-      const proc = spawn(pythonPath, args, { cwd: __dirname });
-      let stdoutData = '';
-      let stderrData = '';
-
-      proc.stdout.on('data', (d) => { stdoutData += d.toString(); });
-      proc.stderr.on('data', (d) => { stderrData += d.toString(); });
-
-      await new Promise((resolve) => {
-        proc.on('close', (code) => {
-          console.log('[JANAUSHADHI exit code]', code);
-          resolve();
-        });
-      });
-
-      if (stderrData) {
-        console.error('[JANAUSHADHI stderr]', stderrData.trim());
-      }
+      // Served by a warm worker; no per-request interpreter/pandas/CSV startup
+      const parsed = await janaushadhiPool.request({ medicine_names });
+      return res.status(200).json(parsed);
+    } catch (err) {
+      return res.status(500).json({ error: 'Jan Aushadhi lookup server error', details: String(err) });
+    }
+  });
 
-      try {
-        const parsed = JSON.parse(stdoutData);
-        return res.status(200).json(parsed);
-      } catch (e) {
-        return res.status(500).json({
-          error: 'Failed to parse Jan Aushadhi lookup output',
-          stderr: stderrData,
-          raw: stdoutData
-        });
-      }
+  // Lookup-cache counters of one warm worker (the disk level is shared by all)
+  app.get('/janaushadhi-lookup/cache-stats', async (req, res) => {
+    try {
+      const parsed = await janaushadhiPool.request({ op: 'cache_stats' });
+      return res.status(200).json(parsed.cache || parsed);
     } catch (err) {
       return res.status(500).json({ error: 'Jan Aushadhi lookup server error', details: String(err) });
     }
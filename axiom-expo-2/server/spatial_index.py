@@ -0,0 +1,169 @@
+"""
+Grid spatial index over (lat, lon) points.
+Points are bucketed into fixed-size lat/lon cells once at load, so radius,
+k-nearest and bounding-box queries only visit the cells around the query
+instead of scanning every shop/clinic/agent.
+"""
+
+import math
+
+from geo import haversine_m
+
+METERS_PER_DEG_LAT = 111320.0
+
+
+class SpatialIndex:
+    """
+    Mutable grid index. Each entry has an id, a (lat, lon) and an optional payload
+    (e.g. the shop dict). Query results are (item_id, payload, distance_m) tuples.
+    """
+
+    def __init__(self, cell_m=500.0):
+        self.cell_deg = cell_m / METERS_PER_DEG_LAT
+        self._cells = {}
+        self._points = {}   # item_id -> (lat, lon)
+        self._payloads = {}  # item_id -> payload
+        # cell-range ever occupied; only grows, so it's a safe search bound
+        self._bounds = None
+
+    @classmethod
+    def from_items(cls, items, key="latlon", id_key=None, cell_m=500.0):
+        """Build from a list of dicts; ids default to list positions."""
+        index = cls(cell_m)
+        for i, item in enumerate(items):
+            index.insert(item[id_key] if id_key else i, item[key], item)
+        return index
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, point):
+        return (math.floor(point[0] / self.cell_deg), math.floor(point[1] / self.cell_deg))
+
+    def _add_to_cell(self, cell, item_id):
+        self._cells.setdefault(cell, set()).add(item_id)
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            b = self._bounds
+            b[0] = min(b[0], cell[0]); b[1] = min(b[1], cell[1])
+            b[2] = max(b[2], cell[0]); b[3] = max(b[3], cell[1])
+
+    # ---------- mutation ----------
+    def insert(self, item_id, point, payload=None):
+        if item_id in self._points:
+            self.remove(item_id)
+        point = (float(point[0]), float(point[1]))
+        self._points[item_id] = point
+        self._payloads[item_id] = payload
+        self._add_to_cell(self._cell(point), item_id)
+
+    def move(self, item_id, point):
+        """Update an entry's position; only touches the grid if it changed cell."""
+        old = self._points[item_id]
+        point = (float(point[0]), float(point[1]))
+        old_cell, new_cell = self._cell(old), self._cell(point)
+        if old_cell != new_cell:
+            bucket = self._cells[old_cell]
+            bucket.discard(item_id)
+            if not bucket:
+                del self._cells[old_cell]
+            self._add_to_cell(new_cell, item_id)
+        self._points[item_id] = point
+
+    def remove(self, item_id):
+        point = self._points.pop(item_id)
+        self._payloads.pop(item_id, None)
+        cell = self._cell(point)
+        bucket = self._cells[cell]
+        bucket.discard(item_id)
+        if not bucket:
+            del self._cells[cell]
+
+    def position(self, item_id):
+        return self._points.get(item_id)
+
+    # ---------- queries ----------
+    def _ring(self, center, ring):
+        clat, clon = center
+        if ring == 0:
+            yield from self._cells.get(center, ())
+            return
+        # only the ring's perimeter: top and bottom rows, then the side columns between them
+        for dlon in range(-ring, ring + 1):
+            yield from self._cells.get((clat - ring, clon + dlon), ())
+            yield from self._cells.get((clat + ring, clon + dlon), ())
+        for dlat in range(-ring + 1, ring):
+            yield from self._cells.get((clat + dlat, clon - ring), ())
+            yield from self._cells.get((clat + dlat, clon + ring), ())
+
+    def _ring_clearance_m(self, point, ring):
+        """Lower bound on the distance from point to anything outside the first `ring` rings."""
+        lat_m = self.cell_deg * METERS_PER_DEG_LAT
+        lon_m = lat_m * max(math.cos(math.radians(abs(point[0]) + self.cell_deg * (ring + 1))), 1e-6)
+        return ring * min(lat_m, lon_m)
+
+    def within_radius(self, point, radius_m, predicate=None):
+        """All entries within radius_m of point, nearest first."""
+        lat_cells = int(math.ceil(radius_m / (self.cell_deg * METERS_PER_DEG_LAT)))
+        cos_lat = max(math.cos(math.radians(min(abs(point[0]) + radius_m / METERS_PER_DEG_LAT, 89.9))), 1e-6)
+        lon_cells = int(math.ceil(radius_m / (self.cell_deg * METERS_PER_DEG_LAT * cos_lat)))
+        clat, clon = self._cell(point)
+        out = []
+        for dlat in range(-lat_cells, lat_cells + 1):
+            for dlon in range(-lon_cells, lon_cells + 1):
+                for item_id in self._cells.get((clat + dlat, clon + dlon), ()):
+                    d = haversine_m(point, self._points[item_id])
+                    if d <= radius_m and (predicate is None or predicate(item_id, self._payloads[item_id])):
+                        out.append((item_id, self._payloads[item_id], d))
+        out.sort(key=lambda r: r[2])
+        return out
+
+    def nearest(self, point, k=1, max_radius_m=None, predicate=None):
+        """Up to k nearest entries (optionally filtered / radius-bounded), nearest first."""
+        if not self._points or k <= 0:
+            return []
+        center = self._cell(point)
+        # furthest ring that can contain anything
+        b = self._bounds
+        max_ring = max(abs(b[0] - center[0]), abs(b[2] - center[0]), abs(b[1] - center[1]), abs(b[3] - center[1]))
+        found = []
+
+        def consider(item_ids):
+            for item_id in item_ids:
+                if predicate is not None and not predicate(item_id, self._payloads[item_id]):
+                    continue
+                d = haversine_m(point, self._points[item_id])
+                if max_radius_m is None or d <= max_radius_m:
+                    found.append((item_id, self._payloads[item_id], d))
+
+        for ring in range(max_ring + 1):
+            if (2 * ring + 1) ** 2 > len(self._cells):
+                # this ring alone has more cells than are occupied: scan the occupied ones left instead
+                consider(item_id for cell, bucket in self._cells.items()
+                         if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= ring
+                         for item_id in bucket)
+                found.sort(key=lambda r: r[2])
+                return found[:k]
+            consider(self._ring(center, ring))
+            found.sort(key=lambda r: r[2])
+            found = found[:k]
+            clearance = self._ring_clearance_m(point, ring)
+            if len(found) == k and found[-1][2] <= clearance:
+                break
+            if max_radius_m is not None and clearance > max_radius_m:
+                break
+        return found
+
+    def in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """All entries inside the bounding box (unordered)."""
+        lo = self._cell((min_lat, min_lon))
+        hi = self._cell((max_lat, max_lon))
+        out = []
+        for clat in range(lo[0], hi[0] + 1):
+            for clon in range(lo[1], hi[1] + 1):
+                for item_id in self._cells.get((clat, clon), ()):
+                    lat, lon = self._points[item_id]
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        out.append((item_id, self._payloads[item_id]))
+        return out
@@ -0,0 +1,88 @@
+"""
+Small persistent key/value cache on SQLite.
+Values are stored as JSON, entries expire after a TTL and the table is kept
+under a size bound by evicting the least recently used rows.
+Safe to share between threads of one process and between processes.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    def __init__(self, path, table="cache", ttl_s=7 * 24 * 3600, max_entries=5000):
+        self.path = path
+        self.table = table
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_lru ON {table}(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached value or None (missing or expired)."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_s is not None and now - row[1] > self.ttl_s):
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, separators=(",", ":")), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            (size,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": size,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# server modules are flat scripts; keep tests off the tracked axiom.db and the on-disk caches
+_TMP = tempfile.mkdtemp(prefix="axiom-tests-")
+os.environ.setdefault("LOOKUP_CACHE_PATH", "")
+os.environ.setdefault("ROUTE_CACHE_PATH", "")
+os.environ.setdefault("AXIOM_DB_PATH", os.path.join(_TMP, "axiom.db"))
+os.environ.setdefault("AGENT_DB_PATH", os.path.join(_TMP, "agents.db"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,83 @@
+import time
+
+from agent_store import STATUS_BUSY, AgentStore
+
+COORDS = [(12.91, 77.51), (12.92, 77.52), (12.93, 77.50)]
+PROFILES = [{"name": f"Agent {i}", "phone": "NA", "vehicle": "NA"} for i in range(len(COORDS))]
+
+
+def test_sync_sees_flushed_positions_older_than_its_watermark(tmp_path):
+    db = str(tmp_path / "agents.db")
+    a = AgentStore(db)
+    a.seed(COORDS, PROFILES)
+    b = AgentStore(db)
+
+    # a position report stamped before b's last pulled change
+    old_ts = time.time() - 60
+    b.set_status(1, STATUS_BUSY, {"job": 1})
+    a.sync()
+    a.update_position(0, (12.95, 77.55), ts=old_ts)
+    a.flush()
+
+    assert b.sync() >= 1
+    assert b.get(0)["latlon"] == (12.95, 77.55)
+    assert a.get(1)["status"] == STATUS_BUSY
+
+
+def test_status_written_through(tmp_path):
+    db = str(tmp_path / "agents.db")
+    a = AgentStore(db)
+    a.seed(COORDS, PROFILES)
+    b = AgentStore(db)
+    a.assign(2, {"job": "x"})
+    b.sync()
+    assert b.get(2)["status"] == STATUS_BUSY
+    assert b.nearest_free(COORDS[2], k=3)[0][0] != 2
+
+
+def test_assignment_lease_expires(tmp_path):
+    store = AgentStore(str(tmp_path / "agents.db"))
+    store.seed(COORDS, PROFILES)
+    store.assign(0, {"job": "short"}, lease_s=60)
+    store.assign(1, {"job": "long"}, lease_s=3600)
+    assert store.expire_leases() == []
+    assert store.expire_leases(now=time.time() + 120) == [0]
+    assert store.get(0)["status"] == "free" and store.get(0)["job"] is None
+    assert store.get(1)["status"] == STATUS_BUSY
+
+
+def test_assign_is_compare_and_set_across_stores(tmp_path):
+    db = str(tmp_path / "agents.db")
+    a = AgentStore(db)
+    a.seed(COORDS, PROFILES)
+    b = AgentStore(db)
+    # both copies still see agent 0 as free; only the first assign wins
+    assert a.assign(0, {"job": "a"})
+    assert b.get(0)["status"] == "free"
+    assert not b.assign(0, {"job": "b"})
+    assert b.get(0)["status"] == STATUS_BUSY and b.get(0)["job"]["job"] == "a"
+    a.sync()
+    assert a.get(0)["job"]["job"] == "a"
+
+
+def test_expired_lease_does_not_free_a_reassigned_agent(tmp_path):
+    db = str(tmp_path / "agents.db")
+    a = AgentStore(db)
+    a.seed(COORDS, PROFILES)
+    b = AgentStore(db)
+    assert a.assign(0, {"job": "old"}, lease_s=60)
+    b.sync()
+    a.release(0)
+    assert a.assign(0, {"job": "new"}, lease_s=3600)
+    # b's copy still holds the old, short lease
+    assert b.expire_leases(now=time.time() + 120) == []
+    assert b.get(0)["job"]["job"] == "new"
+
+
+def test_nearest_free_far_away_with_large_k(tmp_path):
+    store = AgentStore(str(tmp_path / "agents.db"))
+    store.seed(COORDS, PROFILES)
+    start = time.perf_counter()
+    assert len(store.nearest_free((20.0, 77.5), k=20)) == len(COORDS)
+    assert store.nearest_free((20.0, 77.5), k=20, max_radius_m=25000.0) == []
+    assert time.perf_counter() - start < 0.5
@@ -0,0 +1,47 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from dispatch import greedy_assignment, hungarian, solve_assignment
+
+
+def brute_force_cost(cost):
+    n, m = cost.shape
+    if n <= m:
+        return min(sum(cost[i, cols[i]] for i in range(n)) for cols in itertools.permutations(range(m), n))
+    return min(sum(cost[rows[j], j] for j in range(m)) for rows in itertools.permutations(range(n), m))
+
+
+def total(cost, pairs):
+    return sum(cost[r, c] for r, c in pairs)
+
+
+def check_matching(cost, pairs):
+    rows = [r for r, _ in pairs]
+    cols = [c for _, c in pairs]
+    assert len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+    assert len(pairs) == min(cost.shape)
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (3, 3), (4, 6), (6, 4), (5, 5), (2, 7)])
+@pytest.mark.parametrize("seed", range(5))
+def test_hungarian_matches_brute_force(shape, seed):
+    cost = np.random.default_rng(seed).integers(0, 100, size=shape).astype(float)
+    pairs = hungarian(cost)
+    check_matching(cost, pairs)
+    assert total(cost, pairs) == pytest.approx(brute_force_cost(cost))
+
+
+def test_greedy_is_a_valid_matching_and_no_better_than_exact():
+    cost = np.random.default_rng(9).uniform(0, 1000, size=(6, 8))
+    pairs = greedy_assignment(cost)
+    check_matching(cost, pairs)
+    assert total(cost, pairs) >= brute_force_cost(cost) - 1e-9
+
+
+def test_solve_assignment_switches_to_greedy_above_limit():
+    cost = np.random.default_rng(1).uniform(0, 10, size=(4, 5))
+    assert solve_assignment(cost) == hungarian(cost)
+    assert solve_assignment(cost, max_exact=3) == greedy_assignment(cost)
+    assert solve_assignment(np.zeros((0, 0))) == []
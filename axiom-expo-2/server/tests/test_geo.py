@@ -0,0 +1,38 @@
+import random
+
+import numpy as np
+import pytest
+
+from geo import (
+    compute_billing_from_meters, compute_bounds, haversine_m, haversine_matrix, haversine_one_to_many,
+    haversine_pairwise
+)
+
+rng = random.Random(3)
+POINTS = [(12.9 + rng.uniform(-0.2, 0.2), 77.5 + rng.uniform(-0.2, 0.2)) for _ in range(20)]
+
+
+def test_known_distance():
+    # one degree of latitude on the haversine sphere
+    assert haversine_m((0.0, 0.0), (1.0, 0.0)) == pytest.approx(111195.0, rel=1e-4)
+    assert haversine_m(POINTS[0], POINTS[0]) == 0.0
+
+
+def test_vectorized_forms_match_scalar():
+    expected = np.array([[haversine_m(a, b) for b in POINTS] for a in POINTS[:5]])
+    assert haversine_matrix(POINTS[:5], POINTS) == pytest.approx(expected)
+    assert haversine_one_to_many(POINTS[0], POINTS) == pytest.approx(expected[0])
+    assert haversine_pairwise(POINTS[:5], POINTS[5:10]) == pytest.approx([expected[i][5 + i] for i in range(5)])
+
+
+def test_bounds():
+    assert compute_bounds([]) is None
+    assert compute_bounds([None, (1.0, 5.0), (3.0, 2.0)]) == [[1.0, 2.0], [3.0, 5.0]]
+
+
+def test_billing_scalar_and_array_agree():
+    distances = [0.0, 4999.0, 5000.0, 5001.0, 10000.0, 10001.0, 25000.0]
+    scalar = [compute_billing_from_meters(d) for d in distances]
+    assert scalar == [20, 20, 20, 30, 30, 50, 50]
+    assert list(compute_billing_from_meters(np.array(distances))) == scalar
+    assert compute_billing_from_meters(None) is None
@@ -0,0 +1,65 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from http_client import BREAKER_CLOSED, BREAKER_OPEN, CircuitBreaker, OutboundClient
+
+
+@pytest.fixture
+def upstream():
+    """Local HTTP server answering with the status queued in .statuses (last one repeats)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status = server.statuses.pop(0) if len(server.statuses) > 1 else server.statuses[0]
+            server.hits += 1
+            body = json.dumps({"code": "Ok" if status < 400 else "Error"}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    server.statuses = [200]
+    server.hits = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_port}/route"
+    yield server
+    server.shutdown()
+
+
+def client(threshold=3):
+    return OutboundClient("test", breaker=CircuitBreaker(failure_threshold=threshold, cooldown_s=60))
+
+
+def test_ok_and_4xx_return_body(upstream):
+    c = client()
+    assert c.get_json(upstream.url, 5) == {"code": "Ok"}
+    upstream.statuses = [400]
+    assert c.get_json(upstream.url, 5) == {"code": "Error"}
+    assert c.breaker.state == BREAKER_CLOSED
+
+
+def test_500_counts_against_breaker(upstream):
+    upstream.statuses = [500]
+    c = client(threshold=3)
+    for _ in range(3):
+        assert c.get_json(upstream.url, 5) is None
+    assert c.breaker.state == BREAKER_OPEN
+    # not retried, and short-circuited once open
+    assert upstream.hits == 3
+    assert c.get_json(upstream.url, 5) is None
+    assert upstream.hits == 3
+
+
+def test_transient_status_is_retried(upstream):
+    upstream.statuses = [502, 200]
+    c = client()
+    assert c.get_json(upstream.url, 5) == {"code": "Ok"}
+    assert c.stats()["retries"] == 1
+    assert c.breaker.failures == 0
@@ -0,0 +1,30 @@
+import io
+import json
+
+from janaushadhi_api import iter_prescriptions, run_batch
+
+
+def test_unreadable_records_are_skipped(tmp_path, capsys):
+    jsonl = tmp_path / "batch.jsonl"
+    jsonl.write_text('{"id": "a", "medicine_names": ["Dolo 650"]}\n{"id": "b", "medicine_na\n["Pan D"]\n')
+    ocr = tmp_path / "ocr_results"
+    ocr.mkdir()
+    (ocr / "1.json").write_text('{"medicines": ["Telma 40"]}')
+    (ocr / "2.json").write_text('{"medicines": [')
+    (ocr / "3.json").write_bytes(b'\xff\xfe{"medicines": []}')
+    (ocr / "4.json").write_text('["Augmentin"]')
+
+    errors = []
+    got = list(iter_prescriptions([str(jsonl), str(ocr), str(tmp_path / "missing.json")], errors=errors))
+    assert got == [("a", ["Dolo 650"]), (f"{jsonl}:3", ["Pan D"]),
+                   (str(ocr / "1.json"), ["Telma 40"]), (str(ocr / "4.json"), ["Augmentin"])]
+    assert [e["id"] for e in errors] == [f"{jsonl}:2", str(ocr / "2.json"), str(ocr / "3.json"),
+                                         str(tmp_path / "missing.json")]
+    assert "Warning: skipping" in capsys.readouterr().err
+
+
+def test_run_batch_finishes_past_a_truncated_line():
+    stdin = io.StringIO('["Dolo 650"]\n{"id": 2, "medicine_names": ["Pan\n["Pan D"]\n')
+    stdout = io.StringIO()
+    assert run_batch([], stdin=stdin, stdout=stdout) == 2
+    assert [json.loads(line)["id"] for line in stdout.getvalue().splitlines()] == ["stdin:1", "stdin:3"]
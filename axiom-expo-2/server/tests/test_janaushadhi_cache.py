@@ -0,0 +1,45 @@
+import pytest
+
+import janaushadhi_cache
+from axiom_core import CATALOG_CSV_PATH
+from janaushadhi_cache import LookupCache, catalog_namespace, query_key
+from janaushadhi_index import load_catalog_index
+from janaushadhi_ingredients import ingredient_index_for
+from janaushadhi_lookup import resolve_medicine
+
+FINGERPRINT = {"sha1": "abc", "mtime_ns": 1, "size": 2}
+
+
+def test_namespace_carries_resolver_version(monkeypatch):
+    before = catalog_namespace(FINGERPRINT)
+    monkeypatch.setattr(janaushadhi_cache, "RESOLVER_VERSION", janaushadhi_cache.RESOLVER_VERSION + 1)
+    assert catalog_namespace(FINGERPRINT) != before
+
+
+def test_disk_level_ignores_results_of_an_older_resolver(tmp_path, monkeypatch):
+    disk = str(tmp_path / "lookup.db")
+    LookupCache(FINGERPRINT, disk).get_or_compute("Dolo 650", lambda m: {"matched_name": "old"})
+    monkeypatch.setattr(janaushadhi_cache, "RESOLVER_VERSION", janaushadhi_cache.RESOLVER_VERSION + 1)
+    cache = LookupCache(FINGERPRINT, disk)
+    assert cache.get_or_compute("dolo 650", lambda m: {"matched_name": "new"}) == {"matched_name": "new"}
+    assert cache.computed == 1
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Amoxycillin 125mg/5ml", "Amoxycillin 125mg 5ml"),
+    ("Ibuprofen 100mg/5ml", "Ibuprofen 100mg 5ml"),
+    ("Glimepiride 0.5mg", "Glimepiride 0 5mg"),
+])
+def test_spellings_the_resolver_tells_apart_get_their_own_entries(first, second):
+    catalog = load_catalog_index(CATALOG_CSV_PATH)
+    ingredients = ingredient_index_for(catalog)
+    direct = [resolve_medicine(catalog, ingredients, q) for q in (first, second)]
+    assert direct[0]["matched_name"] != direct[1]["matched_name"]
+    cache = LookupCache(FINGERPRINT, disk_path="")
+    for q, expected in zip((first, second), direct):
+        assert cache.get_or_compute(q, lambda m: resolve_medicine(catalog, ingredients, m)) == expected
+    assert cache.computed == 2
+
+
+def test_case_and_spacing_share_an_entry():
+    assert query_key("  Dolo   650 ") == query_key("dolo 650")
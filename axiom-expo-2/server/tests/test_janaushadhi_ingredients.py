@@ -0,0 +1,89 @@
+import pytest
+
+from axiom_core import CATALOG_CSV_PATH
+from janaushadhi_index import load_catalog_index
+from janaushadhi_ingredients import ingredient_index_for, parse_composition
+from janaushadhi_lookup import resolve_medicine
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return load_catalog_index(CATALOG_CSV_PATH)
+
+
+@pytest.fixture(scope="module")
+def ingredients(catalog):
+    return ingredient_index_for(catalog)
+
+
+def names(catalog, rows):
+    return [catalog.names[r] for r in rows]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Augmentin 625", "Amoxycillin 500mg and Potassium Clavulanate 125mg Tablets IP"),
+    ("Augmentin", "Amoxycillin 500mg and Potassium Clavulanate 125mg Tablets IP"),
+    ("Augmentin 1000", "Amoxycillin 875mg and Potassium Clavulanate 125mg Tablets IP"),
+    ("Augmentin 375", "Amoxycillin 250mg and Potassium Clavulanate 125mg Tablets IP"),
+    ("Pan D", "Pantoprazole 40mg (Gastro-resistant) and Domperidone 30mg (Prolonged Release) Capsules IP"),
+    ("Pan-D 20", "Pantoprazole 20mg (Gastro-resistant) and Domperidone 10mg (Prolonged Release) Capsules IP"),
+    ("Dolo 650", "Paracetamol Tablets IP 650 mg"),
+    ("Telma 40", "Telmisartan Tablets IP 40mg"),
+])
+def test_brand_resolves_to_its_strength(catalog, ingredients, query, expected):
+    rows, strength_match = ingredients.match(query)
+    assert strength_match is True
+    assert names(catalog, rows)[0] == expected
+
+
+def test_rows_share_one_strength_and_form(ingredients):
+    for query in ["Paracetamol", "Augmentin", "Pan D", "Glycomet 500", "Pantoprazole"]:
+        rows, _ = ingredients.match(query)
+        assert rows
+        assert len({(tuple(s for _, s in ingredients.compositions[r]), ingredients.forms[r]) for r in rows}) == 1
+
+
+def test_no_strength_is_unspecified(ingredients):
+    rows, strength_match = ingredients.match("Paracetamol")
+    assert rows and strength_match is None
+
+
+def test_other_strength_is_flagged_not_substituted(catalog, ingredients):
+    rows, strength_match = ingredients.match("Telma 60")
+    assert rows and strength_match is False
+    assert ingredients.resolve("Telma 60") == []
+
+    result = resolve_medicine(catalog, ingredients, "Telma 60")
+    assert result["strength_match"] is False
+    assert result["equivalents"] == 0
+    assert "60" not in result["matched_name"]
+
+
+def test_lookup_reports_strength_match(catalog, ingredients):
+    result = resolve_medicine(catalog, ingredients, "Augmentin 625")
+    assert result["matched_name"] == "Amoxycillin 500mg and Potassium Clavulanate 125mg Tablets IP"
+    assert result["strength_match"] is True
+    assert result["equivalents"] >= 1
+
+
+def test_parse_composition():
+    assert parse_composition("Pantoprazole 40mg (Gastro-resistant) and Domperidone 30mg (Prolonged Release) Capsules IP") \
+        == ([("pantoprazole", "40mg"), ("domperidone", "30mg")], "capsule")
+    assert parse_composition("Faropenem (200mg) + Clavulanic Acid (125mg) Tablets")[0] \
+        == [("faropenem", "200mg"), ("clavulanic acid", "125mg")]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Metformin 0.5g", "Metformin Hydrochloride Tablets IP 500mg"),
+    ("Glimepiride 500mcg", "Glimepiride IP 0.5mg Tablets"),
+    ("Amoxycillin 25mg/ml", "Amoxycillin Oral Suspension IP 125mg per 5ml"),
+])
+def test_strengths_compare_in_base_units(catalog, ingredients, query, expected):
+    rows, strength_match = ingredients.match(query)
+    assert strength_match is True
+    assert names(catalog, rows)[0] == expected
+
+
+def test_describe_reports_group(catalog, ingredients):
+    rows, _ = ingredients.match("Metformin 500mg")
+    assert ingredients.describe(rows[0])["group"] == "Anti-Diabetic"
@@ -0,0 +1,119 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from build_road_graph import build_csr, build_road_graph
+from routing_backends import LocalGraphBackend, RoadGraphError, get_routing_backend
+
+OSM = """<?xml version="1.0"?>
+<osm>
+  <node id="1" lat="12.9000" lon="77.5000"/>
+  <node id="2" lat="12.9000" lon="77.5050"/>
+  <node id="3" lat="12.9050" lon="77.5050"/>
+  <node id="4" lat="12.9050" lon="77.5000"/>
+  <node id="9" lat="12.9500" lon="77.5500"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="primary"/></way>
+  <way id="11"><nd ref="3"/><nd ref="4"/><tag k="highway" v="residential"/><tag k="oneway" v="yes"/></way>
+  <way id="12"><nd ref="4"/><nd ref="1"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+
+def toy_graph(seed, size=5, spacing_deg=0.003):
+    """Grid of size x size nodes with random speeds and some one-way streets."""
+    rng = random.Random(seed)
+    nodes = {}
+    for r in range(size):
+        for c in range(size):
+            nodes[f"{r}-{c}"] = (12.9 + r * spacing_deg + rng.uniform(-3e-4, 3e-4),
+                                 77.5 + c * spacing_deg + rng.uniform(-3e-4, 3e-4))
+    ways = []
+    for r in range(size):
+        for c in range(size):
+            for dr, dc in ((0, 1), (1, 0), (1, 1)):
+                if r + dr < size and c + dc < size and rng.random() < 0.8:
+                    ways.append(([f"{r}-{c}", f"{r + dr}-{c + dc}"], rng.choice([20, 30, 45]), rng.random() < 0.3))
+    return nodes, ways
+
+
+def load(tmp_path, graph):
+    path = str(tmp_path / "graph.npz")
+    np.savez_compressed(path, **graph)
+    return LocalGraphBackend(path)
+
+
+def brute_force_times(backend):
+    """Floyd-Warshall over the CSR edges: all-pairs shortest travel time."""
+    n = len(backend.lat)
+    dist = np.full((n, n), np.inf)
+    np.fill_diagonal(dist, 0.0)
+    for u in range(n):
+        for e in range(backend.indptr[u], backend.indptr[u + 1]):
+            dist[u, backend.indices[e]] = min(dist[u, backend.indices[e]], backend.time_s[e])
+    for k in range(n):
+        dist = np.minimum(dist, dist[:, k:k + 1] + dist[k:k + 1, :])
+    return dist
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_astar_and_dijkstra_match_brute_force(tmp_path, seed):
+    backend = load(tmp_path, build_csr(*toy_graph(seed)))
+    expected = brute_force_times(backend)
+    n = len(backend.lat)
+    for s in range(n):
+        reached = backend._dijkstra_many(s, list(range(n)))
+        for t in range(n):
+            found = backend._astar(s, t)
+            if math.isinf(expected[s, t]):
+                assert found is None
+                assert t not in reached
+                continue
+            path, _, dur = found
+            assert dur == pytest.approx(expected[s, t])
+            assert reached[t][0] == pytest.approx(expected[s, t])
+            assert path[0] == s and path[-1] == t
+
+
+def test_table_matches_route(tmp_path):
+    backend = load(tmp_path, build_csr(*toy_graph(4)))
+    points = [(backend.lat[i], backend.lon[i]) for i in (0, 7, 12, 24)]
+    durations, _ = backend.table(points, points)
+    for i, src in enumerate(points):
+        for j, dst in enumerate(points):
+            _, _, dur = backend.route(src, dst)
+            if dur is None:
+                assert durations[i][j] is None
+            else:
+                assert durations[i][j] == pytest.approx(dur)
+
+
+def test_build_road_graph_from_osm(tmp_path):
+    osm = tmp_path / "area.osm"
+    osm.write_text(OSM)
+    out = str(tmp_path / "graph.npz")
+    n_nodes, n_edges = build_road_graph(str(osm), out)
+    # footway and the unconnected node are dropped; 1-2-3 two-way, 3->4 one-way
+    assert (n_nodes, n_edges) == (4, 5)
+    backend = LocalGraphBackend(out)
+    node = {name: backend.snap(latlon) for name, latlon in
+            {"1": (12.9, 77.5), "3": (12.905, 77.505), "4": (12.905, 77.5)}.items()}
+    assert backend._astar(node["3"], node["4"]) is not None
+    assert backend._astar(node["4"], node["3"]) is None
+    assert backend.snap((13.5, 78.5)) is None
+
+
+@pytest.mark.parametrize("content", [None, b"not an npz file", b"PK\x03\x04truncated"])
+def test_unloadable_local_graph_fails_loudly(tmp_path, capsys, content):
+    path = tmp_path / "road_graph.npz"
+    if content is not None:
+        path.write_bytes(content)
+    with pytest.raises(RoadGraphError, match="road_graph.npz"):
+        get_routing_backend("local", graph_path=str(path))
+    assert str(path) in capsys.readouterr().err
+
+
+def test_unknown_backend_kind_is_rejected():
+    with pytest.raises(ValueError):
+        get_routing_backend("lcoal")
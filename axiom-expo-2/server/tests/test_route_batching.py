@@ -0,0 +1,82 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from geo import haversine_m
+from route_batching import (
+    MAX_EXACT_ORDERS, MAX_ORDERS_PER_BATCH, _path_cost, _sequence_exact, _sequence_insertion, group_orders, plan_sequence
+)
+
+
+def brute_force(dur, n):
+    """Cheapest stop order over all permutations with every pickup before its drop-off."""
+    best = math.inf
+    for seq in itertools.permutations(range(1, 2 * n + 1)):
+        pos = {s: i for i, s in enumerate(seq)}
+        if all(pos[k] < pos[n + k] for k in range(1, n + 1)):
+            best = min(best, _path_cost(dur, seq))
+    return best
+
+
+def random_durations(seed, n):
+    rng = np.random.default_rng(seed)
+    pts = rng.uniform(0, 5000, size=(2 * n + 1, 2))
+    # asymmetric travel times on top of straight-line distance
+    return (np.hypot(*(pts[:, None, :] - pts[None, :, :]).transpose(2, 0, 1)) * rng.uniform(1.0, 1.5, size=(2 * n + 1,) * 2)).tolist()
+
+
+def valid(seq, n):
+    pos = {s: i for i, s in enumerate(seq)}
+    return sorted(seq) == list(range(1, 2 * n + 1)) and all(pos[k] < pos[n + k] for k in range(1, n + 1))
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4])
+@pytest.mark.parametrize("seed", range(4))
+def test_exact_dp_matches_permutations(n, seed):
+    dur = random_durations(seed, n)
+    seq, cost = _sequence_exact(dur, n)
+    assert valid(seq, n)
+    assert cost == pytest.approx(_path_cost(dur, seq))
+    assert cost == pytest.approx(brute_force(dur, n))
+
+
+def test_insertion_heuristic_is_valid_and_not_better_than_exact():
+    dur = random_durations(11, 4)
+    seq, cost = _sequence_insertion(dur, 4)
+    assert valid(seq, 4)
+    assert cost >= brute_force(dur, 4) - 1e-9
+
+
+def test_group_orders_respects_window_and_radius():
+    store, near_store, far_store = (12.90, 77.50), (12.905, 77.505), (12.99, 77.60)
+    drop = (12.93, 77.52)
+    orders = [
+        {"store": store, "origin": drop, "created_at": 0},
+        {"store": near_store, "origin": drop, "created_at": 60},
+        {"store": far_store, "origin": drop, "created_at": 60},
+        {"store": store, "origin": drop, "created_at": 3600},
+    ]
+    bundles = group_orders(orders)
+    assert sorted(map(sorted, bundles)) == [[0, 1], [2], [3]]
+    assert group_orders([]) == []
+
+
+def test_full_bundle_from_group_orders_takes_the_heuristic():
+    assert MAX_EXACT_ORDERS < MAX_ORDERS_PER_BATCH
+    stores = [(12.900, 77.500), (12.903, 77.502), (12.898, 77.505), (12.905, 77.497), (12.901, 77.501)]
+    drops = [(12.930, 77.520), (12.925, 77.530), (12.935, 77.515), (12.920, 77.525), (12.931, 77.521)]
+    orders = [{"store": st, "origin": dr, "created_at": 10 * i} for i, (st, dr) in enumerate(zip(stores, drops))]
+    bundles = group_orders(orders)
+    full = next(b for b in bundles if len(b) == MAX_ORDERS_PER_BATCH)
+
+    # stop numbering of plan_sequence: agent start, pickups, drop-offs; ~8 m/s
+    agent = (12.895, 77.495)
+    points = [agent] + [orders[j]["store"] for j in full] + [orders[j]["origin"] for j in full]
+    dur = [[haversine_m(a, b) / 8.0 for b in points] for a in points]
+    n = len(full)
+    seq, cost = plan_sequence(dur, n)
+    assert (seq, cost) == _sequence_insertion(dur, n)
+    assert valid(seq, n)
+    assert cost >= brute_force(dur, n) - 1e-9
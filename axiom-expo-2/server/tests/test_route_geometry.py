@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+import pytest
+
+from route_geometry import decode_polyline, encode_polyline, pack_route, simplify
+
+
+def random_route(seed, n=200):
+    rng = random.Random(seed)
+    lat, lon = 12.9, 77.5
+    coords = []
+    for _ in range(n):
+        lat += rng.uniform(-5e-4, 5e-4)
+        lon += rng.uniform(-5e-4, 5e-4)
+        coords.append([lat, lon])
+    return coords
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_encode_decode_round_trip(precision, seed):
+    coords = random_route(seed)
+    decoded = decode_polyline(encode_polyline(coords, precision), precision)
+    assert len(decoded) == len(coords)
+    for (lat, lon), (dlat, dlon) in zip(coords, decoded):
+        assert abs(lat - dlat) <= 0.5 / 10 ** precision + 1e-12
+        assert abs(lon - dlon) <= 0.5 / 10 ** precision + 1e-12
+
+
+def test_known_encoding():
+    # example from the encoded polyline format documentation
+    coords = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    assert encode_polyline(coords) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == coords
+
+
+def test_simplify_keeps_endpoints_and_drops_collinear_points():
+    line = [[12.9 + i * 1e-4, 77.5 + i * 1e-4] for i in range(50)]
+    assert simplify(line, 1.0) == [line[0], line[-1]]
+    route = random_route(3)
+    kept = simplify(route, 5.0)
+    assert kept[0] == route[0] and kept[-1] == route[-1]
+    assert all(p in route for p in kept)
+    assert simplify(route, 0) == route
+
+
+def test_pack_route_decodes_to_simplified_route():
+    route = random_route(4)
+    decoded = decode_polyline(pack_route(route, 5.0))
+    assert np.allclose(decoded, simplify(route, 5.0), atol=1e-5)
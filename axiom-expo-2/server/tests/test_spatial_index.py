@@ -0,0 +1,74 @@
+import random
+import time
+
+import pytest
+
+from geo import haversine_m
+from spatial_index import SpatialIndex
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = random.Random(7)
+    return {i: (12.9 + rng.uniform(-0.05, 0.05), 77.5 + rng.uniform(-0.05, 0.05)) for i in range(400)}
+
+
+@pytest.fixture(scope="module")
+def index(points):
+    index = SpatialIndex(cell_m=500.0)
+    for i, p in points.items():
+        index.insert(i, p, payload={"id": i})
+    return index
+
+
+def brute_force(points, q):
+    return sorted((haversine_m(q, p), i) for i, p in points.items())
+
+
+QUERIES = [(12.9, 77.5), (12.93, 77.46), (12.86, 77.56), (13.2, 77.9)]
+
+
+@pytest.mark.parametrize("q", QUERIES)
+@pytest.mark.parametrize("radius_m", [100.0, 800.0, 3000.0])
+def test_within_radius_matches_brute_force(index, points, q, radius_m):
+    expected = [i for d, i in brute_force(points, q) if d <= radius_m]
+    assert [i for i, _, _ in index.within_radius(q, radius_m)] == expected
+
+
+@pytest.mark.parametrize("q", QUERIES)
+@pytest.mark.parametrize("k", [1, 5, 30])
+def test_nearest_matches_brute_force(index, points, q, k):
+    expected = brute_force(points, q)[:k]
+    got = index.nearest(q, k=k)
+    assert [d for _, _, d in got] == pytest.approx([d for d, _ in expected])
+
+
+def test_nearest_with_predicate_and_radius(index, points):
+    q = QUERIES[0]
+    expected = [i for d, i in brute_force(points, q) if i % 3 == 0 and d <= 2000.0][:10]
+    got = index.nearest(q, k=10, max_radius_m=2000.0, predicate=lambda i, payload: payload["id"] % 3 == 0)
+    assert [i for i, _, _ in got] == expected
+
+
+def test_move_and_remove():
+    index = SpatialIndex(cell_m=200.0)
+    index.insert("a", (12.9, 77.5))
+    index.insert("b", (12.95, 77.55))
+    index.move("a", (12.951, 77.551))
+    assert index.nearest((12.95, 77.55), k=2)[1][0] == "a"
+    index.remove("b")
+    assert [i for i, _, _ in index.nearest((12.95, 77.55), k=2)] == ["a"]
+    assert index.within_radius((12.9, 77.5), 500.0) == []
+
+
+@pytest.mark.parametrize("q", [(13.5, 77.5), (15.0, 77.5), (20.0, 77.5), (-30.0, 10.0)])
+def test_far_query_with_k_above_size_is_fast(q):
+    points = {"a": (12.97, 77.59), "b": (12.93, 77.62), "c": (13.01, 77.55)}
+    index = SpatialIndex(cell_m=500.0)
+    for i, p in points.items():
+        index.insert(i, p)
+    start = time.perf_counter()
+    got = index.nearest(q, k=20)
+    assert time.perf_counter() - start < 0.5
+    assert [i for i, _, _ in got] == [i for _, i in brute_force(points, q)]
+    assert index.nearest(q, k=20, max_radius_m=1000.0) == []
@@ -0,0 +1,358 @@
+"""
+Durable notification queue for the UiPath SMS robots.
+enqueue() writes a row to the notifications table of notifications.db and
+returns at once; a small pool of worker threads claims due rows and hands them
+to the configured sender. A failed send is retried with jittered exponential
+backoff until MAX_ATTEMPTS, then parked as "failed". Callers that need the
+outcome look it up with notification_status() or block on wait_for_delivery().
+
+Claims are leased (status "sending" + claimed_at), so a row whose worker died
+mid-send is picked up again after LEASE_S, also by another process.
+
+Senders (NOTIFY_SENDER):
+- uipath: runs `UiRobot.exe execute --file <package> --input <payload json>`
+- stub:   records the send and logs it to stderr (default off Windows)
+"""
+
+import atexit
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# own database file (WAL mode), next to the server's unless NOTIFY_DB_PATH is set
+NOTIFY_DB_PATH = os.environ.get(
+    "NOTIFY_DB_PATH", os.path.join(_HERE, "..", "server", "notifications.db"))
+WORKERS = 2
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_S = 5.0
+BACKOFF_CAP_S = 300.0
+# a "sending" row older than this is assumed abandoned and claimed again
+LEASE_S = 600.0
+# idle workers re-check for due retries this often
+POLL_S = 2.0
+# wait() re-reads the row this often (a worker in another process won't wake it)
+WAIT_POLL_S = 0.1
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+FINAL_STATUSES = (STATUS_SENT, STATUS_FAILED)
+
+KIND_THANK_YOU = "thank_you_sms"
+KIND_RARE_ALERT = "rare_medicine_alert"
+
+UIPATH_ROBOT = os.environ.get("UIPATH_ROBOT", r"C:\Program Files\UiPath\Studio\UiRobot.exe")
+# UiPath package per notification kind
+UIPATH_PACKAGES = {
+    KIND_THANK_YOU: os.environ.get("UIPATH_THANK_YOU_PACKAGE", os.path.join(_HERE, "sendsms.1.0.4.nupkg")),
+    KIND_RARE_ALERT: os.environ.get("UIPATH_RARE_PACKAGE", os.path.join(_HERE, "sendsms_rare.1.0.1.4.nupkg")),
+}
+# rare alerts per vendor group: UIPATH_GROUP_PACKAGES='{"<group>": "<package path>"}'
+UIPATH_PACKAGES.update({
+    f"{KIND_RARE_ALERT}:{group}": package
+    for group, package in json.loads(os.environ.get("UIPATH_GROUP_PACKAGES") or "{}").items()
+})
+UIPATH_TIMEOUT_S = 300
+
+
+class SendError(Exception):
+    """A send failed; the queue will retry it."""
+
+
+# ---------- senders ----------
+class UiPathSender:
+    name = "uipath"
+
+    def __init__(self, robot=UIPATH_ROBOT, packages=None, timeout_s=UIPATH_TIMEOUT_S):
+        self.robot = robot
+        self.packages = packages or UIPATH_PACKAGES
+        self.timeout_s = timeout_s
+
+    def send(self, kind, payload):
+        # "<kind>:<group>" without its own package goes out through the kind's package
+        package = self.packages.get(kind) or self.packages.get(kind.split(":", 1)[0])
+        if package is None:
+            raise SendError(f"No UiPath package for notification kind: {kind}")
+        try:
+            result = subprocess.run(
+                [self.robot, "execute", "--file", package, "--input", json.dumps(payload)],
+                capture_output=True, text=True, timeout=self.timeout_s
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise SendError(f"UiPath robot did not run: {e}")
+        if result.returncode != 0:
+            raise SendError(f"UiPath execution failed with code {result.returncode}: {result.stderr.strip()}")
+
+
+class StubSender:
+    """Local stand-in for the robot: records sends, optionally failing the first few of each."""
+    name = "stub"
+
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.sent = []
+        self._tries = {}
+        self._lock = threading.Lock()
+
+    def send(self, kind, payload):
+        key = json.dumps([kind, payload], sort_keys=True)
+        with self._lock:
+            self._tries[key] = self._tries.get(key, 0) + 1
+            if self._tries[key] <= self.fail_first:
+                raise SendError("stub failure")
+            self.sent.append((kind, payload))
+        sys.stderr.write(f"[notify stub] {kind}: {json.dumps(payload)}\n")
+
+
+SENDERS = {"uipath": UiPathSender, "stub": StubSender}
+
+
+def default_sender():
+    name = os.environ.get("NOTIFY_SENDER") or ("uipath" if os.name == "nt" else "stub")
+    if name not in SENDERS:
+        raise ValueError(f"Unknown NOTIFY_SENDER: {name}")
+    return SENDERS[name]()
+
+
+# ---------- queue ----------
+def create_tables(conn):
+    """Create the notifications table (for modules that join against it before a queue exists)."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS notifications ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+        "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+        "claimed_at REAL, last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS notifications_due ON notifications(status, next_attempt_at)")
+
+
+class NotificationQueue:
+    def __init__(self, db_path=NOTIFY_DB_PATH, sender=None, workers=WORKERS, max_attempts=MAX_ATTEMPTS,
+                 backoff_base_s=BACKOFF_BASE_S, backoff_cap_s=BACKOFF_CAP_S, lease_s=LEASE_S, poll_s=POLL_S):
+        self.db_path = db_path
+        self.sender = sender or default_sender()
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base_s = backoff_base_s
+        self.backoff_cap_s = backoff_cap_s
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self._local = threading.local()
+        self._wake = threading.Condition()
+        # set under _wake by enqueue()/stop(), so a notify sent while a worker was busy isn't lost
+        self._kicked = False
+        self._done = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        create_tables(self._conn())
+
+    def _conn(self):
+        # one connection per thread; WAL lets the workers and enqueuers overlap
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind, payload, delay_s=0.0):
+        """Queue one notification; returns its id without waiting for the send."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO notifications (kind, payload, status, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, json.dumps(payload), STATUS_PENDING, now + delay_s, now, now)
+        )
+        with self._wake:
+            self._kicked = True
+            self._wake.notify()
+        return cur.lastrowid
+
+    def _claim(self):
+        """Atomically take the next due row (or an expired lease). Returns (id, kind, payload, attempts) or None."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM notifications "
+                "WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND claimed_at < ?) "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (STATUS_PENDING, now, STATUS_SENDING, now - self.lease_s)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE notifications SET status = ?, claimed_at = ?, updated_at = ? WHERE id = ?",
+                             (STATUS_SENDING, now, now, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3]
+
+    def _finish(self, notification_id, attempts, error=None):
+        now = time.time()
+        if error is None:
+            self._conn().execute(
+                "UPDATE notifications SET status = ?, attempts = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (STATUS_SENT, attempts, now, notification_id))
+            return
+        if attempts >= self.max_attempts:
+            status, next_at = STATUS_FAILED, now
+        else:
+            # full jitter over an exponentially growing window
+            status = STATUS_PENDING
+            next_at = now + random.uniform(0.5, 1.0) * min(self.backoff_cap_s, self.backoff_base_s * 2 ** (attempts - 1))
+        self._conn().execute(
+            "UPDATE notifications SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+            "WHERE id = ?", (status, attempts, next_at, str(error)[:1000], now, notification_id))
+
+    def process_one(self):
+        """Send one due notification. Returns True if there was one."""
+        claimed = self._claim()
+        if claimed is None:
+            return False
+        notification_id, kind, payload, attempts = claimed
+        try:
+            self.sender.send(kind, payload)
+        except Exception as e:
+            self._finish(notification_id, attempts + 1, e)
+        else:
+            self._finish(notification_id, attempts + 1)
+        with self._done:
+            self._done.notify_all()
+        return True
+
+    def _next_due_in(self):
+        row = self._conn().execute(
+            "SELECT MIN(next_attempt_at) FROM notifications WHERE status = ?", (STATUS_PENDING,)).fetchone()
+        if row[0] is None:
+            return self.poll_s
+        return min(self.poll_s, max(0.0, row[0] - time.time()))
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.process_one():
+                    continue
+                wait_s = self._next_due_in()
+            except sqlite3.Error as e:
+                sys.stderr.write(f"Notification worker error: {e}\n")
+                wait_s = self.poll_s
+            with self._wake:
+                if not self._kicked and not self._stop.is_set():
+                    self._wake.wait(wait_s)
+                self._kicked = False
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        if self._threads:
+            return self
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"notify-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout_s=5.0):
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join(timeout_s)
+
+    def drain(self, timeout_s=30.0):
+        """Wait until nothing is pending or in flight (retries included). Returns True if drained."""
+        deadline = time.time() + timeout_s
+        while time.time() < deadline:
+            counts = self.counts()
+            if not counts.get(STATUS_PENDING) and not counts.get(STATUS_SENDING):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM notifications GROUP BY status").fetchall()
+        return dict(rows)
+
+    def wait(self, notification_id, timeout_s):
+        """
+        Block until the notification is sent or has failed for good, at most
+        timeout_s. Returns its get() record (still pending on timeout), or None
+        for an unknown id.
+        """
+        deadline = time.time() + timeout_s
+        while True:
+            record = self.get(notification_id)
+            remaining = deadline - time.time()
+            if record is None or record["status"] in FINAL_STATUSES or remaining <= 0:
+                return record
+            with self._done:
+                self._done.wait(min(WAIT_POLL_S, remaining))
+
+    def get(self, notification_id):
+        row = self._conn().execute(
+            "SELECT id, kind, payload, status, attempts, last_error FROM notifications WHERE id = ?",
+            (notification_id,)).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "status": row[3],
+                "attempts": row[4], "last_error": row[5]}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Process-wide queue with its workers running, created on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = NotificationQueue().start()
+        return _queue
+
+
+def notification_status(notification_id):
+    """
+    {'id', 'kind', 'payload', 'status', 'attempts', 'last_error'} of a queued
+    notification, or None. status is pending/sending until it ends sent or failed.
+    """
+    return get_queue().get(notification_id)
+
+
+def wait_for_delivery(notification_id, timeout_s):
+    """Block until the notification is sent; raises SendError if it failed or is still queued after timeout_s."""
+    record = get_queue().wait(notification_id, timeout_s)
+    if record is None:
+        raise SendError(f"Unknown notification: {notification_id}")
+    if record["status"] == STATUS_FAILED:
+        raise SendError(f"Notification {notification_id} failed after {record['attempts']} attempts: "
+                        f"{record['last_error']}")
+    if record["status"] != STATUS_SENT:
+        raise SendError(f"Notification {notification_id} not delivered within {timeout_s}s "
+                        f"(status {record['status']})")
+    return record
+
+
+if __name__ == "__main__":
+    # python notification_queue.py [--worker]: print queue counts, or run a standalone worker
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        q = NotificationQueue().start()
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            q.stop()
+    else:
+        print(json.dumps(NotificationQueue().counts()))
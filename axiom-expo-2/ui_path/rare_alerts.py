@@ -0,0 +1,178 @@
+"""
+Coalescing aggregator for rare-medicine vendor alerts.
+submit() only records a request; requests are collected for WINDOW_S, deduped
+by (medicine, region) and flushed as one notification per vendor group, so a
+burst of requests becomes one robot run per group instead of one per request.
+
+A (group, medicine, region) is dropped while its last alert is still queued,
+or for COOLDOWN_S after that alert was delivered. The alert history lives in
+the rare_alerts table next to the notification queue and points at the queued
+notification, so the cooldown follows the send outcome (a dead-lettered alert
+suppresses nothing) and holds across restarts and processes.
+
+Vendor groups: each group is one UiPath package (its recipient list). Regions
+map to groups through RARE_VENDOR_GROUPS, a JSON object {region: group} in the
+environment; unmapped regions go to DEFAULT_GROUP. A group other than the
+default is sent as kind "rare_medicine_alert:<group>", whose package comes
+from UIPATH_GROUP_PACKAGES (see notification_queue).
+"""
+
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from notification_queue import (
+    KIND_RARE_ALERT, NOTIFY_DB_PATH, STATUS_PENDING, STATUS_SENDING, STATUS_SENT, create_tables, get_queue
+)
+
+WINDOW_S = 30.0
+COOLDOWN_S = 30 * 60.0
+DEFAULT_GROUP = "default"
+DEFAULT_REGION = ""
+RARE_VENDOR_GROUPS = json.loads(os.environ.get("RARE_VENDOR_GROUPS") or "{}")
+
+MESSAGE_HEADER = "Attention: Critical Medicine Request\n\n"
+MESSAGE_FOOTER = (
+    "Action Required: Please verify stock availability and coordinate with your distribution network.\n\n"
+    "Your immediate assistance is greatly appreciated."
+)
+
+
+def medicine_key(medicine_name):
+    """Dedupe key: case and spacing don't matter."""
+    return re.sub(r"\s+", " ", medicine_name.strip().lower())
+
+
+def rare_message_text(items):
+    """
+    Alert text for [(medicine_name, region)]. A single medicine keeps the
+    original one-line format; a batch lists one medicine per line.
+    """
+    if len(items) == 1:
+        name, region = items[0]
+        body = f"Medicine: {name}" + (f" ({region})" if region else "") + "\n\n"
+    else:
+        lines = [f"- {name}" + (f" ({region})" if region else "") for name, region in items]
+        body = "Medicines:\n" + "\n".join(lines) + "\n\n"
+    return MESSAGE_HEADER + body + MESSAGE_FOOTER
+
+
+def alert_kind(group):
+    return KIND_RARE_ALERT if group == DEFAULT_GROUP else f"{KIND_RARE_ALERT}:{group}"
+
+
+class RareAlertAggregator:
+    def __init__(self, queue=None, window_s=WINDOW_S, cooldown_s=COOLDOWN_S, vendor_groups=None):
+        self._queue = queue
+        # the alert history joins against the queue's notifications table
+        self.db_path = queue.db_path if queue is not None else NOTIFY_DB_PATH
+        self.window_s = window_s
+        self.cooldown_s = cooldown_s
+        self.vendor_groups = RARE_VENDOR_GROUPS if vendor_groups is None else vendor_groups
+        # group -> {(medicine_key, region): (display name, region)}, in arrival order
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.RLock()
+        self.counters = {"submitted": 0, "duplicates": 0, "suppressed": 0, "alerted": 0, "batches": 0}
+        # autocommit: an open transaction here would block the queue's own inserts
+        self.conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        create_tables(self.conn)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS rare_alerts ("
+            "vendor_group TEXT NOT NULL, medicine TEXT NOT NULL, region TEXT NOT NULL, alerted_at REAL NOT NULL, "
+            "notification_id INTEGER, PRIMARY KEY (vendor_group, medicine, region))"
+        )
+        # the queue row is durable, so a window cut short by exit still gets sent
+        atexit.register(self.flush)
+
+    @property
+    def queue(self):
+        return self._queue if self._queue is not None else get_queue()
+
+    def group_for(self, region):
+        return self.vendor_groups.get(region, DEFAULT_GROUP)
+
+    def _recently_alerted(self, group, key, region, now):
+        """True while the last alert is queued, or within the cooldown of its delivery."""
+        row = self.conn.execute(
+            "SELECT n.status, n.updated_at FROM rare_alerts a JOIN notifications n ON n.id = a.notification_id "
+            "WHERE a.vendor_group = ? AND a.medicine = ? AND a.region = ?",
+            (group, key, region)).fetchone()
+        if row is None:
+            return False
+        status, updated_at = row
+        if status in (STATUS_PENDING, STATUS_SENDING):
+            return True
+        # sent: cooldown from delivery; failed: the vendors never heard, alert again
+        return status == STATUS_SENT and now - updated_at < self.cooldown_s
+
+    def submit(self, medicine_name, region=None):
+        """
+        Record one rare-medicine request. Returns True if it will go out in the
+        next batch, False if it duplicates a pending or recently sent alert.
+        """
+        region = (region or DEFAULT_REGION).strip()
+        key = medicine_key(medicine_name)
+        group = self.group_for(region)
+        with self._lock:
+            self.counters["submitted"] += 1
+            batch = self._pending.setdefault(group, {})
+            if (key, region) in batch:
+                self.counters["duplicates"] += 1
+                return False
+            if self._recently_alerted(group, key, region, time.time()):
+                self.counters["suppressed"] += 1
+                return False
+            batch[(key, region)] = (medicine_name.strip(), region)
+            if self._timer is None:
+                # the first request of a window schedules its flush
+                self._timer = threading.Timer(self.window_s, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return True
+
+    def flush(self):
+        """Send everything collected so far, one notification per vendor group. Returns the notification ids."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+            ids = []
+            now = time.time()
+            for group, batch in pending.items():
+                if not batch:
+                    continue
+                notification_id = self.queue.enqueue(
+                    alert_kind(group), {"messageText": rare_message_text(list(batch.values()))})
+                ids.append(notification_id)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO rare_alerts (vendor_group, medicine, region, alerted_at, notification_id) "
+                    "VALUES (?, ?, ?, ?, ?)", [(group, key, region, now, notification_id) for key, region in batch])
+                self.counters["alerted"] += len(batch)
+                self.counters["batches"] += 1
+            return ids
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters["pending"] = sum(len(batch) for batch in self._pending.values())
+        return counters
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator():
+    """Process-wide aggregator, created on first use."""
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            _aggregator = RareAlertAggregator()
+        return _aggregator
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# keep tests off the server's notification database
+os.environ.setdefault("NOTIFY_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="axiom-notify-"), "notifications.db"))
+os.environ.setdefault("NOTIFY_SENDER", "stub")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
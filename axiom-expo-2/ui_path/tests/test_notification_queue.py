@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from notification_queue import (
+    KIND_THANK_YOU, STATUS_FAILED, STATUS_SENT, NotificationQueue, SendError, StubSender
+)
+
+
+def make_queue(tmp_path, sender, **kw):
+    kw.setdefault("backoff_base_s", 0.01)
+    kw.setdefault("backoff_cap_s", 0.02)
+    return NotificationQueue(str(tmp_path / "n.db"), sender, **kw).start()
+
+
+def test_enqueue_returns_before_send_and_retries(tmp_path):
+    sender = StubSender(fail_first=2)
+    q = make_queue(tmp_path, sender, workers=2)
+    started = time.time()
+    ids = [q.enqueue(KIND_THANK_YOU, {"phoneNumber": f"+91{i}"}) for i in range(5)]
+    assert time.time() - started < 1.0
+    records = [q.wait(i, 10) for i in ids]
+    q.stop()
+    assert all(r["status"] == STATUS_SENT and r["attempts"] == 3 for r in records)
+    assert len(sender.sent) == 5
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    q = make_queue(tmp_path, StubSender(fail_first=10), workers=1, max_attempts=3)
+    record = q.wait(q.enqueue(KIND_THANK_YOU, {"phoneNumber": "+91"}), 10)
+    q.stop()
+    assert record["status"] == STATUS_FAILED
+    assert record["attempts"] == 3
+    assert record["last_error"] == "stub failure"
+
+
+def test_wait_times_out_while_queued(tmp_path):
+    q = NotificationQueue(str(tmp_path / "n.db"), StubSender())  # no workers started
+    record = q.wait(q.enqueue(KIND_THANK_YOU, {"phoneNumber": "+91"}), 0.2)
+    assert record["status"] == "pending"
+
+
+def test_send_notification_wait(monkeypatch, tmp_path):
+    import notification_queue
+    import using_uipath_send_notification as thank_you
+
+    q = make_queue(tmp_path, StubSender(fail_first=10), workers=1, max_attempts=2)
+    monkeypatch.setattr(notification_queue, "_queue", q)
+    notification_id = thank_you.send_notification("+91861")
+    assert thank_you.notification_status(notification_id)["kind"] == KIND_THANK_YOU
+    with pytest.raises(SendError):
+        thank_you.send_notification("+91862", wait_s=10)
+    q.stop()
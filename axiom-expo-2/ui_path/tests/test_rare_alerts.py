@@ -0,0 +1,48 @@
+import time
+
+from notification_queue import STATUS_FAILED, STATUS_SENT, NotificationQueue, StubSender
+from rare_alerts import RareAlertAggregator
+
+
+def make(tmp_path, sender, **kw):
+    q = NotificationQueue(str(tmp_path / "n.db"), sender, workers=1, max_attempts=2,
+                          backoff_base_s=0.01, backoff_cap_s=0.02).start()
+    return q, RareAlertAggregator(q, window_s=60, cooldown_s=60, **kw)
+
+
+def test_burst_becomes_one_alert_per_vendor_group(tmp_path):
+    sender = StubSender()
+    q, agg = make(tmp_path, sender, vendor_groups={"Mysuru": "mysuru"})
+    accepted = [agg.submit(med, region) for med, region in
+                [("Penicillin", None), ("penicillin ", None), ("Digoxin", None), ("Digoxin", "Mysuru")] * 10]
+    assert sum(accepted) == 3
+    ids = agg.flush()
+    assert [q.wait(i, 10)["status"] for i in ids] == [STATUS_SENT, STATUS_SENT]
+    q.stop()
+    assert sorted(kind for kind, _ in sender.sent) == ["rare_medicine_alert", "rare_medicine_alert:mysuru"]
+    assert "- Penicillin\n- Digoxin" in sender.sent[0][1]["messageText"] or \
+        "- Penicillin\n- Digoxin" in sender.sent[1][1]["messageText"]
+
+
+def test_cooldown_starts_at_delivery(tmp_path):
+    q, agg = make(tmp_path, StubSender())
+    q.stop()  # keep the alert queued
+    agg.submit("Penicillin")
+    (notification_id,) = agg.flush()
+    # still queued: a repeat is a duplicate
+    assert agg.submit("Penicillin") is False
+    # delivered by a worker in another process
+    worker = NotificationQueue(q.db_path, StubSender()).start()
+    assert worker.wait(notification_id, 10)["status"] == STATUS_SENT
+    worker.stop()
+    assert agg.submit("Penicillin") is False
+    assert agg._recently_alerted("default", "penicillin", "", time.time() + 120) is False
+
+
+def test_dead_lettered_alert_does_not_suppress(tmp_path):
+    q, agg = make(tmp_path, StubSender(fail_first=10))
+    agg.submit("Penicillin")
+    (notification_id,) = agg.flush()
+    assert q.wait(notification_id, 10)["status"] == STATUS_FAILED
+    q.stop()
+    assert agg.submit("Penicillin") is True
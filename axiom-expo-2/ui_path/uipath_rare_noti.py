@@ -1,30 +1,12 @@
-import subprocess
-import json
+from rare_alerts import get_aggregator
 
-def send_notification_rare(medicine_name):
-    uipath_exe = r"C:\Program Files\UiPath\Studio\UiRobot.exe"
-    uipath_pkg = r"E:\Sem 7\axiom\axiom-expo-2\ui_path\sendsms_rare.1.0.1.4.nupkg"
 
-    # ✅ Construct message text cleanly
-    message_text = (
-        f"Attention: Critical Medicine Request\n\n"
-        f"Medicine: {medicine_name}\n\n"
-        f"Action Required: Please verify stock availability and coordinate with your distribution network.\n\n"
-        f"Your immediate assistance is greatly appreciated."
-    )
+def send_notification_rare(medicine_name, region=None):
+    """
+    Queue a rare-medicine alert. Requests are batched per vendor group over a
+    short window; returns False if the medicine is already pending or was
+    alerted recently for that region.
+    """
+    return get_aggregator().submit(medicine_name, region)
 
-    # ✅ Serialize properly to JSON (auto handles escaping)
-    json_input = json.dumps({"messageText": message_text})
-
-    result = subprocess.run([
-        uipath_exe,
-        "execute",
-        "--file", uipath_pkg,
-        "--input", json_input
-    ], capture_output=True, text=True)
-
-    print("Return code:", result.returncode)
-    print("STDOUT:", result.stdout)
-    print("STDERR:", result.stderr)
-
-# send_notification_rare("Penicillin")
\ No newline at end of file
+# send_notification_rare("Penicillin")
@@ -1,28 +1,23 @@
-import subprocess
-def send_notification(recipient):
-    uipath_exe = r"C:\Program Files\UiPath\Studio\UiRobot.exe"
-    uipath_pkg = r"E:\Sem 7\axiom\axiom-expo-2\ui_path\sendsms_rare.1.0.4.nupkg"
+from notification_queue import KIND_THANK_YOU, get_queue, notification_status, wait_for_delivery
+
+# notification_status is re-exported for callers polling their send
+__all__ = ["send_notification", "notification_status"]
 
-    # recipient = "+917899374579"
-    json_input = f'{{"phoneNumber": "{recipient}"}}'  # ✅ Proper JSON
 
+def send_notification(recipient, wait_s=None):
+    """
+    Queue the thank-you SMS for recipient and return its notification id.
 
-    result = subprocess.run([
-        uipath_exe,
-        "execute",
-        "--file", uipath_pkg,
-        "--input", json_input
-    ], capture_output=True, text=True)
-    
-    # Print results for debugging
-    print(f"UiPath Return code: {result.returncode}")
-    if result.stdout:
-        print(f"UiPath STDOUT: {result.stdout}")
-    if result.stderr:
-        print(f"UiPath STDERR: {result.stderr}")
-    
-    # Raise error if UiPath execution failed
-    if result.returncode != 0:
-        raise Exception(f"UiPath execution failed with code {result.returncode}: {result.stderr}")
+    Unlike the old synchronous call this does not raise when the robot fails:
+    the queue retries, and the outcome is read later with
+    notification_status(id). Pass wait_s to block until delivery instead; a
+    failed or still undelivered send then raises SendError.
+    """
+    # recipient = "+917899374579"
+    notification_id = get_queue().enqueue(KIND_THANK_YOU, {"phoneNumber": recipient})
+    if wait_s is not None:
+        wait_for_delivery(notification_id, wait_s)
+    return notification_id
 
-# send_notification("+918618476530")
\ No newline at end of file
+# send_notification("+918618476530")
+# notification_status(send_notification("+918618476530"))["status"]